@@ -0,0 +1,109 @@
+#!/usr/bin/python
+#
+# Benchmark for the parser backends of pybot.util.feedparser.
+#
+# Parses a corpus of generated feeds (RSS 2.0, RSS 1.0 and Atom, with
+# entities, CDATA sections and inline XHTML content) in a few sizes,
+# plus any feed files given, once with the sgmllib backend used before,
+# once with the expat backend, and once with the expat backend stopping
+# after MAXITEMS items, as done by the rss module. Also tells whether
+# both backends gave the same items.
+#
+# Usage: feedparser.py [file.xml ...]
+#
+
+import sys, os
+import StringIO
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+from pybot.util import feedparser
+
+SIZES = [50, 500, 5000]
+
+MAXITEMS = 50
+
+RSS2 = """<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel><title>News &amp; views</title><link>http://example.com/</link>
+<description>Example feed</description>
+%s</channel></rss>"""
+
+RSS2ITEM = """<item><title>Item %(i)d &amp; more</title>
+<link>http://example.com/%(i)d</link>
+<guid isPermaLink="false">tag:example.com,2003:%(i)d</guid>
+<description>&lt;p&gt;Some &lt;b&gt;news&lt;/b&gt; number %(i)d, with a
+somewhat longer description, as most feeds have.&lt;/p&gt;</description>
+<dc:creator>someone@example.com</dc:creator>
+<pubDate>Mon, 01 Sep 2003 12:%(m)02d:00 GMT</pubDate></item>
+"""
+
+RSS1 = """<?xml version="1.0" encoding="utf-8"?>
+<rdf:RDF xmlns:rdf="http://www.w3.org/1999/02/22-rdf-syntax-ns#"
+ xmlns="http://purl.org/rss/1.0/" xmlns:dc="http://purl.org/dc/elements/1.1/">
+<channel rdf:about="http://example.com/"><title>News</title>
+<link>http://example.com/</link></channel>
+%s</rdf:RDF>"""
+
+RSS1ITEM = """<item rdf:about="http://example.com/%(i)d">
+<title>Item %(i)d</title><link>http://example.com/%(i)d</link>
+<description><![CDATA[Some <i>news</i> number %(i)d & such.]]></description>
+<dc:date>2003-09-01T12:%(m)02d:00Z</dc:date><dc:subject>news</dc:subject>
+</item>
+"""
+
+ATOM = """<?xml version="1.0" encoding="utf-8"?>
+<feed version="0.2" xmlns="http://purl.org/echo/">
+<title>News</title><link>http://example.com/</link>
+%s</feed>"""
+
+ATOMITEM = """<entry><title>Entry %(i)d</title>
+<link>http://example.com/%(i)d</link><id>tag:example.com,2003:%(i)d</id>
+<issued>2003-09-01T12:%(m)02d:00Z</issued>
+<summary>Summary of entry %(i)d</summary>
+<content type="application/xhtml+xml" mode="xml"><p>Some <b>news</b>
+number %(i)d, with &lt;escaped&gt; text.</p></content>
+<content type="text/html" mode="escaped">&lt;p&gt;Escaped %(i)d&lt;/p&gt;</content>
+</entry>
+"""
+
+def corpus():
+    feeds = []
+    for name, feed, item in (("rss2", RSS2, RSS2ITEM),
+                             ("rss1", RSS1, RSS1ITEM),
+                             ("atom", ATOM, ATOMITEM)):
+        for size in SIZES:
+            items = "".join([item % {"i": i, "m": i % 60}
+                             for i in range(size)])
+            feeds.append(("%s-%d" % (name, size), feed % items))
+    for filename in sys.argv[1:]:
+        feeds.append((os.path.basename(filename), open(filename).read()))
+    return feeds
+
+def measure(data, backend, maxitems=None):
+    count = max(1, 200000//len(data))
+    start = time.time()
+    for i in range(count):
+        result = feedparser.parse(StringIO.StringIO(data), backend=backend,
+                                  maxitems=maxitems)
+    return (time.time()-start)/count, result
+
+def main():
+    print "%-12s %8s %6s %11s %11s %11s %5s" % \
+          ("feed", "size (KB)", "items", "sgml (ms)", "expat (ms)",
+           "first %d" % MAXITEMS, "same")
+    for name, data in corpus():
+        old, oldresult = measure(data, "sgml")
+        new, newresult = measure(data, "expat")
+        first, firstresult = measure(data, "expat", MAXITEMS)
+        same = oldresult["items"] == newresult["items"] and \
+               firstresult["items"] == oldresult["items"][:MAXITEMS]
+        print "%-12s %8d %6d %11.2f %11.2f %11.2f %5s" % \
+              (name, len(data)//1024, len(oldresult["items"]), old*1000,
+               new*1000, first*1000, same and "yes" or "no")
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,243 @@
+#!/usr/bin/python
+#
+# Benchmarks for the infopack module.
+#
+# Looks up keys in the given infopack files, once reading the whole
+# file for each lookup as done before, and once through the offset
+# index kept by pybot.infofile.InfoIndex, and shows the time taken by
+# each lookup.
+#
+# Then shows the memory used by each pack loaded in memory, once kept
+# in a dict of tuples and lists as done before, and once in the
+# pybot.modules.infopack.InfoStore used now.
+#
+# Then searches the packs for some patterns, once scanning every
+# record as done before, and once narrowing the search to the records
+# found in the pybot.infofile.TrigramIndex of each pack.
+#
+# Finally, matches messages against the triggers of all the given packs,
+# once trying every trigger of every pack as done before, and once
+# through pybot.modules.infopack.Triggers. The set of packs is
+# replicated to show how both scale as more packs get loaded.
+#
+# Usage: infopack.py file.info [...]
+#
+
+import sys, os
+import time
+import re
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+import pybot
+pybot.hooks = pybot.mm = pybot.router = pybot.config = None
+
+from pybot.infofile import InfoIndex
+from pybot.modules.infopack import Infopack, Triggers
+
+SAMPLES = 300
+
+MESSAGES = 20000
+
+PATTERNS = [
+    "internet message",
+    "python",
+    "porto alegre",
+    r"smtp.*mail",
+    r"gnu (c|c\+\+)",
+    r"\d{4}",
+]
+
+LINES = [
+    "hello world",
+    "help",
+    "what's the weather in london?",
+    "have you seen joe?",
+    "how are you doing today?",
+    "thanks!",
+    "rfc 2822?",
+    "port 80",
+    "what's the airport code gru?",
+    "show versions of python",
+]
+
+def old_get(filename, findkey):
+    values = []
+    found = 0
+    file = open(filename)
+    for line in file.readlines():
+        if line and line[0] != "#":
+            if not found:
+                if line[0] == "K":
+                    key = line[2:].rstrip()
+                    if key.lower() == findkey:
+                        found = 1
+                        foundvalue = 0
+            else:
+                if line[0] == "V":
+                    foundvalue = 1
+                    value = line[2:].split(":", 1)
+                    value[1] = value[1].rstrip()
+                    values.append(value)
+                elif foundvalue:
+                    break
+    file.close()
+    return key, values
+
+def measure(func, keys):
+    start = time.time()
+    for key in keys:
+        func(key)
+    return time.time()-start
+
+def old_load(filename):
+    info = {}
+    values = []
+    file = open(filename)
+    for line in file.xreadlines():
+        if line and line[0] != "#":
+            if line[0] == "K":
+                values = []
+                info[line[2:].rstrip().lower()] = (line[2:].rstrip(), values)
+            elif line[0] == "V":
+                value = line[2:].split(":", 1)
+                value[1] = value[1].rstrip()
+                values.append(value)
+    file.close()
+    return info
+
+def footprint(obj, seen=None):
+    """Return the bytes used by obj and everything it references."""
+    if seen is None:
+        seen = {}
+    if id(obj) in seen:
+        return 0
+    seen[id(obj)] = 1
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += footprint(key, seen)+footprint(value, seen)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += footprint(item, seen)
+    elif hasattr(obj, "__dict__"):
+        size += footprint(obj.__dict__, seen)
+    return size
+
+def memory(filenames):
+    print
+    print "%-20s %10s %12s %12s" % ("file", "size (KB)", "old (KB)",
+                                    "new (KB)")
+    for filename in filenames:
+        old = footprint(old_load(filename))
+        pack = Infopack(filename)
+        pack.load()
+        new = footprint(pack._info)
+        pack.unload()
+        print "%-20s %10d %12d %12d" % (os.path.basename(filename),
+                                        os.path.getsize(filename)//1024,
+                                        old//1024, new//1024)
+
+def old_search(pack, filename, pattern):
+    results = []
+    file = open(filename)
+    values = []
+    for line in file.readlines():
+        if line and line[0] != "#":
+            if line[0] == "K":
+                if values:
+                    pack._search(pattern, key, values, results)
+                key = line[2:].rstrip()
+                values = []
+            elif line[0] == "V":
+                value = line[2:].split(":", 1)
+                value[1] = value[1].rstrip()
+                values.append(value)
+    if values:
+        pack._search(pattern, key, values, results)
+    file.close()
+    return results
+
+def old_match(packs, line):
+    results = []
+    for name, pack in packs:
+        for trigger in pack.triggers():
+            m = trigger.match(line)
+            if m:
+                results.append((name, pack, m))
+                break
+    return results
+
+def lookups(filenames):
+    print "%-20s %8s %14s %14s" % ("file", "keys", "old (ms/key)",
+                                   "new (ms/key)")
+    for filename in filenames:
+        keys = [line[2:].rstrip().lower()
+                for line in open(filename) if line[:2] == "K:"]
+        if not keys:
+            continue
+        keys = keys[::max(1, len(keys)//SAMPLES)]
+        index = InfoIndex(filename)
+        index.get(keys[0])
+        old = measure(lambda key: old_get(filename, key), keys)
+        new = measure(index.get, keys)
+        index.close()
+        print "%-20s %8d %14.3f %14.3f" % (os.path.basename(filename),
+                                           len(keys), old*1000/len(keys),
+                                           new*1000/len(keys))
+
+def searches(filenames):
+    print
+    print "%-20s %-20s %8s %12s %12s" % ("file", "pattern", "results",
+                                         "old (ms)", "new (ms)")
+    for filename in filenames:
+        pack = Infopack(filename)
+        pack.loadcore()
+        pack.search(re.compile(PATTERNS[0], re.I))
+        for pattern in PATTERNS:
+            pattern = re.compile(pattern, re.I)
+            start = time.time()
+            results = old_search(pack, filename, pattern)
+            old = time.time()-start
+            start = time.time()
+            pack.search(pattern)
+            new = time.time()-start
+            print "%-20s %-20s %8d %12.2f %12.2f" % \
+                  (os.path.basename(filename), pattern.pattern,
+                   len(results), old*1000, new*1000)
+        pack.unload()
+
+def triggers(filenames):
+    base = []
+    for filename in filenames:
+        pack = Infopack(filename)
+        pack.loadcore()
+        base.append(pack)
+    lines = [LINES[i%len(LINES)] for i in xrange(MESSAGES)]
+    print
+    print "%8s %9s %14s %14s" % ("packs", "triggers", "old (us/msg)",
+                                 "new (us/msg)")
+    for factor in (1, 4, 16, 64):
+        packs = [("pack%d" % i, base[i%len(base)])
+                 for i in range(len(base)*factor)]
+        matcher = Triggers()
+        matcher.build(packs)
+        ntriggers = 0
+        for name, pack in packs:
+            ntriggers += len(pack.triggers())
+        old = measure(lambda line: old_match(packs, line), lines)
+        new = measure(matcher.match, lines)
+        print "%8d %9d %14.2f %14.2f" % (len(packs), ntriggers,
+                                         old*1000000/MESSAGES,
+                                         new*1000000/MESSAGES)
+
+def main():
+    lookups(sys.argv[1:])
+    memory(sys.argv[1:])
+    searches(sys.argv[1:])
+    triggers(sys.argv[1:])
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,100 @@
+#!/usr/bin/python
+#
+# Benchmark for the line framing done by pybot.server.LineBuffer.
+#
+# Replays an IRC capture (raw server output, with CRLF terminated
+# lines) in socket sized chunks, consuming at most 10 lines per chunk
+# like the main loop does, and compares the time taken with the
+# string/list based framing used before. If no capture is given, a
+# synthetic one with NAMES/WHO bursts and channel traffic is used.
+#
+# Usage: linebuffer.py [capture-file]
+#
+
+import sys, os
+import random
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+from pybot.server import LineBuffer
+from collections import deque
+
+CHUNKSIZE = 4096
+
+def synthetic(size):
+    random.seed(0)
+    l = []
+    total = 0
+    i = 0
+    while total < size:
+        kind = random.randint(0, 9)
+        if kind == 0:
+            line = ":irc.example.com 353 pybot = #chan :" + \
+                   " ".join(["nick%d" % random.randint(0, 99999)
+                             for x in range(40)])
+        elif kind == 1:
+            line = ":irc.example.com 352 pybot #chan user%d " \
+                   "host%d.example.com irc.example.com nick%d H :0 Real Name" \
+                   % (i, i, i)
+        else:
+            line = ":nick%d!user@host%d.example.com PRIVMSG #chan :%s" \
+                   % (i, i, "blah " * random.randint(1, 40))
+        l.append(line + "\r\n")
+        total += len(l[-1])
+        i += 1
+    return "".join(l)
+
+def old_framing(data):
+    inbuffer = ""
+    inlines = []
+    for i in xrange(0, len(data), CHUNKSIZE):
+        inbuffer = inbuffer + data[i:i+CHUNKSIZE]
+        lines = inbuffer.split("\r\n")
+        inbuffer = lines[-1]
+        inlines = inlines + lines[:-1]
+        for n in range(10):
+            if not inlines:
+                break
+            del inlines[0]
+    while inlines:
+        del inlines[0]
+
+def new_framing(data):
+    inlines = deque()
+    inbuffer = LineBuffer(inlines)
+    for i in xrange(0, len(data), CHUNKSIZE):
+        inbuffer.feed(data[i:i+CHUNKSIZE])
+        for n in range(10):
+            if not inlines:
+                break
+            inlines.popleft()
+    while inlines:
+        inlines.popleft()
+
+def measure(func, data):
+    start = time.time()
+    func(data)
+    return time.time()-start
+
+def main():
+    if len(sys.argv) > 1:
+        capture = open(sys.argv[1]).read()
+    else:
+        capture = synthetic(8*1024*1024)
+    print "%10s %12s %12s %12s %12s" % ("size", "old (s)", "old (MB/s)",
+                                        "new (s)", "new (MB/s)")
+    size = len(capture)/8
+    while size <= len(capture):
+        data = capture[:size]
+        mb = float(size)/(1024*1024)
+        old = measure(old_framing, data)
+        new = measure(new_framing, data)
+        print "%9.1fM %12.3f %12.1f %12.3f %12.1f" % \
+              (mb, old, mb/old, new, mb/new)
+        size *= 2
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,117 @@
+#!/usr/bin/python
+#
+# Benchmark for the command dispatching done by pybot.router.Router.
+#
+# Collects the command patterns defined with regexp() in the standard
+# modules, and measures the cost of dispatching messages addressed to
+# pybot, comparing the chain used before (every module trying each of
+# its patterns in turn) with the router. The pattern set is replicated
+# to show how both scale as more modules get loaded.
+#
+# Usage: router.py [messages]
+#
+
+import sys, os
+import glob
+import time
+import re
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+from pybot.hook import Hooks
+from pybot.misc import regexp
+import pybot
+
+pybot.hooks = Hooks()
+
+from pybot.router import Router
+
+LINES = [
+    "hello world",
+    "help",
+    "show help about permissions",
+    "uptime",
+    "show queues",
+    "have you seen joe?",
+    "search log for something",
+    "pick a number between 1 and 10",
+    "load module weather",
+    "what's the weather in london?",
+    "how are you doing today?",
+    "thanks!",
+    "you're a silly bot",
+    "I think so",
+    "12:30 is lunch time",
+    "[ping]",
+]
+
+REGEXP = re.compile(r'regexp\(((?:\s*r?"(?:[^"\\]|\\.)*"\s*)+)')
+
+def modulepatterns():
+    modules = []
+    dir = os.path.join(os.path.dirname(pybot.__file__), "modules")
+    for filename in glob.glob(os.path.join(dir, "*.py")):
+        patterns = []
+        for m in REGEXP.finditer(open(filename).read()):
+            try:
+                patterns.append(regexp(eval(m.group(1).replace("\n", " "))))
+            except:
+                pass
+        if patterns:
+            modules.append(patterns)
+    return modules
+
+class Message:
+    def __init__(self, line):
+        self.line = line
+        self.forme = 1
+
+def old_dispatch(modules, msgs):
+    for msg in msgs:
+        for patterns in modules:
+            if not msg.forme:
+                continue
+            for pattern in patterns:
+                m = pattern.match(msg.line)
+                if m:
+                    break
+
+def new_dispatch(router, msgs):
+    for msg in msgs:
+        router.message(msg)
+
+def found(msg, m):
+    return None
+
+def measure(func, *args):
+    start = time.time()
+    func(*args)
+    return time.time()-start
+
+def main():
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    else:
+        count = 20000
+    msgs = [Message(LINES[i%len(LINES)]) for i in xrange(count)]
+    base = modulepatterns()
+    print "%8s %9s %14s %14s" % ("modules", "patterns", "old (us/msg)",
+                                 "new (us/msg)")
+    for factor in (1, 2, 4, 8):
+        modules = base*factor
+        router = Router()
+        npatterns = 0
+        for patterns in modules:
+            for pattern in patterns:
+                router.register(pattern, found, forme=1)
+                npatterns += 1
+        old = measure(old_dispatch, modules, msgs)
+        new = measure(new_dispatch, router, msgs)
+        print "%8d %9d %14.2f %14.2f" % (len(modules), npatterns,
+                                         old*1000000/count,
+                                         new*1000000/count)
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
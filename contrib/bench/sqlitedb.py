@@ -0,0 +1,74 @@
+#!/usr/bin/python
+#
+# Benchmark for the group commits done by pybot.sqlitedb.SQLiteDB.
+#
+# Inserts channel lines into a log table like the log module does,
+# once committing after every line as done before, and once through
+# SQLiteDB, and shows how many lines per second each one sustains.
+#
+# Usage: sqlitedb.py [lines] [directory]
+#
+
+import sys, os
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+from pysqlite2 import dbapi2 as sqlite
+from pybot.sqlitedb import SQLiteDB
+
+FIELDS = ("timestamp integer, servername text, type text, "
+          "nick text, src text, dest text, line text")
+
+def values(i):
+    return (int(time.time()), "irc.example.com", "MESSAGE", "nick%d" % i,
+            "nick%d!user@host.example.com" % i, "#chan",
+            "blah " * (i % 40 + 1))
+
+def old_log(path, lines):
+    conn = sqlite.connect(path)
+    conn.execute("create table log (%s)" % FIELDS)
+    for i in xrange(lines):
+        cursor = conn.cursor()
+        cursor.execute("insert into log values (?,?,?,?,?,?,?)", values(i))
+        conn.commit()
+        cursor.close()
+    conn.close()
+
+def new_log(path, lines):
+    db = SQLiteDB(path)
+    db.table("log", FIELDS)
+    for i in xrange(lines):
+        db.execute("insert into log values (?,?,?,?,?,?,?)", *values(i))
+        db.flush()
+    db.close()
+
+def measure(func, dir, lines):
+    path = os.path.join(dir, "bench.db")
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path+suffix):
+            os.unlink(path+suffix)
+    start = time.time()
+    func(path, lines)
+    return time.time()-start
+
+def main():
+    lines = 2000
+    dir = None
+    if len(sys.argv) > 1:
+        lines = int(sys.argv[1])
+    if len(sys.argv) > 2:
+        dir = sys.argv[2]
+    else:
+        dir = tempfile.mkdtemp()
+    old = measure(old_log, dir, lines)
+    new = measure(new_log, dir, lines)
+    print "%10s %12s %12s" % ("", "time (s)", "lines/s")
+    print "%10s %12.3f %12.0f" % ("old", old, lines/old)
+    print "%10s %12.3f %12.0f" % ("new", new, lines/new)
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
@@ -0,0 +1,84 @@
+#!/usr/bin/python
+#
+# Benchmark for the timer heap kept by pybot.modules.timer.
+#
+# Hooks many timers, like the ones set by the repeat and rss modules,
+# and runs the Loop hook while none of them expire, once walking the
+# whole timer list as done before, and once through the timer module.
+# Then shows how long it takes to unhook half of them, one at a time,
+# and to cancel the other half through the handles given by hooktimer().
+#
+# Usage: timer.py [timers]
+#
+
+import sys, os
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), "..", ".."))
+
+import pybot
+from pybot.option import Options
+from pybot.module import ModuleMethods
+from pybot.hook import Hooks
+from pybot.reactor import Reactor
+pybot.options = Options()
+pybot.mm = ModuleMethods()
+pybot.hooks = Hooks()
+pybot.reactor = Reactor()
+
+from pybot.modules.timer import Timer
+
+LOOPS = 1000
+
+def func(i):
+    pass
+
+def old_loop(timer):
+    for list in timer:
+        curtime = int(time.time())
+        if list[0] <= curtime:
+            list[0] = curtime+list[1]
+            apply(list[2], list[3])
+
+def old_unhook(timer, sec, func, params):
+    r = []
+    for i in range(len(timer)):
+        list = timer[i]
+        if list[1] == sec and list[2] == func and list[3] == params:
+            r.append(i)
+    r.reverse()
+    for i in r:
+        del timer[i]
+
+def measure(func, count):
+    start = time.time()
+    for i in xrange(count):
+        func(i)
+    return time.time()-start
+
+def main():
+    count = 10000
+    if len(sys.argv) > 1:
+        count = int(sys.argv[1])
+    half = count//2
+    old = [[int(time.time())+3600+i, 3600+i, func, (i,), 0]
+           for i in xrange(count)]
+    new = Timer()
+    handles = [new.mm_hooktimer(3600+i, func, (i,)) for i in xrange(count)]
+    print "%10s %14s %14s" % ("", "old (us)", "new (us)")
+    oldtime = measure(lambda i: old_loop(old), LOOPS)
+    newtime = measure(lambda i: new.loop(), LOOPS)
+    print "%10s %14.2f %14.2f" % ("loop", oldtime*1000000/LOOPS,
+                                  newtime*1000000/LOOPS)
+    oldtime = measure(lambda i: old_unhook(old, 3600+i, func, (i,)), half)
+    newtime = measure(lambda i: new.mm_unhooktimer(3600+i, func, (i,)), half)
+    print "%10s %14.2f %14.2f" % ("unhook", oldtime*1000000/half,
+                                  newtime*1000000/half)
+    newtime = measure(lambda i: new.mm_canceltimer(handles[-i-1]), half)
+    print "%10s %14s %14.2f" % ("cancel", "", newtime*1000000/half)
+    new.unload()
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
@@ -1,7 +1,16 @@
 #!/usr/bin/python
+#
+# Script to add the versions of the packages in an RPM hdlist to a
+# pybot infopack, which is built together with its indexes (see
+# infobuild.py).
+#
 import sys, os
 import rpm
 
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), ".."))
+
+from pybot.infofile import readinfo, writeinfo
+
 def main():
     if len(sys.argv) != 4:
         sys.exit("Usage: hdlist2ipack.py <label> <hdlist> <infopack>")
@@ -11,12 +20,8 @@ def main():
     packages = {}
     if os.path.exists(ipackname):
         file = open(ipackname)
-        name = None
-        for line in file.readlines():
-            if line[0] == "K":
-                name = line.rstrip().split(":")[1]
-            elif name and line[0] == "V":
-                value = line.rstrip().split(":", 2)[2]
+        for name, values in readinfo(file)[1]:
+            for flags, value in values:
                 for pair in value.split(";"):
                     distrostr, versionstr = pair.split(":", 1)
                     distros = packages.setdefault(name, {})
@@ -32,20 +37,12 @@ def main():
         distros = packages.setdefault(h["name"].lower(), {})
         versions = distros.setdefault(label, {})
         versions[version] = 1
-    if os.path.exists(ipackname):
-        file = open(ipackname)
-        oldlines = file.readlines()
-        file.close()
-    else:
-        oldlines = []
-    file = open(ipackname, "w")
-    for line in oldlines:
-        if line[0] not in ("K", "V"):
-            file.write(line)
+    writeinfo(records(packages), ipackname)
+
+def records(packages):
     packagenames = packages.keys()
     packagenames.sort()
     for packagename in packagenames:
-        file.write("K:%s\n" % packagename)
         v = ""
         distros = packages[packagename]
         distronames = [SortStr(x) for x in distros.keys()]
@@ -56,8 +53,7 @@ def main():
             versions = distros[distroname].keys()
             versions.sort()
             v += "%s: %s" % (distroname, ", ".join(versions))
-        file.write("V:tm:%s\n" % v)
-    file.close()
+        yield packagename, [("tm", v)]
 
 class SortStr(str):
     def __cmp__(self, other):
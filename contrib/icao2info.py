@@ -7,11 +7,22 @@
 #
 #    http://weather.noaa.gov/tg/site.shtml
 #
+# Usage: icao2info.py [infopack]
+#
+# Without an infopack, the infopack lines are written to the standard
+# output. Otherwise the infopack is built together with its indexes
+# (see infobuild.py), keeping its triggers, masks and help.
+#
 
-def main():
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), ".."))
+
+from pybot.infofile import writeinfo
+
+def records():
     for line in open("nsd_cccc.txt"):
         tokens = [x.strip() for x in line.split(";")]
-        print "K:%s" % tokens[0]
         l = []
         l.append(tokens[3]) # Location
         if tokens[4]: # State, for US only
@@ -38,7 +49,12 @@ def main():
                 l.append("RBSN")
         except IndexError:
             pass
-        print "V:tm:"+", ".join(l)
+        yield tokens[0], [("tm", ", ".join(l))]
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: icao2info.py [infopack]")
+    writeinfo(records(), sys.argv[1:] and sys.argv[1] or None)
 
 if __name__ == "__main__":
     main()
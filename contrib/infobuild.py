@@ -0,0 +1,45 @@
+#!/usr/bin/python
+#
+# Script to build a pybot infopack, together with the key and trigram
+# indexes used by pybot with infopacks loaded in core-only mode, so
+# that the infopack may be used at once.
+#
+# Infopack lines are read from the given source files, or from the
+# standard input, so the output of other converters may be piped in:
+#
+#    icao2info.py | infobuild.py weather.info
+#
+# Triggers, masks, help and defaults found before the first key are
+# written first. If there are none, the ones of an existing infopack
+# with the same name are kept.
+#
+# Usage: infobuild.py <infopack> [source ...]
+#
+
+import sys, os
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), ".."))
+
+from pybot.infofile import readinfo, writeinfo
+from itertools import chain
+
+def main():
+    if len(sys.argv) < 2:
+        sys.exit("Usage: infobuild.py <infopack> [source ...]")
+    ipackname = sys.argv[1]
+    if len(sys.argv) > 2:
+        files = [open(filename) for filename in sys.argv[2:]]
+    else:
+        files = [sys.stdin]
+    core = []
+    records = []
+    for file in files:
+        filecore, filerecords = readinfo(file)
+        core.extend(filecore)
+        records.append(filerecords)
+    writeinfo(chain(*records), ipackname, core or None)
+
+if __name__ == "__main__":
+    main()
+
+# vim:ts=4:sw=4:et
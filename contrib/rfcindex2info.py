@@ -1,29 +1,54 @@
 #!/usr/bin/python
+#
+# Script to convert the RFC index (1rfc_index.txt) to a pybot infopack.
+#
+# Usage: rfcindex2info.py [infopack]
+#
+# Without an infopack, the infopack lines are written to the standard
+# output. Otherwise the infopack is built together with its indexes
+# (see infobuild.py), keeping its triggers, masks and help.
+#
+
+import sys, os
 import re
 
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), ".."))
+
+from pybot.infofile import writeinfo
+
 KEY = re.compile("(?P<key>\d+)\s+(?P<content>.+)$")
 MORE = re.compile("\s+(?P<content>.+)$")
 
 
-def main():
-    foundfirst = 0
+def records():
+    key = None
     for line in open("1rfc_index.txt"): 
         m = KEY.match(line)
         if m:
-            foundfirst = 1
-            print "K:"+m.group("key")
-            print "V:tm:"+m.group("content"),
+            if key:
+                yield key, [("tm", " ".join(content))]
+            key = m.group("key")
+            content = [m.group("content")]
             continue
 
-        if not foundfirst:
+        if not key:
             continue
 
         m = MORE.match(line)
         if m:
-            print m.group("content"),
+            content.append(m.group("content"))
             continue
 
-        print
+        yield key, [("tm", " ".join(content))]
+        key = None
+
+    if key:
+        yield key, [("tm", " ".join(content))]
+
+def main():
+    if len(sys.argv) > 2:
+        sys.exit("Usage: rfcindex2info.py [infopack]")
+    writeinfo(records(), sys.argv[1:] and sys.argv[1] or None)
 
 if __name__ == "__main__":
     main()
@@ -1,37 +1,70 @@
 #!/usr/bin/python
-import sys
+#
+# Script to convert the texinfo sources of V.E.R.A. (Virtual Entity
+# of Relevant Acronyms) to a pybot infopack.
+#
+# Usage: vera2info.py [-o infopack] <vera.texi> ...
+#
+# Without an infopack, the infopack lines are written to the standard
+# output. Otherwise the infopack is built together with its indexes
+# (see infobuild.py), keeping its triggers, masks and help.
+#
 
-def main():
+import sys, os
+import getopt
+
+sys.path.insert(0, os.path.join(os.path.dirname(sys.argv[0]), ".."))
+
+from pybot.infofile import writeinfo
+
+def records(filenames):
     lastkey = None
+    value = None
     append = 0
     nextisvalue = 0
-    for filename in sys.argv[1:]:
+    for filename in filenames:
         file = open(filename)
         nextisvalue = 0
         for line in file.xreadlines():
             if line[:6] == "@item ":
                 key = line[6:].rstrip()
                 if key != lastkey:
-                    if lastkey and not nextisvalue:
-                        sys.stdout.write("\n")
+                    if lastkey:
+                        yield lastkey, values(value)
                     lastkey = key
-                    sys.stdout.write("K:%s\n" % key)
+                    value = None
                     append = 0
                 else:
                     append = 1
                 nextisvalue = 1
             elif nextisvalue:
-                value = line.rstrip()
-                if not append:
-                    sys.stdout.write("V:tm:%s" % value)
+                if not append or value is None:
+                    value = line.rstrip()
                 elif lastkey != "VERA":
-                    sys.stdout.write(", %s" % value)
+                    value += ", %s" % line.rstrip()
                 else:
-                    sys.stdout.write("Virtual Entity of Relevant Acronyms")
+                    value += "Virtual Entity of Relevant Acronyms"
                 nextisvalue = 0
         file.close()
-    if lastkey and not nextisvalue:
-        sys.stdout.write("\n")
+    if lastkey:
+        yield lastkey, values(value)
+
+def values(value):
+    if value is None:
+        return []
+    return [("tm", value)]
+
+def main():
+    try:
+        opts, args = getopt.getopt(sys.argv[1:], "o:")
+    except getopt.GetoptError:
+        args = None
+    if not args:
+        sys.exit("Usage: vera2info.py [-o infopack] <vera.texi> ...")
+    ipackname = None
+    for opt, arg in opts:
+        ipackname = arg
+    writeinfo(records(args), ipackname)
 
 if __name__ == "__main__":
     main()
@@ -21,16 +21,21 @@ def init():
     from pybot.option import Options
     from pybot.server import Servers
     from pybot.hook import Hooks
+    from pybot.router import Router
     from pybot.main import Main
-    from pybot.sqlitedb import SQLiteDB
+    from pybot.reactor import Reactor
+    from pybot.sqlitedb import SQLiteDB, COMMITDELAY, COMMITROWS
     
     from ConfigParser import ConfigParser
     import os
 
-    global main, modls, servers, options, hooks, mm, rm, config, db
+    global main, modls, servers, options, hooks, mm, rm, config, db, reactor, \
+           router
 
     
     hooks = Hooks()
+    router = Router()
+    reactor = Reactor()
     servers = Servers()
 
     options = Options()
@@ -51,7 +56,14 @@ def init():
         config.read("/etc/pybot.conf")
         defaults["datadir"] = ("/var/lib/pybot")
 
-    db = SQLiteDB(config.get("sqlite", "path"))
+    commitdelay = COMMITDELAY
+    if config.has_option("sqlite", "commit_delay"):
+        commitdelay = config.getint("sqlite", "commit_delay")/1000.
+    commitrows = COMMITROWS
+    if config.has_option("sqlite", "commit_rows"):
+        commitrows = config.getint("sqlite", "commit_rows")
+    db = SQLiteDB(config.get("sqlite", "path"), commitdelay, commitrows,
+                  reactor.wakeup)
     
     if config.has_option("global", "http_proxy"):
         os.environ["http_proxy"] = config.get("global", "http_proxy")
@@ -16,43 +16,87 @@
 # along with pybot; if not, write to the Free Software
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
+from pybot.misc import work
 from thread import start_new_thread
 import traceback
 
 class Hooks:
+    """Hook registry.
+
+    Handlers are kept sorted by priority, and for every hook name an
+    immutable tuple is prepared on register() and unregister(), so
+    that call() can walk it without copying or sorting anything, even
+    if handlers register or unregister hooks while being called.
+
+    Handlers may declare filters when registering, as keyword
+    arguments naming attributes of the first hook parameter (usually
+    a Command), like forme=1, direct=1 or ctcp="ACTION". The special
+    filter server matches the server name. Handlers whose filters
+    don't match are skipped without being called.
+
+    Threaded handlers are run by the "hooks" queue of the workers
+    module, or in a thread of their own if it's not loaded or its
+    queue is full, since dropping an event would go unnoticed.
+    """
     def __init__(self):
         self.__hook = {}
+        self.__call = {}
     
-    def register(self, hookname, hookfunc, priority=500, threaded=0):
-        hook = self.__hook.get(hookname)
-        if not hook:
-            self.__hook[hookname] = [(hookfunc,priority,threaded)]
+    def register(self, hookname, hookfunc, priority=500, threaded=0,
+                 **filters):
+        hook = self.__hook.setdefault(hookname, [])
+        entry = (hookfunc, priority, threaded, tuple(filters.items()))
+        l = len(hook)
+        i = 0
+        while i < l:
+            if hook[i][1] > priority:
+                hook.insert(i, entry)
+                break
+            i = i + 1
         else:
-            l = len(hook)
-            i = 0
-            while i < l:
-                if hook[i][1] > priority:
-                    hook.insert(i,(hookfunc,priority,threaded))
-                    return
-                i = i + 1
-            hook.append((hookfunc,priority,threaded))
+            hook.append(entry)
+        self.__rebuild(hookname)
     
     def unregister(self, hookname, hookfunc, priority=500, threaded=0):
-        self.__hook[hookname].remove((hookfunc,priority,threaded))
-    
+        hook = self.__hook[hookname]
+        for i in range(len(hook)):
+            if hook[i][:3] == (hookfunc, priority, threaded):
+                del hook[i]
+                break
+        else:
+            raise ValueError, "hook not registered"
+        self.__rebuild(hookname)
+
+    def __rebuild(self, hookname):
+        self.__call[hookname] = tuple([(func, threaded, filters)
+                                       for func, priority, threaded, filters
+                                       in self.__hook[hookname]])
+
     def call(self, hookname, *hookparam, **hookkwparam):
         ret = []
-        if self.__hook.has_key(hookname):
-            for hook in self.__hook[hookname][:]:
-                try:
-                    if hook[2]:
-                        start_new_thread(hook[0], hookparam, hookkwparam)
-                    else:
-                        val = apply(hook[0],hookparam,hookkwparam)
-                    ret.append(val)
-                    if val == -1: break
-                except:
-                    traceback.print_exc()
+        for func, threaded, filters in self.__call.get(hookname, ()):
+            if filters and not matchfilters(filters, hookparam[0]):
+                continue
+            try:
+                if threaded:
+                    if not work("hooks", func, hookparam, hookkwparam):
+                        start_new_thread(func, hookparam, hookkwparam)
+                    val = None
+                else:
+                    val = func(*hookparam, **hookkwparam)
+                ret.append(val)
+                if val == -1: break
+            except:
+                traceback.print_exc()
         return ret
 
+def matchfilters(filters, param):
+    for name, value in filters:
+        if name == "server":
+            if param.server.servername != value:
+                return 0
+        elif getattr(param, name) != value:
+            return 0
+    return 1
+
 # vim:ts=4:sw=4:et
@@ -0,0 +1,436 @@
+# Copyright (c) 2000-2003 Gustavo Niemeyer <niemeyer@conectiva.com>
+#
+# This file is part of pybot.
+# 
+# pybot is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# pybot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with pybot; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+import struct
+import mmap
+import sys
+import os
+
+INDEXHEADER = "# pybot infopack index: %s\n"
+TRIGRAMHEADER = "# pybot infopack trigrams: %s\n"
+
+# Trigram entries: the trigram, and the position and length of its ids
+TRIGRAMENTRY = struct.Struct("<3sII")
+
+# Lines read by Infopack.loadcore(), which must come before any key
+CORELINES = "TMHhD#"
+
+def mapfile(file):
+    """Map file in memory, or read it if that's not possible."""
+    try:
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (mmap.error, ValueError):
+        file.seek(0)
+        return file.read()
+
+def filestamp(filename):
+    """Return the stamp identifying the current content of filename.
+
+    The mtime is kept with full precision, so that files rewritten in
+    place within a second are told apart, and the inode changes when
+    a file is replaced by another one.
+    """
+    st = os.stat(filename)
+    return "%s %d %d" % (repr(st.st_mtime), st.st_size, st.st_ino)
+
+def buildindex(offsets):
+    """Build a key index from a dict of lowercase keys and offsets."""
+    keys = offsets.keys()
+    keys.sort()
+    return "".join(["%s\0%d\n" % (key, offsets[key]) for key in keys])
+
+def trigrams(text):
+    text = text.lower()
+    return dict([(text[i:i+3], 1) for i in range(len(text)-2)])
+
+def buildtrigrams(records):
+    """Build a trigram index for the given (id, texts) records.
+
+    The index starts with the sorted table of trigrams found in the
+    texts, and is followed by the ids of the records containing each
+    one of them.
+    """
+    postings = {}
+    for id, texts in records:
+        found = {}
+        for text in texts:
+            found.update(trigrams(text))
+        for trigram in found:
+            if trigram in postings:
+                postings[trigram].append(id)
+            else:
+                postings[trigram] = [id]
+    keys = postings.keys()
+    keys.sort()
+    table = [struct.pack("<I", len(keys))]
+    ids = []
+    position = 4+len(keys)*TRIGRAMENTRY.size
+    for trigram in keys:
+        found = postings[trigram]
+        table.append(TRIGRAMENTRY.pack(trigram, position, len(found)))
+        ids.append(struct.pack("<%dI" % len(found), *found))
+        position += len(found)*4
+    return "".join(table+ids)
+
+class TrigramIndex:
+    """Find the records which may contain some strings.
+
+    The index is built with buildtrigrams(), and may be mapped from a
+    file, in which case it starts at the given position.
+    """
+    def __init__(self, data, start=0):
+        self._data = data
+        self._start = start
+        self._count = struct.unpack("<I", data[start:start+4])[0]
+
+    def _find(self, trigram):
+        data = self._data
+        size = TRIGRAMENTRY.size
+        lo = 0
+        hi = self._count
+        while lo < hi:
+            mid = (lo+hi)//2
+            pos = self._start+4+mid*size
+            entry, position, count = TRIGRAMENTRY.unpack(data[pos:pos+size])
+            if entry == trigram:
+                return count, self._start+position
+            elif entry < trigram:
+                lo = mid+1
+            else:
+                hi = mid
+        return None
+
+    def find(self, terms):
+        """Return the sorted ids of the records with all terms.
+
+        Records are only known to contain the trigrams of the terms,
+        so they must still be checked. None is returned if the terms
+        have no trigrams at all.
+        """
+        found = {}
+        for term in terms:
+            found.update(trigrams(term))
+        if not found:
+            return None
+        entries = []
+        for trigram in found:
+            entry = self._find(trigram)
+            if not entry:
+                return []
+            entries.append(entry)
+        entries.sort()
+        ids = None
+        for count, position in entries:
+            data = self._data[position:position+count*4]
+            found = struct.unpack("<%dI" % count, data)
+            if ids is None:
+                ids = set(found)
+            else:
+                ids.intersection_update(found)
+            if not ids:
+                return []
+        ids = list(ids)
+        ids.sort()
+        return ids
+
+class InfoIndex:
+    """Find the values for a key in an infopack file without reading it.
+
+    The offset of each key in the file is kept in a sorted index,
+    saved as <filename>.idx, and binary searched on lookups. Both
+    files are mapped in memory, so only the pages used by lookups are
+    ever read. The index is rebuilt whenever the file changes, and
+    kept in memory if it can't be saved.
+
+    For searches, a trigram index of the records is kept the same way
+    in <filename>.tri, built on the first search.
+    """
+    def __init__(self, filename):
+        self._filename = filename
+        self._stamp = None
+        self._data = ""
+        self._index = ""
+        self._start = 0
+        self._trigrams = None
+
+    def close(self):
+        maps = [self._data, self._index]
+        if self._trigrams:
+            maps.append(self._trigrams._data)
+        for map in maps:
+            if isinstance(map, mmap.mmap):
+                map.close()
+        self._stamp = None
+        self._data = ""
+        self._index = ""
+        self._trigrams = None
+
+    def _check(self):
+        stamp = filestamp(self._filename)
+        if stamp != self._stamp:
+            self.close()
+            self._index = self._sidecar(".idx", INDEXHEADER % stamp,
+                                        self._build)
+            self._start = len(INDEXHEADER % stamp)
+            file = open(self._filename)
+            self._data = mapfile(file)
+            file.close()
+            self._stamp = stamp
+
+    def _sidecar(self, suffix, header, build):
+        filename = self._filename+suffix
+        try:
+            file = open(filename)
+            try:
+                if file.readline() == header:
+                    return mapfile(file)
+            finally:
+                file.close()
+        except IOError:
+            pass
+        data = header+build()
+        try:
+            file = open(filename+".tmp", "w")
+            file.write(data)
+            file.close()
+            os.rename(filename+".tmp", filename)
+        except (IOError, OSError):
+            pass
+        return data
+
+    def _build(self):
+        offsets = {}
+        offset = 0
+        file = open(self._filename)
+        for line in file:
+            if line[:2] == "K:":
+                key = line[2:].rstrip().lower()
+                if key not in offsets:
+                    offsets[key] = offset
+            offset += len(line)
+        file.close()
+        return buildindex(offsets)
+
+    def _buildtrigrams(self):
+        return buildtrigrams([(offset, [key]+[value[1] for value in values])
+                              for offset, key, values in self.records()])
+
+    def _find(self, key):
+        index = self._index
+        lo = self._start
+        hi = len(index)
+        while lo < hi:
+            start = max(index.rfind("\n", lo, (lo+hi)//2)+1, lo)
+            end = index.find("\n", start)
+            entry, offset = index[start:end].split("\0")
+            if entry == key:
+                return int(offset)
+            elif entry < key:
+                lo = end+1
+            else:
+                hi = start
+        return None
+
+    def get(self, key):
+        """Return the key as written in the file, and its values."""
+        self._check()
+        offset = self._find(key)
+        if offset is None:
+            return key, []
+        data = self._data
+        end = data.find("\n", offset)
+        key = data[offset+2:end].rstrip()
+        values = []
+        while end != -1:
+            start = end+1
+            end = data.find("\n", start)
+            if end == -1:
+                line = data[start:]
+            else:
+                line = data[start:end]
+            if line[:1] == "#":
+                continue
+            if line[:1] == "V":
+                value = line[2:].split(":", 1)
+                value[1] = value[1].rstrip()
+                values.append(value)
+            elif values:
+                break
+        return key, values
+
+    def record(self, offset):
+        """Return the key and values of the record at offset.
+
+        Unlike get(), the values are the ones up to the next key, as
+        seen when searching the file.
+        """
+        data = self._data
+        end = data.find("\n", offset)
+        key = data[offset+2:end].rstrip()
+        values = []
+        while end != -1:
+            start = end+1
+            end = data.find("\n", start)
+            if end == -1:
+                line = data[start:]
+            else:
+                line = data[start:end]
+            if line[:1] == "K":
+                break
+            elif line[:1] == "V":
+                value = line[2:].split(":", 1)
+                value[1] = value[1].rstrip()
+                values.append(value)
+        return key, values
+
+    def records(self):
+        """Yield (offset, key, values) for each record in the file."""
+        file = open(self._filename)
+        key = None
+        offset = 0
+        for line in file:
+            if line[:1] == "K":
+                if key is not None:
+                    yield start, key, values
+                start = offset
+                key = line[2:].rstrip()
+                values = []
+            elif line[:1] == "V" and key is not None:
+                value = line[2:].split(":", 1)
+                value[1] = value[1].rstrip()
+                values.append(value)
+            offset += len(line)
+        file.close()
+        if key is not None:
+            yield start, key, values
+
+    def find(self, terms):
+        """Return the offsets of the records which may have all terms.
+
+        None is returned if the terms can't be looked up.
+        """
+        self._check()
+        if not self._trigrams:
+            header = TRIGRAMHEADER % self._stamp
+            data = self._sidecar(".tri", header, self._buildtrigrams)
+            self._trigrams = TrigramIndex(data, len(header))
+        return self._trigrams.find(terms)
+
+class InfoWriter:
+    """Write an infopack, together with its key and trigram indexes.
+
+    Core lines (triggers, masks, help and defaults) must be written
+    with core() before any record is added with add(). Records are
+    streamed to the file, and the indexes loaded by InfoIndex are
+    written on close(), so the new infopack may be used at once. The
+    file is written under a temporary name, and only replaces an
+    existing infopack once complete.
+    """
+    def __init__(self, filename):
+        self._filename = filename
+        self._file = open(filename+".tmp", "w")
+        self._offset = 0
+        self._offsets = {}
+        self._records = []
+
+    def _write(self, line):
+        self._file.write(line)
+        self._offset += len(line)
+
+    def core(self, line):
+        """Write a core line, like "T:<trigger>" or "M:<mask>"."""
+        if self._offsets:
+            raise ValueError, "core lines must come before records"
+        self._write(line.rstrip("\n")+"\n")
+
+    def add(self, key, values):
+        """Write the record for key, with a list of (flags, text) values."""
+        self._offsets.setdefault(key.lower(), self._offset)
+        self._records.append((self._offset, [key]+[x[1] for x in values]))
+        self._write("K:%s\n" % key)
+        for flags, text in values:
+            self._write("V:%s:%s\n" % (flags, text))
+
+    def close(self):
+        self._file.close()
+        os.rename(self._filename+".tmp", self._filename)
+        stamp = filestamp(self._filename)
+        for suffix, header, data in \
+                ((".idx", INDEXHEADER, buildindex(self._offsets)),
+                 (".tri", TRIGRAMHEADER, buildtrigrams(self._records))):
+            file = open(self._filename+suffix+".tmp", "w")
+            file.write(header % stamp)
+            file.write(data)
+            file.close()
+            os.rename(self._filename+suffix+".tmp", self._filename+suffix)
+
+def readinfo(file):
+    """Split infopack lines into core lines and (key, values) records.
+
+    Returns the list of core lines found before the first key, and an
+    iterator over the records, reading the rest of file as needed.
+    """
+    core = []
+    for line in file:
+        if line[:1] == "K":
+            return core, _readrecords(file, line[2:].rstrip())
+        elif line[:1] and line[:1] in CORELINES:
+            core.append(line.rstrip("\n"))
+    return core, iter(())
+
+def _readrecords(file, key):
+    values = []
+    for line in file:
+        if line[:1] == "K":
+            yield key, values
+            key = line[2:].rstrip()
+            values = []
+        elif line[:1] == "V":
+            value = line[2:].split(":", 1)
+            values.append((value[0], value[1].rstrip()))
+    yield key, values
+
+def writeinfo(records, filename=None, core=None):
+    """Write (key, values) records as an infopack.
+
+    Without a filename, the infopack lines are written to standard
+    output. Otherwise the infopack is built with InfoWriter, and if no
+    core lines are given, the ones of the existing file are kept.
+    """
+    if not filename:
+        for line in core or ():
+            sys.stdout.write(line+"\n")
+        for key, values in records:
+            sys.stdout.write("K:%s\n" % key)
+            for flags, text in values:
+                sys.stdout.write("V:%s:%s\n" % (flags, text))
+        return
+    if core is None:
+        core = []
+        if os.path.isfile(filename):
+            file = open(filename)
+            core = readinfo(file)[0]
+            file.close()
+    writer = InfoWriter(filename)
+    for line in core:
+        writer.core(line)
+    for key, values in records:
+        writer.add(key, values)
+    writer.close()
+
+# vim:ts=4:sw=4:et
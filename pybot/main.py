@@ -25,6 +25,10 @@ import sys
 from pybot.command import Command
 import pybot
 
+# Maximum time the main loop will block waiting for activity. Modules
+# hooked on "Loop" are called at least this often.
+MAXWAIT = 10
+
 class Main:
     """Main pybot class.
     """
@@ -40,6 +44,23 @@ class Main:
         for server in self.servers:
             server.sendline("QUIT :Argh!")
     
+    def wait(self, servers):
+        """Block until there's something to be done.
+
+        That is, until pybot.reactor notices activity on some socket,
+        somebody calls pybot.reactor.wakeup(), or the next timer or
+        server or database deadline is reached.
+        """
+        deadlines = [pybot.mm.nexttimer(defret=None), pybot.db.deadline()]
+        for server in servers:
+            deadlines.append(server.deadline())
+        timeout = MAXWAIT
+        now = time()
+        for deadline in deadlines:
+            if deadline is not None and deadline-now < timeout:
+                timeout = deadline-now
+        pybot.reactor.poll(timeout)
+
     def loop(self):
         hooknames = ["Message", "Notice", "Command", "CTCP", "CTCPReply"]
         callhook = pybot.hooks.call
@@ -68,12 +89,14 @@ class Main:
                             if cmd.forme and cmd._index == 0 and not (0 in ret or -1 in ret):
                                 callhook("UnhandledMessage", cmd)
                 callhook("Loop")
-                sleep(0.5)
+                self.wait(servers)
+                pybot.db.flush()
                 if self.reboot:
                     for server in servers:
                         server.kill()
                         server.interaction()
                     callhook("Reboot")
+                    pybot.db.commit()
                     sleep(2)
                     return 0
                 elif self.quit:
@@ -81,6 +104,7 @@ class Main:
                         server.kill()
                         server.interaction()
                     callhook("Quit")
+                    pybot.db.commit()
                     return 100
         except KeyboardInterrupt:
             for server in servers:
@@ -88,6 +112,7 @@ class Main:
                 server.kill()
                 server.interaction()
             callhook("Quit")
+            pybot.db.commit()
             return 100
 
 # vim:ts=4:sw=4:et
@@ -19,12 +19,23 @@
 from types import StringType, TupleType, ListType, InstanceType
 from random import randint
 from string import rfind
+from sre_constants import LITERAL, SUBPATTERN, MAX_REPEAT, MIN_REPEAT
+from thread import start_new_thread
+import sre_parse
+import pybot
 import re
 
-__all__ = ["buildanswer", "breakline", "regexp", "striphtml"]
+__all__ = ["buildanswer", "breakline", "regexp", "striphtml", "searchterms",
+           "work", "PatternSet"]
 
 MAXLINESIZE = 400
 
+# Python's re module refuses patterns with more groups than this
+MAXGROUPS = 99
+
+# Patterns with backreferences or named groups can't be joined with others
+STANDALONE = re.compile(r"\\\d|\(\?P")
+
 def buildanswer(pattern, target=None, nick=None):
     ret = []
     for tok in pattern:
@@ -121,4 +132,93 @@ def striphtml(s):
     s = s.replace("&amp;", "&") # Must be last
     return s
 
+def searchterms(regexp):
+    """Return strings which everything matching regexp must contain.
+
+    Only strings with at least three characters are returned, since
+    they're looked up by their trigrams.
+    """
+    try:
+        seq = sre_parse.parse(regexp)
+    except:
+        return []
+    terms = []
+    _searchterms(seq, terms)
+    return [term for term in terms if len(term) >= 3]
+
+def _searchterms(seq, terms):
+    run = ""
+    for op, av in seq:
+        if op == LITERAL and av < 128:
+            run += chr(av)
+            continue
+        terms.append(run)
+        run = ""
+        if op == SUBPATTERN:
+            _searchterms(av[-1], terms)
+        elif op in (MAX_REPEAT, MIN_REPEAT) and av[0] > 0:
+            _searchterms(av[2], terms)
+    terms.append(run)
+
+def work(queue, func, args=(), kwargs={}):
+    """Run func(*args, **kwargs) in the named queue of the workers module.
+
+    If the workers module isn't loaded, func is run in a thread of its
+    own. Returns false if the queue is full and the job was dropped.
+    """
+    ret = pybot.mm.work(queue, func, args, kwargs, defret=None)
+    if ret is None:
+        start_new_thread(func, args, kwargs)
+        return 1
+    return ret
+
+class PatternSet:
+    """Tell which one of many compiled patterns first matches a line.
+
+    Patterns are joined in alternations, each one wrapped in its own
+    group, so that a single match tells whether any of them matches a
+    line, and m.lastindex tells which one. Only neighbour patterns with
+    the same flags are joined, patterns with backreferences or named
+    groups are kept on their own, and alternations are split when they
+    would have more groups than the re module supports.
+    """
+    def __init__(self, patterns):
+        self._chunks = []
+        alternatives = []
+        owners = {}
+        groups = 0
+        flags = None
+        for i in range(len(patterns)):
+            pattern = patterns[i]
+            standalone = STANDALONE.search(pattern.pattern)
+            if (standalone or pattern.flags != flags or
+                groups+pattern.groups+1 > MAXGROUPS):
+                self._add(alternatives, owners, flags)
+                alternatives = []
+                owners = {}
+                groups = 0
+                flags = pattern.flags
+            if standalone:
+                self._chunks.append((pattern,
+                        dict([(n, i) for n in range(pattern.groups+1)])))
+                flags = None
+                continue
+            owners[groups+1] = i
+            groups += pattern.groups+1
+            alternatives.append("(%s)" % pattern.pattern)
+        self._add(alternatives, owners, flags)
+
+    def _add(self, alternatives, owners, flags):
+        if alternatives:
+            pattern = re.compile("|".join(alternatives), flags)
+            self._chunks.append((pattern, owners))
+
+    def first(self, line):
+        """Return the index of the first pattern matching line, or None."""
+        for pattern, owners in self._chunks:
+            m = pattern.match(line)
+            if m:
+                return owners[m.lastindex or 0]
+        return None
+
 # vim:ts=4:sw=4:et
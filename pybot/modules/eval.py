@@ -17,7 +17,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pybot.locals import *
-import thread
+from pybot.misc import work
 import signal
 import time
 import math
@@ -57,7 +57,6 @@ TRANSTABLE = '                                 !"#$%&\'()*+,-./0123456789:;' \
 
 class Eval:
     def __init__(self):
-        hooks.register("Message", self.message)
         self.dict = {}
         self.dict["__builtins__"] = {}
         self.dict.update(math.__dict__)
@@ -111,13 +110,17 @@ class Eval:
         # show eval keywords
         self.re2 = regexp(r"show eval keywords?")
 
+        router.register(self.re1, self.evaluate, forme=1)
+        router.register(self.re2, self.show_keywords, forme=1)
+
         # eval[uate|uation]
         mm.register_help("eval(?:uate|uation)?", HELP, "eval")
 
         mm.register_perm("eval", PERM_EVAL)
     
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.evaluate)
+        router.unregister(self.re2, self.show_keywords)
         mm.unregister_help(HELP)
         mm.unregister_perm("eval")
 
@@ -185,37 +188,35 @@ class Eval:
         else:
             msg.answer("%:", answer)
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "eval"):
-                thread.start_new_thread(self.eval, (msg, m.group("expr")))
-            else:
-                msg.answer("%:", ["Nope", "Oops"], [".", "!"],
-                                 ["You don't have this power",
-                                  "You can't do this",
-                                  "You're not allowed to do this"],
+    def evaluate(self, msg, m):
+        if mm.hasperm(msg, "eval"):
+            if not work("eval", self.eval, (msg, m.group("expr"))):
+                msg.answer("%:", ["Sorry, but", "Oops,"],
+                                 ["I'm too busy right now",
+                                  "there are too many evaluations waiting"],
                                  [".", "!"])
-            return 0
-
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "eval"):
-                keywords = self.dict.keys()
-                keywords.remove("__builtins__")
-                keywords.sort()
-                msg.answer("%:", "The following keywords are available:",
-                           ", ".join(keywords))
-            else:
-                msg.answer("%:", ["Nope", "Oops"], [".", "!"],
-                                 ["You don't have this power",
-                                  "You can't do this",
-                                  "You're not allowed to do this"],
-                                 [".", "!"])
-            return 0
+        else:
+            msg.answer("%:", ["Nope", "Oops"], [".", "!"],
+                             ["You don't have this power",
+                              "You can't do this",
+                              "You're not allowed to do this"],
+                             [".", "!"])
+        return 0
+
+    def show_keywords(self, msg, m):
+        if mm.hasperm(msg, "eval"):
+            keywords = self.dict.keys()
+            keywords.remove("__builtins__")
+            keywords.sort()
+            msg.answer("%:", "The following keywords are available:",
+                       ", ".join(keywords))
+        else:
+            msg.answer("%:", ["Nope", "Oops"], [".", "!"],
+                             ["You don't have this power",
+                              "You can't do this",
+                              "You're not allowed to do this"],
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
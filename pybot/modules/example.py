@@ -33,11 +33,13 @@ module. For more information, check "help example".
 
 class Example:
     def __init__(self):
-        hooks.register("Message", self.message)
-    
         # hello (world|irc)
         self.re1 = regexp(r"hello (?P<what>world|irc)")
 
+        # The router calls hello() when a message matches re1. The
+        # forme=1 filter restricts it to messages addressed to pybot.
+        router.register(self.re1, self.hello, forme=1)
+
         mm.register_help(r"example", HELP, "example")
 
         mm.register_perm("example", PERM_EXAMPLE)
@@ -75,26 +77,21 @@ class Example:
         #db.execute("insert into test values (?,?)", loads, int(time.time()))
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.hello)
         mm.unregister_help(HELP)
         mm.unregister_perm(PERM_EXAMPLE)
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "example"):
-                what = m.group("what")
-                msg.answer("%:", "The", what, "welcomes you",
-                                 [(",", "/"), None],
-                                 [".", "!"])
-            else:
-                msg.answer("%:", ["You have no permission for that",
-                                  "You are not allowed to do this"],
-                                 [".", "!"])
-            return 0
+    def hello(self, msg, m):
+        if mm.hasperm(msg, "example"):
+            what = m.group("what")
+            msg.answer("%:", "The", what, "welcomes you",
+                             [(",", "/"), None],
+                             [".", "!"])
+        else:
+            msg.answer("%:", ["You have no permission for that",
+                              "You are not allowed to do this"],
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
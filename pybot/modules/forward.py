@@ -51,7 +51,6 @@ class Forward:
         hooks.register("OutCTCP", self.ctcp_forward, 100)
         hooks.register("UserJoined", self.joined_forward, 100)
         hooks.register("UserParted", self.parted_forward, 100)
-        hooks.register("Message", self.message)
 
         # forward messages [for you] [(from|on|at) [user|channel] <fromtarget>] [(from|on|at) server <fromserver>]] to [user|channel] <totarget> [(on|at) server <toserver>] [with (server|channel [and server]|<withstring>)] [!|.]
         self.re1 = regexp(r"(?P<dont>do not |don't )?forward messages (?P<foryou>for you )?(?:(?:from |on |at )(?:channel |user )?(?P<fromtarget>\S+) )?(?:(?:from |on |at )(?:server )?(?P<fromserver>\S+) )?to (?:user |channel )?(?P<totarget>\S+)(?: (?:on |at )server (?P<toserver>\S+))?(?: with (?P<withchannel>channel)?(?: and)?(?P<withserver> server)?(?P<withstring>\S+)?)?")
@@ -59,6 +58,9 @@ class Forward:
         # show forwards
         self.re2 = regexp(r"show forwards")
 
+        router.register(self.re1, self.forward, forme=1)
+        router.register(self.re2, self.show_forwards, forme=1)
+
         # [message] forward[ing]
         mm.register_help("(?:message )?forward(?:ing)?", HELP, "forward")
 
@@ -73,7 +75,8 @@ class Forward:
         hooks.unregister("OutCTCP", self.ctcp_forward, 100)
         hooks.unregister("UserJoined", self.joined_forward, 100)
         hooks.unregister("UserParted", self.parted_forward, 100)
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.forward)
+        router.unregister(self.re2, self.show_forwards)
         mm.unregister_help(HELP)
         mm.unregister_perm("forward")
     
@@ -123,117 +126,111 @@ class Forward:
             self.do_forward(server, target, user.nick, 0,
                             "--> ", " has leaved")
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "forward"):
-                foryou = m.group("foryou") != None
-                fromtarget = m.group("fromtarget")
-                fromserver = m.group("fromserver")
-                totarget = m.group("totarget")
-                toserver = m.group("toserver") or msg.server.servername
-                withstring = m.group("withstring")
-                if withstring:
-                    with = ":"+withstring
+    def forward(self, msg, m):
+        if mm.hasperm(msg, "forward"):
+            foryou = m.group("foryou") != None
+            fromtarget = m.group("fromtarget")
+            fromserver = m.group("fromserver")
+            totarget = m.group("totarget")
+            toserver = m.group("toserver") or msg.server.servername
+            withstring = m.group("withstring")
+            if withstring:
+                with = ":"+withstring
+            else:
+                with = ""
+                if m.group("withchannel"):
+                    with += "c"
+                if m.group("withserver"):
+                    with += "s"
+            flags = ""
+            if foryou:
+                flags += "f"
+            if m.group("dont"):
+                where = []
+                wargs = []
+                if fromserver:
+                    where.append("fromserver=?")
+                    wargs.append(fromserver)
                 else:
-                    with = ""
-                    if m.group("withchannel"):
-                        with += "c"
-                    if m.group("withserver"):
-                        with += "s"
-                flags = ""
-                if foryou:
-                    flags += "f"
-                if m.group("dont"):
-                    where = []
-                    wargs = []
-                    if fromserver:
-                        where.append("fromserver=?")
-                        wargs.append(fromserver)
-                    else:
-                        where.append("fromserver isnull")
-                    if fromtarget:
-                        where.append("fromtarget=?")
-                        wargs.append(fromtarget)
-                    else:
-                        where.append("fromtarget isnull")
-                    where.extend(["toserver=?", "totarget=?",
-                                  "flags=?", "with=?"])
-                    wstr = " and ".join(where)
-                    wargs.extend([toserver, totarget, flags, with])
-                    db.execute("delete from forward where "+wstr, *wargs)
-                    if not db.changed:
-                        msg.answer("%:", ["Sorry, but",
-                                          "Oops! I think", None],
-                                         "I'm not forwarding any messages "
-                                         "like this", [".", "!"])
-                    else:
-                        msg.answer("%:", ["Sure", "I won't forward",
-                                          "Of course", "No problems"],
-                                         ["!", "."])
+                    where.append("fromserver isnull")
+                if fromtarget:
+                    where.append("fromtarget=?")
+                    wargs.append(fromtarget)
                 else:
-                    try:
-                        db.execute("insert into forward values (?,?,?,?,?,?)",
-                                   fromserver, fromtarget, toserver,
-                                   totarget, flags, with)
-                        msg.answer("%:", ["Sure", "I'll forward",
-                                          "Right now", "Of course"],
-                                         ["!", "."])
-                    except db.error:
-                        msg.answer("%:", "I'm already forwarding this.")
-            else:
-                msg.answer("%:", ["You're not allowed to work with forwards",
-                                  "Unfortunately, you can't do that",
-                                  "You're not able to do that"],
-                                 [".", "!"])
-            return 0
-        
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "forward"):
-                db.execute("select * from forward")
-                if not db.results:
-                    msg.answer("%:", "I'm not forwarding anything", ["!", "."])
-                    return 0
-                for row in db:
-                    str = "I'm forwarding messages"
-                    if "f" in row.flags:
-                        str += " for me"
-                    if row.fromserver and row.fromtarget:
-                        str += " from "
-                        str += row.fromtarget
-                        str += " on server "
-                        str += msg.fromserver
-                    elif row.fromtarget:
-                        str += " from "
-                        str += row.fromtarget
-                    elif row.fromserver:
-                        str += " from server "
-                        str += row.fromserver
-                    str += " to "
-                    str += row.totarget
-                    if row.toserver and row.toserver != msg.server.servername:
-                        str += " on server "
-                        str += row.toserver
-                    if row.with.startswith(":"):
-                        str += " with "
-                        str += row.with[1:]
-                    elif "c" in row.with and "s" in row.with:
-                        str = str+" with channel and server"
-                    elif "c" in row.with:
-                        str = str+" with channel"
-                    elif "s" in row.with:
-                        str = str+" with server"
-                    msg.answer("%:", str, ".")
+                    where.append("fromtarget isnull")
+                where.extend(["toserver=?", "totarget=?",
+                              "flags=?", "with=?"])
+                wstr = " and ".join(where)
+                wargs.extend([toserver, totarget, flags, with])
+                db.execute("delete from forward where "+wstr, *wargs)
+                if not db.changed:
+                    msg.answer("%:", ["Sorry, but",
+                                      "Oops! I think", None],
+                                     "I'm not forwarding any messages "
+                                     "like this", [".", "!"])
+                else:
+                    msg.answer("%:", ["Sure", "I won't forward",
+                                      "Of course", "No problems"],
+                                     ["!", "."])
             else:
-                msg.answer("%:", ["You're not allowed to work with forwards",
-                                  "Unfortunately, you can't do that",
-                                  "You're not able to do that"],
-                                 [".", "!"])
-            return 0
+                try:
+                    db.execute("insert into forward values (?,?,?,?,?,?)",
+                               fromserver, fromtarget, toserver,
+                               totarget, flags, with)
+                    msg.answer("%:", ["Sure", "I'll forward",
+                                      "Right now", "Of course"],
+                                     ["!", "."])
+                except db.error:
+                    msg.answer("%:", "I'm already forwarding this.")
+        else:
+            msg.answer("%:", ["You're not allowed to work with forwards",
+                              "Unfortunately, you can't do that",
+                              "You're not able to do that"],
+                             [".", "!"])
+        return 0
+
+    def show_forwards(self, msg, m):
+        if mm.hasperm(msg, "forward"):
+            db.execute("select * from forward")
+            if not db.results:
+                msg.answer("%:", "I'm not forwarding anything", ["!", "."])
+                return 0
+            for row in db:
+                str = "I'm forwarding messages"
+                if "f" in row.flags:
+                    str += " for me"
+                if row.fromserver and row.fromtarget:
+                    str += " from "
+                    str += row.fromtarget
+                    str += " on server "
+                    str += msg.fromserver
+                elif row.fromtarget:
+                    str += " from "
+                    str += row.fromtarget
+                elif row.fromserver:
+                    str += " from server "
+                    str += row.fromserver
+                str += " to "
+                str += row.totarget
+                if row.toserver and row.toserver != msg.server.servername:
+                    str += " on server "
+                    str += row.toserver
+                if row.with.startswith(":"):
+                    str += " with "
+                    str += row.with[1:]
+                elif "c" in row.with and "s" in row.with:
+                    str = str+" with channel and server"
+                elif "c" in row.with:
+                    str = str+" with channel"
+                elif "s" in row.with:
+                    str = str+" with server"
+                msg.answer("%:", str, ".")
+        else:
+            msg.answer("%:", ["You're not allowed to work with forwards",
+                              "Unfortunately, you can't do that",
+                              "You're not able to do that"],
+                             [".", "!"])
+        return 0
     
 def __loadmodule__():
     global mod
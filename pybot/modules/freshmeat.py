@@ -17,7 +17,8 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pybot.locals import *
-import urllib
+from pybot.misc import work
+import urllib2
 import thread
 import string
 
@@ -34,6 +35,9 @@ channels will receive freshmeat news. Check "help freshmeat" for
 more information.
 """
 
+# Seconds to wait for the news server before giving up.
+FETCHTIMEOUT = 60
+
 class Freshmeat:
     def __init__(self):
         self.url = config.get("freshmeat", "url")
@@ -43,12 +47,13 @@ class Freshmeat:
 
         self.fetch_lock = thread.allocate_lock()
 
-        hooks.register("Message", self.message)
 
         mm.hooktimer(self.interval*60, self.checknews, ())
         
         # [don[']t|do not] show freshmeat news [(to|on|at|for) [channel|user] <target> [[on|at] server <server>]]
         self.re1 = regexp(r"(?P<dont>don'?t |do not )?show freshmeat news(?: (?:to|on|at|for)(?: channel| user)? (?P<target>\S+)(?:(?: on| at)? server (?P<server>\S+?))?)?")
+
+        router.register(self.re1, self.show_news, forme=1)
         
         # freshmeat [news]
         mm.register_help("freshmeat(?: news)?", HELP, "freshmeat")
@@ -56,7 +61,7 @@ class Freshmeat:
         mm.register_perm("freshmeat", PERM_FRESHMEAT)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.show_news)
         mm.unhooktimer(self.interval*60, self.checknews, ())
         mm.unregister_help(HELP)
         mm.unregister_perm("freshmeat")
@@ -78,7 +83,13 @@ class Freshmeat:
     
     def fetchnews(self):
         try:
-            url = urllib.urlopen(self.url)
+            self.readnews()
+        finally:
+            self.fetch_lock.release()
+
+    def readnews(self):
+        try:
+            url = urllib2.urlopen(self.url, timeout=FETCHTIMEOUT)
         except:
             pass
         else:
@@ -103,52 +114,47 @@ class Freshmeat:
                 localdb["freshmeat.last"] = str(newslist[0])
                 newslist.reverse()
                 self.shownews(newslist)
-        self.fetch_lock.release()
     
     def checknews(self):
         db.execute("select null from freshmeat")
         if db.results and self.fetch_lock.acquire(0):
-            thread.start_new_thread(self.fetchnews, ())
+            if not work("freshmeat", self.fetchnews, ()):
+                self.fetch_lock.release()
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "freshmeat"):
-                target = m.group("target") or msg.target
-                servername = m.group("server") or msg.server.servername
-                if not m.group("dont"):
-                    db.execute("select * from freshmeat where "
-                               "servername=? and target=?",
-                               servername, target)
-                    if db.results:
-                        msg.answer("%:", ["Oops!", "Sorry!", "Nope."],
-                                         "I'm already showing news for "
-                                         "this target", ["!", "."])
-                    else:
-                        db.execute("insert into freshmeat values (?,?)",
-                                   servername, target)
-                        msg.answer("%:", ["Sure", "I'll show",
-                                          "Of course"], ["!", "."])
+    def show_news(self, msg, m):
+        if mm.hasperm(msg, "freshmeat"):
+            target = m.group("target") or msg.target
+            servername = m.group("server") or msg.server.servername
+            if not m.group("dont"):
+                db.execute("select * from freshmeat where "
+                           "servername=? and target=?",
+                           servername, target)
+                if db.results:
+                    msg.answer("%:", ["Oops!", "Sorry!", "Nope."],
+                                     "I'm already showing news for "
+                                     "this target", ["!", "."])
                 else:
-                    db.execute("delete from freshmeat where "
-                               "servername=? and target=?",
+                    db.execute("insert into freshmeat values (?,?)",
                                servername, target)
-                    if not db.changed:
-                        msg.answer("%:", ["Oops!", "Sorry!", "Nope."],
-                                         "I'm not showing news for "
-                                         "this target", ["!", "."])
-                    else:
-                        msg.answer("%:", ["Sure", "I won't show",
-                                          "Of course"], ["!", "."])
+                    msg.answer("%:", ["Sure", "I'll show",
+                                      "Of course"], ["!", "."])
             else:
-                msg.answer("%:", ["You can't", "You're not allowed to",
-                                  "You're not good enough to"],
-                                 ["do this",
-                                  "change freshmeat settings"], ["!", "."])
-            return 0
+                db.execute("delete from freshmeat where "
+                           "servername=? and target=?",
+                           servername, target)
+                if not db.changed:
+                    msg.answer("%:", ["Oops!", "Sorry!", "Nope."],
+                                     "I'm not showing news for "
+                                     "this target", ["!", "."])
+                else:
+                    msg.answer("%:", ["Sure", "I won't show",
+                                      "Of course"], ["!", "."])
+        else:
+            msg.answer("%:", ["You can't", "You're not allowed to",
+                              "You're not good enough to"],
+                             ["do this",
+                              "change freshmeat settings"], ["!", "."])
+        return 0
     
 def __loadmodule__():
     global mod
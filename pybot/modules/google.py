@@ -18,7 +18,8 @@
 
 from pybot.locals import *
 from pybot.util import SOAPpy
-import thread
+from pybot.misc import work
+import socket
 import re
 
 HELP = """
@@ -33,6 +34,9 @@ The "google" permission allows users to ask for google search results.
 Check "help google" for more information.
 """
 
+# Seconds to wait for google before giving up.
+SEARCHTIMEOUT = 60
+
 class Google:
     def __init__(self):
         if config.has_option("global", "http_proxy"):
@@ -42,10 +46,11 @@ class Google:
             self.proxy = None
         self.key = config.get("google", "license_key")
 
-        hooks.register("Message", self.message)
 
         # [search] google [<n>]: <search>
         self.re1 = regexp(r"(?:search )?google(?: (?P<n>\d+))?: *(?P<search>.+)")
+
+        router.register(self.re1, self.google, forme=1)
         
         mm.register_help("(?:search )?google(?: search)?", HELP,
                          "google")
@@ -53,7 +58,7 @@ class Google:
         mm.register_perm("google", PERM_GOOGLE)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.google)
         mm.unregister_help(HELP)
         mm.unregister_perm("google")
 
@@ -61,7 +66,8 @@ class Google:
         try:
             proxy = SOAPpy.SOAPProxy("http://api.google.com/search/beta2",
                                      namespace="urn:GoogleSearch",
-                                     http_proxy=self.proxy)
+                                     http_proxy=self.proxy,
+                                     timeout=SEARCHTIMEOUT)
             result = proxy.doGoogleSearch(self.key, search, n, 1,
                                           SOAPpy.booleanType(1), "",
                                           SOAPpy.booleanType(0), "",
@@ -81,7 +87,7 @@ class Google:
                     msg.answer("%:", "%s <%s> - %s" % (title, url, snippet))
                 else:
                     msg.answer("%:", "%s <%s>" % (title, url))
-        except SOAPpy.Errors.Error:
+        except (SOAPpy.Errors.Error, socket.error):
             import traceback
             traceback.print_exc()
             msg.answer("%:", ["There was an error trying to ask google",
@@ -90,22 +96,21 @@ class Google:
                               "I got some problem while trying to do that"],
                              [".", "!"])
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "google"):
-                n = int(m.group("n") or 0)
-                search = m.group("search")
-                thread.start_new_thread(self.search, (msg, search, n))
-            else:
-                msg.answer("%:", ["You can't", "You're not allowed to",
-                                  "You're not good enough to"],
-                                 ["do google actions",
-                                  "use google"], ["!", "."])
-            return 0
+    def google(self, msg, m):
+        if mm.hasperm(msg, "google"):
+            n = int(m.group("n") or 0)
+            search = m.group("search")
+            if not work("google", self.search, (msg, search, n)):
+                msg.answer("%:", ["Sorry, but", "Oops,"],
+                                 ["I'm too busy right now",
+                                  "there are too many searches waiting"],
+                                 [".", "!"])
+        else:
+            msg.answer("%:", ["You can't", "You're not allowed to",
+                              "You're not good enough to"],
+                             ["do google actions",
+                              "use google"], ["!", "."])
+        return 0
     
 def __loadmodule__():
     global mod
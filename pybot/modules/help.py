@@ -36,68 +36,64 @@ class Help:
         mm.register("unregister_help", self.mm_unregister_help)
         mm.register("register_perm", self.mm_register_perm)
         mm.register("unregister_perm", self.mm_unregister_perm)
-        hooks.register("Message", self.message)
         
         # [can you] [please,] [show] help [me] [about] <keyword>
         self.re1 = regexp(r"(?:can you )?(?:please,? )?(?:show )?help(?: me)?(?: about)?(?: (?P<something>.+?))?")
 
+        router.register(self.re1, self.help, forme=1)
+
         self.mm_register_perm("help", PERM_HELP)
         
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.help)
         mm.unregister("register_help")
         mm.unregister("unregister_help")
         mm.unregister("register_perm")
         mm.unregister("unregister_perm")
         self.mm_unregister_perm("help")
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "help"):
-                something = m.group("something")
-                if something:
-                    found = 0
-                    for pattern, text, triggers in self.data:
-                        match = pattern.match(something)
-                        if match:
-                            if callable(text):
-                                found |= text(msg, match)
-                            elif type(text) in (ListType, TupleType):
-                                found = 1
-                                for line in text:
-                                    line = line.replace("\n", " ").strip()
-                                    msg.answer("%:", line)
-                            else:
-                                found = 1
-                                text = text.replace("\n", " ").strip()
-                                msg.answer("%:", text)
-                else:
-                    found = 1
-                    msg.answer("%:", HELP.replace("\n", " ").strip())
-                    alltriggers = []
-                    for pattern, text, triggers in self.data:
-                        if len(triggers) == 1 and callable(triggers[0]):
-                            alltriggers.extend(triggers[0]())
+    def help(self, msg, m):
+        if mm.hasperm(msg, "help"):
+            something = m.group("something")
+            if something:
+                found = 0
+                for pattern, text, triggers in self.data:
+                    match = pattern.match(something)
+                    if match:
+                        if callable(text):
+                            found |= text(msg, match)
+                        elif type(text) in (ListType, TupleType):
+                            found = 1
+                            for line in text:
+                                line = line.replace("\n", " ").strip()
+                                msg.answer("%:", line)
                         else:
-                            alltriggers.extend(triggers)
-                    if alltriggers:
-                        alltriggers.sort()
-                        s = "At least the following help topics are known: "
-                        s += ", ".join(alltriggers)
-                        msg.answer("%:", s)
-                if not found:
-                    msg.answer("%:", ["No", "Sorry, no",
-                                      "Sorry, but there's no"],
-                                     "help about that", [".", "!"])
+                            found = 1
+                            text = text.replace("\n", " ").strip()
+                            msg.answer("%:", text)
             else:
-                msg.answer("%:", ["Sorry, you", "You"],
-                                 ["can't", "are not allowed to"],
-                                 "ask for help", [".", "!"])
-            return 0
+                found = 1
+                msg.answer("%:", HELP.replace("\n", " ").strip())
+                alltriggers = []
+                for pattern, text, triggers in self.data:
+                    if len(triggers) == 1 and callable(triggers[0]):
+                        alltriggers.extend(triggers[0]())
+                    else:
+                        alltriggers.extend(triggers)
+                if alltriggers:
+                    alltriggers.sort()
+                    s = "At least the following help topics are known: "
+                    s += ", ".join(alltriggers)
+                    msg.answer("%:", s)
+            if not found:
+                msg.answer("%:", ["No", "Sorry, no",
+                                  "Sorry, but there's no"],
+                                 "help about that", [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"],
+                             ["can't", "are not allowed to"],
+                             "ask for help", [".", "!"])
+        return 0
 
     def mm_register_help(self, pattern, text, triggers=None):
         if not triggers:
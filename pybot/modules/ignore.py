@@ -46,11 +46,12 @@ class Ignore:
         db.table("ignore", "servername text, target text, userstr text")
         
         hooks.register("Message", self.message_ignore, 200)
-        hooks.register("Message", self.message)
 
         # [do not|don't] ignore [user <user>] [on|at] [this channel|channel <channel>] [on|at] [this server|server <server>]
         self.re1 = regexp(r"(?P<dont>do not |don't )?ignore (?:user (?P<user>\S+?))?(?:(?:on |at )?(?:(?P<thischannel>this channel)|channel (?P<channel>\S+)))?(?:(?:on |at )?(?:(?P<thisserver>this server)|server (?P<server>\S+?)))?")
 
+        router.register(self.re1, self.set_ignore, forme=1)
+
         # [un]ignore
         mm.register_help(r"(?:un)?ignore", HELP, "ignore")
 
@@ -59,7 +60,7 @@ class Ignore:
     
     def unload(self):
         hooks.unregister("Message", self.message_ignore, 200)
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.set_ignore)
         mm.unregister_help(HELP)
         mm.unregister_perm("ignore")
         mm.unregister_perm("neverignore")
@@ -80,43 +81,38 @@ class Ignore:
             return -1
         self.repeat[msgkey] = now
 
-    def message(self, msg):
-        if not msg.forme:
-            return
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "ignore"):
-                userstr = m.group("user")
-                if not filter(bool, m.groups()):
-                    return
-                if m.group("thischannel"):
-                    target = msg.target
+    def set_ignore(self, msg, m):
+        if mm.hasperm(msg, "ignore"):
+            userstr = m.group("user")
+            if not filter(bool, m.groups()):
+                return
+            if m.group("thischannel"):
+                target = msg.target
+                servername = msg.server.servername
+            else:
+                target = m.group("channel")
+                if m.group("thisserver"):
                     servername = msg.server.servername
                 else:
-                    target = m.group("channel")
-                    if m.group("thisserver"):
-                        servername = msg.server.servername
-                    else:
-                        servername = m.group("server")
-                if not m.group("dont"):
-                    if self.ignore(servername, target, userstr):
-                        msg.answer("%:", ["Done", "Ignored",
-                                          "No problems", "Ok"], [".", "!"])
-                    else:
-                        msg.answer("%:", "I was already ignoring it",
-                                         [".", "!"])
+                    servername = m.group("server")
+            if not m.group("dont"):
+                if self.ignore(servername, target, userstr):
+                    msg.answer("%:", ["Done", "Ignored",
+                                      "No problems", "Ok"], [".", "!"])
                 else:
-                    if self.dontignore(servername, target, userstr):
-                        msg.answer("%:", ["Done", "No problems",
-                                          "Ok", "Right now"], [".", "!"])
-                    else:
-                        msg.answer("%:", "I'm not ignoring it", [".", "!"])
+                    msg.answer("%:", "I was already ignoring it",
+                                     [".", "!"])
             else:
-                msg.answer("%:", ["Sorry, you", "Oops, you", "You"],
-                                 ["can't do this", "don't have this power"],
-                                 [".", "!"])
-            return 0
+                if self.dontignore(servername, target, userstr):
+                    msg.answer("%:", ["Done", "No problems",
+                                      "Ok", "Right now"], [".", "!"])
+                else:
+                    msg.answer("%:", "I'm not ignoring it", [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "Oops, you", "You"],
+                             ["can't do this", "don't have this power"],
+                             [".", "!"])
+        return 0
 
     def ignore(self, servername, target, userstr):
         existed = self.dontignore(servername, target, userstr, check=1)
@@ -17,6 +17,9 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pybot.locals import *
+from pybot.infofile import InfoIndex, TrigramIndex, buildtrigrams
+from pybot.misc import searchterms, PatternSet
+from array import array
 import random
 import re
 import os
@@ -59,13 +62,120 @@ class Info:
         self.notice = notice
         self.tonick = tonick
 
+class InfoStore:
+    """Keys and values of an infopack loaded in memory.
+
+    Works like a dict mapping lowercase keys to (key, values) tuples,
+    but rather than keeping lists and strings for every value, the
+    texts of each key and its values are joined in a single string,
+    with their positions kept in an array, and the flags of values as
+    indexes in a table of the distinct flags found. Lowercase keys are
+    joined the same way, sorted, and binary searched. Values are only
+    built when asked for.
+    """
+    def __init__(self):
+        self._first = array("I")
+        self._positions = array("I", [0])
+        self._flags = array("H")
+        self._flagtable = []
+        self._flagindex = {}
+        self._text = ""
+        self._parts = []
+        self._length = 0
+        self._keys = {}
+        self._keytext = ""
+        self._keypositions = array("I", [0])
+        self._records = array("I")
+
+    def _append(self, flagindex, text):
+        self._flags.append(flagindex)
+        self._parts.append(text)
+        self._length += len(text)
+        self._positions.append(self._length)
+
+    def add(self, key):
+        """Start a new record for key, replacing any previous one."""
+        self._keys[key.lower()] = len(self._first)
+        self._first.append(len(self._flags))
+        self._append(0, key)
+
+    def addvalue(self, flags, text):
+        """Add a value to the last record started."""
+        try:
+            flagindex = self._flagindex[flags]
+        except KeyError:
+            flagindex = self._flagindex[flags] = len(self._flagtable)
+            self._flagtable.append(flags)
+        self._append(flagindex, text)
+
+    def finish(self):
+        """Join the texts after the last record was added."""
+        self._first.append(len(self._flags))
+        self._text = "".join(self._parts)
+        self._parts = []
+        keys = self._keys.keys()
+        keys.sort()
+        length = 0
+        for key in keys:
+            length += len(key)
+            self._keypositions.append(length)
+            self._records.append(self._keys[key])
+        self._keytext = "".join(keys)
+        self._keys = {}
+
+    def _record(self, record):
+        text = self._text
+        positions = self._positions
+        flagtable = self._flagtable
+        flags = self._flags
+        first = self._first[record]
+        values = []
+        for i in range(first+1, self._first[record+1]):
+            values.append((flagtable[flags[i]],
+                           text[positions[i]:positions[i+1]]))
+        return text[positions[first]:positions[first+1]], values
+
+    def _key(self, i):
+        return self._keytext[self._keypositions[i]:self._keypositions[i+1]]
+
+    def __len__(self):
+        return len(self._records)
+
+    def __getitem__(self, lowerkey):
+        lo = 0
+        hi = len(self._records)
+        while lo < hi:
+            mid = (lo+hi)//2
+            key = self._key(mid)
+            if key == lowerkey:
+                return self._record(self._records[mid])
+            elif key < lowerkey:
+                lo = mid+1
+            else:
+                hi = mid
+        raise KeyError, lowerkey
+
+    def item(self, i):
+        """Return the (key, values) tuple of the i-th key in order."""
+        return self._record(self._records[i])
+
+    def keys(self):
+        return [self._key(i) for i in range(len(self._records))]
+
+    def values(self):
+        return [self._record(record) for record in self._records]
+
 class Infopack:
     def __init__(self, filename):
         self._filename = filename
         self.reset()
 
     def reset(self):
-        self._info = {}
+        if hasattr(self, "_offsets"):
+            self._offsets.close()
+        self._offsets = InfoIndex(self._filename)
+        self._info = InfoStore()
+        self._trigrams = None
         self._triggers = []
         self._masks = []
         self._defaults = []
@@ -82,23 +192,25 @@ class Infopack:
     def help_triggers(self):
         return self._help_triggers
 
+    def triggers(self):
+        return self._triggers
+
     def help_text(self):
         return self._help_text
 
     def load(self):
         self.reset()
-        values = []
+        haskey = 0
         file = open(self._filename)
         for line in file.xreadlines():
             if line and line[0] != "#":
                 if line[0] == "K":
-                    values = []
-                    self._info[line[2:].rstrip().lower()] = \
-                            (line[2:].rstrip(), values)
+                    haskey = 1
+                    self._info.add(line[2:].rstrip())
                 elif line[0] == "V":
                     value = line[2:].split(":", 1)
-                    value[1] = value[1].rstrip()
-                    values.append(value)
+                    if haskey:
+                        self._info.addvalue(value[0], value[1].rstrip())
                 elif line[0] == "T":
                     pattern = re.compile(line[2:].rstrip(), re.I)
                     self._triggers.append(pattern)
@@ -117,6 +229,7 @@ class Infopack:
                     value[1] = value[1].rstrip()
                     self._defaults.append(value)
         file.close()
+        self._info.finish()
     
     def loadcore(self):
         self.reset()
@@ -149,74 +262,52 @@ class Infopack:
         self.reset()
     
     def reload(self):
-        hasinfo = self._info != {}
+        hasinfo = len(self._info) > 0
         self.unload()
         if hasinfo:
             self.load()
         else:
             self.loadcore()
     
-    def getinfo(self, findkey):
-        values = []
-        found = 0
-        file = open(self._filename)
-        for line in file.readlines():
-            if line and line[0] != "#":
-                if not found:
-                    if line[0] == "K":
-                        key = line[2:].rstrip()
-                        if key.lower() == findkey:
-                            found = 1
-                            foundvalue = 0
-                else:
-                    if line[0] == "V":
-                        foundvalue = 1
-                        value = line[2:].split(":", 1)
-                        value[1] = value[1].rstrip()
-                        values.append(value)
-                    elif foundvalue:
-                        break
-        file.close()
-        return key, values
-    
     def get(self, line):
         for trigger in self._triggers:
             m = trigger.match(line)
             if m:
-                key = m.group(1).lower()
-                if self._info:
-                    try:
-                        key, values = self._info[key]
-                    except KeyError:
-                        values = None
-                else:
-                    key, values = self.getinfo(key)
-                if values:
-                    value = random.choice(values)
-                elif self._defaults:
-                    value = random.choice(self._defaults)
-                else:
-                    break
-                flags = value[0]
-                info = Info()
-                info.action = "a" in flags
-                info.notice = "n" in flags
-                info.tonick = "t" in flags
-                if "m" in flags:
-                    mask = random.choice(self._masks)
-                    info.phrase = mask % {"key": key, "value": value[1]}
-                else:
-                    info.phrase = value[1]
-                return info
+                return self.info(m)
+
+    def info(self, m):
+        """Return the Info for a match of one of the pack triggers."""
+        key = m.group(1).lower()
+        if self._info:
+            try:
+                key, values = self._info[key]
+            except KeyError:
+                values = None
+        else:
+            key, values = self._offsets.get(key)
+        if values:
+            value = random.choice(values)
+        elif self._defaults:
+            value = random.choice(self._defaults)
+        else:
+            return None
+        flags = value[0]
+        info = Info()
+        info.action = "a" in flags
+        info.notice = "n" in flags
+        info.tonick = "t" in flags
+        if "m" in flags:
+            mask = random.choice(self._masks)
+            info.phrase = mask % {"key": key, "value": value[1]}
+        else:
+            info.phrase = value[1]
+        return info
 
     def _search(self, pattern, key, values, results):
         found = 0
         if pattern.search(key):
             found = 1
-            value = random.choice(values)
         else:
-            if len(values) > 1:
-                random.shuffle(values)
             for value in values:
                 if pattern.search(value[1]):
                     found = 1
@@ -228,33 +319,82 @@ class Infopack:
  
     def search(self, pattern):
         results = []
+        terms = searchterms(pattern.pattern)
         if self._info:
-            for key, values in self._info.values():
-                self._search(pattern, key, values, results)
+            if not self._trigrams:
+                records = []
+                for i in range(len(self._info)):
+                    key, values = self._info.item(i)
+                    records.append((i, [key]+[value[1] for value in values]))
+                self._trigrams = TrigramIndex(buildtrigrams(records))
+            ids = self._trigrams.find(terms)
+            if ids is None:
+                entries = self._info.values()
+            else:
+                entries = [self._info.item(id) for id in ids]
+            for key, values in entries:
+                if values:
+                    self._search(pattern, key, values, results)
         else:
-            file = open(self._filename)
-            values = []
-            for line in file.readlines():
-                if line and line[0] != "#":
-                    if line[0] == "K":
-                        if values:
-                            self._search(pattern, key, values, results)
-                        key = line[2:].rstrip()
-                        values = []
-                    elif line[0] == "V":
-                        value = line[2:].split(":", 1)
-                        value[1] = value[1].rstrip()
-                        values.append(value)
-            if values:
-                self._search(pattern, key, values, results)
-            file.close()
+            offsets = self._offsets.find(terms)
+            if offsets is None:
+                records = self._offsets.records()
+            else:
+                records = [(offset,)+self._offsets.record(offset)
+                           for offset in offsets]
+            for offset, key, values in records:
+                if values:
+                    self._search(pattern, key, values, results)
+        return results
+
+class Triggers:
+    """Match a line against the triggers of many infopacks at once.
+
+    The triggers of all packs are joined in a PatternSet, so a single
+    match tells whether any trigger matches a line, and which one.
+    Since almost every line matches nothing, packs are only walked one
+    by one after a match.
+    """
+    def __init__(self):
+        self._packs = []
+        self._owners = []
+        self._patterns = PatternSet([])
+
+    def build(self, packs):
+        """Join the triggers of the given (name, pack) list."""
+        self._packs = packs
+        self._owners = []
+        triggers = []
+        for i in range(len(packs)):
+            for trigger in packs[i][1].triggers():
+                triggers.append(trigger)
+                self._owners.append(i)
+        self._patterns = PatternSet(triggers)
+
+    def match(self, line):
+        """Return (name, pack, m) for each pack with a matching trigger.
+
+        As in Infopack.get(), m is the match of the first trigger of
+        the pack which matches line.
+        """
+        first = self._patterns.first(line)
+        if first is None:
+            return []
+        results = []
+        for name, pack in self._packs[self._owners[first]:]:
+            for trigger in pack.triggers():
+                m = trigger.match(line)
+                if m:
+                    results.append((name, pack, m))
+                    break
         return results
 
 class InfopackModule:
     def __init__(self):
         db.table("infopack", "name text, flags text")
         self.packs = {}
-        hooks.register("Message", self.message)
+        self.triggers = Triggers()
+        hooks.register("Message", self.message, forme=1)
 
         # Load infopacks
         infopackdir = config.get("infopack", "infopackdir")
@@ -267,7 +407,8 @@ class InfopackModule:
                     pack.load()
                 else:
                     pack.loadcore()
-        
+        self.build_triggers()
+
         # [load|reload|unload] infopack <name> [in memory]
         self.re1 = regexp(r"(?P<action>re|un)?load infopack (?P<name>\w+)(?P<inmemory> in memory)?")
 
@@ -277,6 +418,10 @@ class InfopackModule:
         # search infopack <name> for /<regexp>/
         self.re3 = regexp(r"search infopack (?P<name>\S+) for /(?P<regexp>.*)/")
 
+        router.register(self.re1, self.load_infopack, forme=1)
+        router.register(self.re2, self.show_infopacks, forme=1)
+        router.register(self.re3, self.search_infopack, forme=1)
+
         # infopack[s]
         mm.register_help("infopacks?", HELP, "infopack")
 
@@ -291,10 +436,18 @@ class InfopackModule:
     
     def unload(self):
         hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.load_infopack)
+        router.unregister(self.re2, self.show_infopacks)
+        router.unregister(self.re3, self.search_infopack)
         mm.unregister_help(HELP)
         mm.unregister_help(self.help_infopack)
         mm.unregister_help(self.help_match)
         mm.unregister_perm("infopackadmin")
+        for pack in self.packs.values():
+            pack.unload()
+
+    def build_triggers(self):
+        self.triggers.build(self.packs.items())
 
     def help_infopack(self, msg, match):
         name = match.group("name")
@@ -332,142 +485,143 @@ class InfopackModule:
             alltriggers.extend(pack.help_triggers())
         return alltriggers
  
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "infopackadmin"):
-                name = m.group("name")
-                action = m.group("action")
-                infopackdir = config.get("infopack", "infopackdir")
-                packname = "%s/%s.info" % (infopackdir, name)
-                if not action:
-                    # Load infopack
-                    db.execute("select null from infopack where name=?", name)
-                    if db.results:
-                        msg.answer("%:", ["Oops!", "Sorry!"],
-                                         "This infopack is already "
-                                         "loaded", [".", "!"])
-                    else:
-                        if os.path.isfile(packname):
-                            inmemory = m.group("inmemory")
-                            pack = Infopack(packname)
-                            self.packs[name] = pack
-                            flags = ""
-                            if inmemory:
-                                flags += "m"
-                            db.execute("insert into infopack values (?,?)",
-                                       name, flags)
-                            if inmemory:
-                                pack.load()
-                            else:
-                                pack.loadcore()
-                            msg.answer("%:", ["Loaded", "Done", "Ok"],
-                                             [".", "!"])
+    def load_infopack(self, msg, m):
+        if mm.hasperm(msg, "infopackadmin"):
+            name = m.group("name")
+            action = m.group("action")
+            infopackdir = config.get("infopack", "infopackdir")
+            packname = "%s/%s.info" % (infopackdir, name)
+            if not action:
+                # Load infopack
+                db.execute("select null from infopack where name=?", name)
+                if db.results:
+                    msg.answer("%:", ["Oops!", "Sorry!"],
+                                     "This infopack is already "
+                                     "loaded", [".", "!"])
+                else:
+                    if os.path.isfile(packname):
+                        inmemory = m.group("inmemory")
+                        pack = Infopack(packname)
+                        self.packs[name] = pack
+                        flags = ""
+                        if inmemory:
+                            flags += "m"
+                        db.execute("insert into infopack values (?,?)",
+                                   name, flags)
+                        if inmemory:
+                            pack.load()
                         else:
-                            msg.answer("%:", ["Infopack not found",
-                                              "I can't find this "
-                                              "infopack"], [".", "!"])
-                elif action == "re":
-                    # Reload infopack
-                    if not self.packs.has_key(name):
-                        msg.answer("%:", ["Oops!", "Sorry!"],
-                                         "This infopack is not loaded",
+                            pack.loadcore()
+                        self.build_triggers()
+                        msg.answer("%:", ["Loaded", "Done", "Ok"],
                                          [".", "!"])
                     else:
-                        if os.path.isfile(packname):
-                            self.packs[name].reload()
-                            msg.answer("%:", ["Reloaded", "Done", "Ok"],
-                                             [".", "!"])
-                        else:
-                            msg.answer("%:", "Infopack not found",
-                                             "I can't find this infopack",
-                                             [".", "!"])
+                        msg.answer("%:", ["Infopack not found",
+                                          "I can't find this "
+                                          "infopack"], [".", "!"])
+            elif action == "re":
+                # Reload infopack
+                if not self.packs.has_key(name):
+                    msg.answer("%:", ["Oops!", "Sorry!"],
+                                     "This infopack is not loaded",
+                                     [".", "!"])
                 else:
-                    # Unload infopack
-                    if not self.packs.has_key(name):
-                        msg.answer("%:", ["Oops!", "Sorry!"],
-                                         "This infopack is not loaded",
+                    if os.path.isfile(packname):
+                        self.packs[name].reload()
+                        self.build_triggers()
+                        msg.answer("%:", ["Reloaded", "Done", "Ok"],
                                          [".", "!"])
                     else:
-                        del self.packs[name]
-                        db.execute("delete from infopack where name=?", name)
-                        msg.answer("%:", ["Unloaded", "Done", "Ok"],
+                        msg.answer("%:", "Infopack not found",
+                                         "I can't find this infopack",
                                          [".", "!"])
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to change infopack options",
-                                    "that good",
-                                    "allowed to do this"]),
-                                  "Nope"], [".", "!"])
-            return 0
-        
-        m = self.re2.match(msg.line)            
-        if m:
-            s = ", ".join(self.packs.keys())
-            if not s:
-                msg.answer("%:", "There are no loaded infopacks!")
-            else:
-                msg.answer("%:", "The following infopacks are loaded:", s)
-                msg.answer("%:", "For more information use "
-                                 "\"help infopack <name>\".")
-            return 0
+                # Unload infopack
+                if not self.packs.has_key(name):
+                    msg.answer("%:", ["Oops!", "Sorry!"],
+                                     "This infopack is not loaded",
+                                     [".", "!"])
+                else:
+                    self.packs[name].unload()
+                    del self.packs[name]
+                    self.build_triggers()
+                    db.execute("delete from infopack where name=?", name)
+                    msg.answer("%:", ["Unloaded", "Done", "Ok"],
+                                     [".", "!"])
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to change infopack options",
+                                "that good",
+                                "allowed to do this"]),
+                              "Nope"], [".", "!"])
+        return 0
 
-        m = self.re3.match(msg.line)            
-        if m:
-            name = m.group("name")
-            regexp = m.group("regexp")
+    def show_infopacks(self, msg, m):
+        s = ", ".join(self.packs.keys())
+        if not s:
+            msg.answer("%:", "There are no loaded infopacks!")
+        else:
+            msg.answer("%:", "The following infopacks are loaded:", s)
+            msg.answer("%:", "For more information use "
+                             "\"help infopack <name>\".")
+        return 0
+
+    def search_infopack(self, msg, m):
+        name = m.group("name")
+        regexp = m.group("regexp")
+        try:
+            pack = self.packs[name]
+        except KeyError:
+            msg.answer("%:", ["Oops!", "Sorry!"],
+                             "This infopack is not loaded",
+                             [".", "!"])
+            return 0
+        if mm.hasperm(msg, "infopack", name):
             try:
-                pack = self.packs[name]
-            except KeyError:
-                msg.answer("%:", ["Oops!", "Sorry!"],
-                                 "This infopack is not loaded",
-                                 [".", "!"])
+                pattern = re.compile(regexp, re.I)
+            except re.error:
+                msg.answer("%:", "Invalid pattern", [".", "!"])
                 return 0
-            if mm.hasperm(msg, "infopack", name):
-                try:
-                    pattern = re.compile(regexp, re.I)
-                except re.error:
-                    msg.answer("%:", "Invalid pattern", [".", "!"])
-                    return 0
-                results = pack.search(pattern)
-                reslen = len(results)
-                if not results:
-                    msg.answer("%:", ["Pattern not found",
-                                      "Couldn't find anything with that pattern",
-                                      "Nothing found"], [".", "!"])
-                elif reslen > MAXSEARCHRESULTS:
-                    msg.answer("%:", ["Found too many entries",
-                                      "There are many entries like this",
-                                      "There are many matches"],
-                                      ", here are the first %d:"%MAXSEARCHRESULTS)
-                elif reslen > 1:
-                    msg.answer("%:", ["Found %d entries:" % reslen,
-                                      "Found %d matches:" % reslen])
-                else:
-                    msg.answer("%:", ["Found one entry:",
-                                      "Found one match:"])
-                n = 0
-                for result in results:
-                    msg.answer("-", result)
-                    n += 1
-                    if n == MAXSEARCHRESULTS:
-                        break
+            results = pack.search(pattern)
+            reslen = len(results)
+            if not results:
+                msg.answer("%:", ["Pattern not found",
+                                  "Couldn't find anything with that pattern",
+                                  "Nothing found"], [".", "!"])
+            elif reslen > MAXSEARCHRESULTS:
+                msg.answer("%:", ["Found too many entries",
+                                  "There are many entries like this",
+                                  "There are many matches"],
+                                  ", here are the first %d:"%MAXSEARCHRESULTS)
+            elif reslen > 1:
+                msg.answer("%:", ["Found %d entries:" % reslen,
+                                  "Found %d matches:" % reslen])
             else:
-                msg.answer("%:", ["You're not allowed to search on "
-                                  "this infopack",
-                                  "You can't search on this infopack"],
-                                  [".", "!"])
-            return 0
+                msg.answer("%:", ["Found one entry:",
+                                  "Found one match:"])
+            n = 0
+            for result in results:
+                msg.answer("-", result)
+                n += 1
+                if n == MAXSEARCHRESULTS:
+                    break
+        else:
+            msg.answer("%:", ["You're not allowed to search on "
+                              "this infopack",
+                              "You can't search on this infopack"],
+                              [".", "!"])
+        return 0
+
+    def message(self, msg):
+        if not msg.forme:
+            return None
 
         allowed = mm.permparams(msg, "infopack")
         found = 0
-        for name, pack in self.packs.items():
+        for name, pack, m in self.triggers.match(msg.line):
             if name not in allowed:
                 continue
-            info = pack.get(msg.line)
+            info = pack.info(m)
             if info:
                 found = 1
                 action = info.action and "ACTION"
@@ -480,6 +634,7 @@ class InfopackModule:
         if found:
             return 0
 
+
 def __loadmodule__():
     global mod
     mod = InfopackModule()
@@ -18,7 +18,15 @@
 
 from pybot.locals import *
 from pybot.user import User
+from pybot.sqlitedb import Row
+from pybot.misc import searchterms, work
+from collections import deque
+import traceback
+import threading
+import calendar
 import time
+import gzip
+import csv
 import re
 import os
 
@@ -27,12 +35,16 @@ You may check when was the last time I've seen somebody with
 "[have you] seen <nick>". The "seen" or the "log" permission is
 needed for this. I'll also let you know what was the last message
 the user wrote, if you have the "log" permission.
+""","""
+If you have the "log" permission, you may also rebuild the table I use to
+answer this from the log with "rebuild seen [table]".
 """
 
 HELP_SEARCH = """
-You may search the log files with "[show|search] (log[s]|message[s])
-[with] /<regexp>/'. You must have the "log" permission for this to
-work.
+You may search the log files with "[show|search] [archived]
+(log[s]|message[s]) [with] /<regexp>/'. Old messages may have been
+archived, and are only searched when "archived" is used. You must
+have the "log" permission for this to work.
 """
 
 PERM_LOG = """
@@ -77,10 +89,286 @@ class LogMsg:
  
 STRIPNICK = re.compile(r"^[\W_]*([^\W_]+)[\W_]*$")
 
+# Maximum number of entries waiting to be written. Once it's reached,
+# logging waits for the writer to catch up.
+MAXPENDING = 10000
+
+# Maximum number of entries written in a single transaction.
+BATCHSIZE = 500
+
+# Number of log rows looked at in each step of a lastseen rebuild.
+BACKFILLSIZE = 5000
+
+FIELDS = ("timestamp integer, servername text, type text, "
+          "nick text, src text, dest text, line text")
+
+FIELDNAMES = {"timestamp": 0, "servername": 1, "type": 2, "nick": 3,
+              "src": 4, "dest": 5, "line": 6}
+
+# Monthly log tables, and their archives.
+PARTITION = re.compile(r"^log_\d{6}$")
+ARCHIVE = re.compile(r"^log_\d{6}\.csv\.gz$")
+
+class LogWriter:
+    """Write log entries to the database from a separate thread.
+
+    Entries are queued in memory by put(), and written in batches by
+    writebatch(localdb, batch), one transaction per batch, so that
+    logging doesn't make the main loop wait for the disk. When there's
+    nothing to write, idletask(localdb) is called (if set) until it
+    returns false.
+    """
+    def __init__(self, writebatch, idletask=None):
+        self.pending = deque()
+        self.cond = threading.Condition()
+        self.writing = 0
+        self.stopped = 0
+        self.writebatch = writebatch
+        self.idletask = idletask
+        self.idle = idletask is not None
+        self.thread = threading.Thread(target=self.run)
+        self.thread.setDaemon(1)
+        self.thread.start()
+
+    def put(self, values):
+        self.cond.acquire()
+        try:
+            while len(self.pending) >= MAXPENDING and \
+                  self.thread.isAlive():
+                self.cond.wait()
+            self.pending.append(values)
+            self.cond.notifyAll()
+        finally:
+            self.cond.release()
+
+    def flush(self):
+        """Wait until every entry put so far is written."""
+        self.cond.acquire()
+        try:
+            while (self.pending or self.writing) and self.thread.isAlive():
+                self.cond.wait()
+        finally:
+            self.cond.release()
+
+    def stop(self):
+        self.flush()
+        self.cond.acquire()
+        self.stopped = 1
+        self.cond.notifyAll()
+        self.cond.release()
+        self.thread.join()
+
+    def run(self):
+        localdb = db.copy() # We're in a thread
+        while 1:
+            self.cond.acquire()
+            try:
+                while not self.pending and not self.stopped and \
+                      not self.idle:
+                    self.cond.wait()
+                if not self.pending:
+                    if self.stopped:
+                        return
+                    self.idle = 0
+                    idletask = self.idletask
+                else:
+                    idletask = None
+                    batch = []
+                    while self.pending and len(batch) < BATCHSIZE:
+                        batch.append(self.pending.popleft())
+                    self.writing = 1
+                    # There's room for whoever is waiting in put().
+                    self.cond.notifyAll()
+            finally:
+                self.cond.release()
+            if idletask:
+                try:
+                    more = idletask(localdb)
+                except:
+                    traceback.print_exc()
+                    more = 0
+                self.cond.acquire()
+                self.idle = self.idle or more
+                self.cond.release()
+                continue
+            try:
+                localdb.begin()
+                try:
+                    self.writebatch(localdb, batch)
+                finally:
+                    localdb.commit()
+            except:
+                traceback.print_exc()
+            self.cond.acquire()
+            self.writing = 0
+            self.cond.notifyAll()
+            self.cond.release()
+
+    def wakeidle(self):
+        """Have idletask() called again once there's nothing to write."""
+        self.cond.acquire()
+        self.idle = 1
+        self.cond.notifyAll()
+        self.cond.release()
+
 class Log:
+    """Log storage.
+
+    Lines are kept in one table per month (in UTC), named log_YYYYMM,
+    so that new lines only touch the current month's table and its
+    indexes. With a retention set, months older than that are moved
+    to compressed CSV files in archivedir, which may still be searched.
+    """
     def __init__(self):
-        db.table("log", "timestamp integer, servername text, type text, "
-                        "nick text, src text, dest text, line text")
+        if config.has_option("log", "retention"):
+            self.retention = config.getint("log", "retention")
+        else:
+            self.retention = 0
+        if config.has_option("log", "archivedir"):
+            self.archivedir = config.get("log", "archivedir")
+        else:
+            self.archivedir = os.path.join(config.defaults()["datadir"],
+                                           "logarchive")
+        # Lines are indexed by their trigrams, when SQLite supports it,
+        # so that searches only look at lines which may match.
+        self.fts = self.check_fts()
+        newlastseen = not self.exists("lastseen")
+        db.table("lastseen", "nick text primary key, timestamp integer, "
+                             "servername text, type text, src text, "
+                             "dest text, line text")
+        self.partitions = []
+        for row in db.execute("select name from sqlite_master "
+                              "where type='table'"):
+            if PARTITION.match(row.name):
+                self.partitions.append(row.name)
+        self.partitions.sort()
+        self.create_partition(db, self.partition(time.time()))
+        if self.exists("log"):
+            self.migrate()
+        if newlastseen or db["log.lastseen_backfill"]:
+            self.rebuild_lastseen()
+        self.writer = LogWriter(self.write_batch, self.idletask)
+
+    def exists(self, name):
+        return db.execute("select null from sqlite_master where "
+                          "type='table' and name=?", name).results
+
+    def check_fts(self):
+        db.execute("create virtual table temp.log_fts_check using fts5 "
+                   "(line, tokenize='trigram')")
+        if db.execute("select null from sqlite_temp_master where "
+                      "name='log_fts_check'").results:
+            db.execute("drop table temp.log_fts_check")
+            return 1
+        return 0
+
+    def partition(self, timestamp):
+        return "log_%04d%02d" % time.gmtime(timestamp)[:2]
+
+    def create_partition(self, localdb, name):
+        names = {"name": name}
+        triggers = []
+        if self.fts:
+            localdb.execute("create virtual table if not exists "
+                            "%(name)s_fts using fts5 (line, "
+                            "content='%(name)s', content_rowid='rowid', "
+                            "tokenize='trigram')" % names)
+            triggers.append("create trigger %(name)s_fts_insert "
+                            "after insert on %(name)s begin "
+                            "insert into %(name)s_fts (rowid, line) "
+                            "values (new.rowid, new.line); end" % names)
+            triggers.append("create trigger %(name)s_fts_delete "
+                            "after delete on %(name)s begin "
+                            "insert into %(name)s_fts "
+                            "(%(name)s_fts, rowid, line) values "
+                            "('delete', old.rowid, old.line); end" % names)
+        # The last line logged for each nick is kept in lastseen,
+        # so that "seen" doesn't have to look for it in the log.
+        triggers.append("create trigger %(name)s_lastseen "
+                        "after insert on %(name)s "
+                        "when new.src != '' and new.dest != '' begin "
+                        "insert or replace into lastseen values "
+                        "(new.nick, new.timestamp, new.servername, "
+                        "new.type, new.src, new.dest, new.line); end"
+                        % names)
+        localdb.table(name, FIELDS, triggers=triggers)
+        localdb.execute("create index if not exists %(name)s_dest on "
+                        "%(name)s (servername, dest, timestamp)" % names)
+        localdb.execute("create index if not exists %(name)s_nick on "
+                        "%(name)s (nick, timestamp)" % names)
+        if name not in self.partitions:
+            partitions = self.partitions+[name]
+            partitions.sort()
+            self.partitions = partitions
+
+    def migrate(self):
+        """Move lines from the single log table used before."""
+        db.execute("create index if not exists log_timestamp on log "
+                   "(timestamp)")
+        months = {}
+        for row in db.execute("select distinct timestamp/86400 as day "
+                              "from log"):
+            months[self.partition(row.day*86400)] = 1
+        months = months.keys()
+        months.sort()
+        db.begin()
+        for name in months:
+            self.create_partition(db, name)
+            start, end = monthrange(name)
+            db.execute("insert into %s select * from log where "
+                       "timestamp >= ? and timestamp < ? order by rowid"
+                       % name, start, end)
+        db.execute("drop table log")
+        if self.exists("log_fts"):
+            db.execute("drop table log_fts")
+        db.commit()
+
+    def write_batch(self, localdb, batch):
+        for values in batch:
+            name = self.partition(values[0])
+            if name not in self.partitions:
+                self.create_partition(localdb, name)
+                # Maybe some month should be archived now.
+                self.writer.wakeidle()
+            localdb.execute("insert into %s values (?,?,?,?,?,?,?)" % name,
+                            *values)
+
+    def idletask(self, localdb):
+        return self.backfill_lastseen(localdb) or \
+               self.archive_partitions(localdb)
+
+    def archive_partitions(self, localdb):
+        """Archive the oldest month beyond retention, if any.
+
+        Returns true if a month was archived.
+        """
+        if not self.retention:
+            return 0
+        current = monthindex(self.partition(time.time()))
+        for name in self.partitions:
+            if monthindex(name) <= current-self.retention:
+                self.archive(localdb, name)
+                return 1
+        return 0
+
+    def archive(self, localdb, name):
+        if not os.path.isdir(self.archivedir):
+            os.makedirs(self.archivedir)
+        path = os.path.join(self.archivedir, name+".csv.gz")
+        file = gzip.open(path+".tmp", "wb")
+        writer = csv.writer(file)
+        for row in localdb.execute("select * from %s order by rowid" % name):
+            writer.writerow([encode(value) for value in row])
+        file.close()
+        os.rename(path+".tmp", path)
+        partitions = self.partitions[:]
+        partitions.remove(name)
+        self.partitions = partitions
+        localdb.begin()
+        localdb.execute("drop table %s" % name)
+        if self.fts:
+            localdb.execute("drop table if exists %s_fts" % name)
+        localdb.commit()
 
     def xformnick(self, nick):
         return STRIPNICK.sub(r"\1", nick.lower())
@@ -88,134 +376,333 @@ class Log:
     def append(self, servername, type, nick, src, dest, line):
         nick = self.xformnick(nick)
         values = (int(time.time()), servername, type, nick, src, dest, line)
-        places = ','.join(['?']*len(values))
-        db.execute("insert into log values (%s)" % places, *values)
+        self.writer.put(values)
+
+    def flush(self):
+        self.writer.flush()
+
+    def close(self):
+        self.writer.stop()
+
+    def rebuild_lastseen(self):
+        """Refill lastseen from the log, in background."""
+        db.begin()
+        db.execute("delete from lastseen")
+        first = self.partitions[0]
+        last = self.partitions[-1]
+        row = db.execute("select max(rowid) as last from %s"
+                         % last).fetchone()
+        del db["log.lastseen_backfill"]
+        db["log.lastseen_backfill"] = "%s 0 %s %d" % (first, last,
+                                                      row.last or 0)
+        db.commit()
+        if hasattr(self, "writer"):
+            self.writer.wakeidle()
+
+    def backfill_lastseen(self, localdb):
+        """Take lines for lastseen from the next log rows to rebuild.
+
+        The state is kept as "<partition> <rowid> <lastpartition>
+        <lastrowid>", with the last row which existed when the rebuild
+        started. Returns true while there are rows left.
+        """
+        state = localdb["log.lastseen_backfill"]
+        if not state:
+            return 0
+        name, first, lastname, lastrowid = state.split()
+        first = int(first)
+        lastrowid = int(lastrowid)
+        if name == lastname:
+            last = lastrowid
+        elif name in self.partitions:
+            row = localdb.execute("select max(rowid) as last from %s"
+                                  % name).fetchone()
+            last = row.last or 0
+        else:
+            # Archived meanwhile.
+            last = 0
+        localdb.begin()
+        try:
+            del localdb["log.lastseen_backfill"]
+            if first >= last:
+                later = [x for x in self.partitions
+                         if name < x <= lastname]
+                if not later:
+                    return 0
+                localdb["log.lastseen_backfill"] = "%s 0 %s %d" % \
+                                                   (later[0], lastname,
+                                                    lastrowid)
+                return 1
+            end = min(first+BACKFILLSIZE, last)
+            # Lines logged after the rebuild started are already there,
+            # and must not be replaced by older ones.
+            localdb.execute("insert or replace into lastseen select "
+                            "nick, timestamp, servername, type, src, dest, "
+                            "line from %(name)s where rowid > ? and "
+                            "rowid <= ? and src != '' and dest != '' and "
+                            "not exists (select null from lastseen where "
+                            "lastseen.nick = %(name)s.nick and "
+                            "lastseen.timestamp > %(name)s.timestamp) "
+                            "order by rowid" % {"name": name}, first, end)
+            localdb["log.lastseen_backfill"] = "%s %d %s %d" % \
+                                               (name, end, lastname,
+                                                lastrowid)
+        finally:
+            localdb.commit()
+        return 1
+
+    def seen(self, localdb, nick):
+        """Return the last message seen from nick, or None.
 
-    def seen(self, nick):
+        Entries still waiting to be written are written first, so
+        this must be called from a thread, with its own localdb.
+        """
+        self.flush()
         nick = self.xformnick(nick)
-        row = db.execute("select * from log where nick=? and src != '' "
-                         "and dest != '' order by timestamp desc limit 1",
-                         nick).fetchone()
+        row = None
+        if localdb["log.lastseen_backfill"]:
+            # Still rebuilding, so look in the log itself.
+            for name in reversed(self.partitions):
+                row = localdb.execute("select * from %s where nick=? and "
+                                      "src != '' and dest != '' "
+                                      "order by timestamp desc limit 1"
+                                      % name, nick).fetchone()
+                if row:
+                    break
+        else:
+            row = localdb.execute("select * from lastseen where nick=?",
+                                  nick).fetchone()
         if row:
             return LogMsg(row)
         return None
 
-    def search(self, servername, target, regexp, max, searchline):
+    def search(self, localdb, servername, target, regexp, max, searchline,
+               archived=0):
+        """Return up to max messages to target matching regexp.
+
+        As with seen(), this must be called from a thread.
+        """
+        self.flush()
         p = re.compile(regexp, re.I)
-        l = []
-        for row in db.execute("select * from log where servername == ? and "
-                              "dest == ? and src != '' order by timestamp",
-                              servername, target):
-            if p.search(row.line):
-                l.append(LogMsg(row))
-            if len(l) > max+1:
-                l.pop(0)
+        # Matches are taken newest first, and one more than max is
+        # needed, since the newest may be the search command itself.
+        if archived:
+            l = self.search_archive(servername, target, p, max+1)
+        else:
+            l = self.search_partitions(localdb, servername, target,
+                                       regexp, p, max+1)
+        l.reverse()
         if l and l[-1].line == searchline:
             l.pop()
         elif len(l) > max:
             l.pop(0)
         return l
 
+    def search_partitions(self, localdb, servername, target, regexp, p,
+                          max):
+        terms = self.fts and searchterms(regexp)
+        if terms:
+            query = " AND ".join(['"%s"' % term.replace('"', '""')
+                                  for term in terms])
+        l = []
+        for name in reversed(self.partitions):
+            names = {"name": name}
+            if terms:
+                localdb.execute("select %(name)s.* from %(name)s_fts, "
+                                "%(name)s where %(name)s_fts match ? and "
+                                "%(name)s.rowid = %(name)s_fts.rowid and "
+                                "servername == ? and dest == ? and "
+                                "src != '' order by %(name)s_fts.rowid desc"
+                                % names, query, servername, target)
+            else:
+                localdb.execute("select * from %s where servername == ? and "
+                                "dest == ? and src != '' "
+                                "order by timestamp desc" % name,
+                                servername, target)
+            for row in localdb:
+                if p.search(row.line):
+                    l.append(LogMsg(row))
+                    if len(l) == max:
+                        return l
+        return l
+
+    def search_archive(self, servername, target, p, max):
+        if not os.path.isdir(self.archivedir):
+            return []
+        filenames = [x for x in os.listdir(self.archivedir)
+                     if ARCHIVE.match(x)]
+        filenames.sort()
+        filenames.reverse()
+        l = []
+        for filename in filenames:
+            file = gzip.open(os.path.join(self.archivedir, filename))
+            found = []
+            for values in csv.reader(file):
+                row = Row([value.decode("utf-8") for value in values],
+                          FIELDNAMES)
+                if row.servername == servername and row.dest == target and \
+                   row.src and p.search(row.line):
+                    found.append(LogMsg(row))
+            file.close()
+            found.reverse()
+            l.extend(found[:max-len(l)])
+            if len(l) == max:
+                break
+        return l
+
+def monthindex(name):
+    return int(name[4:8])*12+int(name[8:10])-1
+
+def monthrange(name):
+    """Return the first second of the month and of the following one."""
+    index = monthindex(name)
+    start = calendar.timegm((index/12, index%12+1, 1, 0, 0, 0))
+    index += 1
+    end = calendar.timegm((index/12, index%12+1, 1, 0, 0, 0))
+    return start, end
+
+def encode(value):
+    if value is None:
+        return ""
+    if type(value) is unicode:
+        return value.encode("utf-8")
+    return str(value)
+
 class LogModule:
     def __init__(self):
         self.log = Log()
         
-        hooks.register("Message", self.message)
         hooks.register("Message", self.log_message, 150)
         hooks.register("CTCP", self.log_ctcp, 150)
         hooks.register("OutMessage", self.log_outmessage, 150)
         hooks.register("OutCTCP", self.log_outctcp, 150)
+        hooks.register("Quit", self.log.flush)
+        hooks.register("Reboot", self.log.flush)
 
         # [have you] seen <nick>
         self.re1 = regexp(r"(?:have you )?seen (?P<nick>[^\s!?]+)", question=1)
 
-        # [show|search] (log[s]|message[s]) [with] /<regexp>/
-        self.re2 = regexp(r"(?:show |search )?(?:log|message)s? (?:with |search )?/(?P<regexp>.*)/")
+        # [show|search] [archived] (log[s]|message[s]) [with] /<regexp>/
+        self.re2 = regexp(r"(?:show |search )?(?P<archived>archived )?(?:log|message)s? (?:with |search )?/(?P<regexp>.*)/")
+
+        # rebuild [the] [last]seen [table]
+        self.re3 = regexp(r"rebuild (?:the )?(?:last ?)?seen(?: table)?")
+
+        router.register(self.re1, self.show_seen, forme=1)
+        router.register(self.re2, self.search_log, forme=1)
+        router.register(self.re3, self.rebuild_seen, forme=1)
 
         # seen
         mm.register_help("seen", HELP_SEEN, "seen")
 
-        # log|(search|show) (log[s]|message[s])
-        mm.register_help("log|(?:search|show) (?:log|message)s?",
-                         HELP_SEARCH, "log")
+        # log|(search|show) [archived] (log[s]|message[s])
+        mm.register_help("log|(?:search|show) (?:archived )?"
+                         "(?:log|message)s?", HELP_SEARCH, "log")
 
         mm.register_perm("seen", PERM_SEEN)
         mm.register_perm("log", PERM_LOG)
         
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.show_seen)
+        router.unregister(self.re2, self.search_log)
+        router.unregister(self.re3, self.rebuild_seen)
         hooks.unregister("Message", self.log_message, 150)
         hooks.unregister("CTCP", self.log_ctcp, 150)
         hooks.unregister("OutMessage", self.log_outmessage, 150)
         hooks.unregister("OutCTCP", self.log_outctcp, 150)
+        hooks.unregister("Quit", self.log.flush)
+        hooks.unregister("Reboot", self.log.flush)
+        self.log.close()
         mm.unregister_help(HELP_SEEN)
         mm.unregister_help(HELP_SEARCH)
         mm.unregister_perm("seen")
         mm.unregister_perm("log")
     
-    def message(self, msg):
-        if msg.forme:
-            m = self.re1.match(msg.line)
-            if m:
-                if mm.hasperm(msg, "seen") or \
-                   mm.hasperm(msg, "log"):
-                    nick = m.group("nick")
-                    logmsg = self.log.seen(nick)
-                    if not logmsg:
-                        msg.answer("%:", "Sorry, I haven't seen %s for a while..." % nick)
-                    elif mm.hasperm(msg, "log") and msg.target == logmsg.dest:
-                        msg.answer("%:", "I have seen %s %s, with the "
-                                         "following message:" %
-                                         (nick, logmsg.timestr()))
-                        msg.answer(str(logmsg))
-                    else:
-                        msg.answer("%:", "I have seen %s %s." %
-                                         (nick, logmsg.timestr()))
-                    return 0
-                else:
-                    msg.answer("%:", "You're not",
-                                     ["allowed to know when was the "
-                                      "last time I saw somebody",
-                                      "that good", "allowed to do this"],
-                                     [".", "!"])
-                return 0
-
-            m = self.re2.match(msg.line)
-            if m:
-                if mm.hasperm(msg, "log"):
-                    max = 5
-                    logmsgs = self.log.search(msg.server.servername,
-                                              msg.target,
-                                              m.group("regexp"), max,
-                                              msg.rawline)
-                    if logmsgs:
-                        llen = len(logmsgs)
-                        if llen == 1:
-                            if max == 1:
-                                s = "Here is the last entry found:"
-                            else:
-                                s = "Here is the only entry found:"
-                        elif llen == max:
-                            s = "Here are the last %d entries found:" % llen
-                        else:
-                            s = "Here are the only %d entries found:" % llen
-                        msg.answer("%:", s)
-                        for logmsg in logmsgs:
-                            msg.answer(str(logmsg))
-                    else:
-                        msg.answer("%:", ["Sorry!", "Oops!"],
-                                         ["No messages found",
-                                          "Can't find any message",
-                                          "No entries found"], [".", "!"])
+    def busy(self, msg):
+        msg.answer("%:", ["Sorry, but", "Oops,"],
+                         ["I'm too busy right now",
+                          "there are too many lookups waiting"],
+                         [".", "!"])
+
+    def show_seen(self, msg, m):
+        if mm.hasperm(msg, "seen") or \
+           mm.hasperm(msg, "log"):
+            # Looking at the log may wait for the disk, so it's done
+            # in the "log" queue, away from the main loop.
+            if not work("log", self.answer_seen,
+                        (msg, m.group("nick"), mm.hasperm(msg, "log"))):
+                self.busy(msg)
+        else:
+            msg.answer("%:", "You're not",
+                             ["allowed to know when was the "
+                              "last time I saw somebody",
+                              "that good", "allowed to do this"],
+                             [".", "!"])
+        return 0
+
+    def answer_seen(self, msg, nick, showline):
+        logmsg = self.log.seen(db.copy(), nick) # We're in a thread
+        if not logmsg:
+            msg.answer("%:", "Sorry, I haven't seen %s for a while..." % nick)
+        elif showline and msg.target == logmsg.dest:
+            msg.answer("%:", "I have seen %s %s, with the "
+                             "following message:" %
+                             (nick, logmsg.timestr()))
+            msg.answer(str(logmsg))
+        else:
+            msg.answer("%:", "I have seen %s %s." %
+                             (nick, logmsg.timestr()))
+
+    def search_log(self, msg, m):
+        if mm.hasperm(msg, "log"):
+            if not work("log", self.answer_search,
+                        (msg, m.group("regexp"), m.group("archived"))):
+                self.busy(msg)
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to search logs",
+                                "that good",
+                                "allowed to do this"]),
+                              "No", "Nope"],
+                             [".", "!"])
+        return 0
+
+    def answer_search(self, msg, regexp, archived):
+        max = 5
+        logmsgs = self.log.search(db.copy(), # We're in a thread
+                                  msg.server.servername, msg.target,
+                                  regexp, max, msg.rawline, archived)
+        if logmsgs:
+            llen = len(logmsgs)
+            if llen == 1:
+                if max == 1:
+                    s = "Here is the last entry found:"
                 else:
-                    msg.answer("%:", [("You're not",
-                                       ["allowed to search logs",
-                                        "that good",
-                                        "allowed to do this"]),
-                                      "No", "Nope"],
-                                     [".", "!"])
-                return 0
-    
+                    s = "Here is the only entry found:"
+            elif llen == max:
+                s = "Here are the last %d entries found:" % llen
+            else:
+                s = "Here are the only %d entries found:" % llen
+            msg.answer("%:", s)
+            for logmsg in logmsgs:
+                msg.answer(str(logmsg))
+        else:
+            msg.answer("%:", ["Sorry!", "Oops!"],
+                             ["No messages found",
+                              "Can't find any message",
+                              "No entries found"], [".", "!"])
+
+    def rebuild_seen(self, msg, m):
+        if mm.hasperm(msg, "log"):
+            self.log.rebuild_lastseen()
+            msg.answer("%:", ["Rebuilding it", "Working on it",
+                              "Right now"], [".", "!"])
+        else:
+            msg.answer("%:", "You're not",
+                             ["allowed to do this", "that good"],
+                             [".", "!"])
+        return 0
+
     def log_message(self, msg):
         if msg.direct:
             target = ""
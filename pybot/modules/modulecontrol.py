@@ -27,7 +27,6 @@ modules". Only admins are allowed to do that.
 class ModuleControl:
     def __init__(self):
         db.table("module", "name text primary key")
-        hooks.register("Message", self.message)
 
         modls.loadlist(self.get_modules())
         
@@ -37,6 +36,9 @@ class ModuleControl:
         # show modules
         self.re2 = regexp(r"show modules")
 
+        router.register(self.re1, self.load_module, forme=1)
+        router.register(self.re2, self.show_modules, forme=1)
+
         # [[un|re]load] module[s]
         mm.register_help(r"(?:(?:un|re)?load )?modules?", HELP, "modules")
 
@@ -54,91 +56,86 @@ class ModuleControl:
         db.execute("delete from module where name=?", name)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.load_module)
+        router.unregister(self.re2, self.show_modules)
         mm.unregister_help(HELP)
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-            
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                command, module = m.group("command", "module")
-                isloaded = modls.isloaded(module)
-                modules = self.get_modules()
-                if command == "load" and isloaded:
-                    msg.answer("%:", ["Sorry, but",
-                                      "Oops, I think that"],
-                                     "this module is already loaded",
+    def load_module(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            command, module = m.group("command", "module")
+            isloaded = modls.isloaded(module)
+            modules = self.get_modules()
+            if command == "load" and isloaded:
+                msg.answer("%:", ["Sorry, but",
+                                  "Oops, I think that"],
+                                 "this module is already loaded",
+                                 [".", "!"])
+            elif command == "load":
+                if modls.load(module):
+                    self.add_module(module)
+                    msg.answer("%:", ["Loaded", "Done", "Ready"],
                                      [".", "!"])
-                elif command == "load":
-                    if modls.load(module):
-                        self.add_module(module)
-                        msg.answer("%:", ["Loaded", "Done", "Ready"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["Something wrong happened while",
-                                          "Something bad happened while",
-                                          "There was a problem"],
-                                         "loading the module",
-                                         ["!", "."])
-                elif not isloaded:
-                    msg.answer("%:", ["Sorry, but", "Oops, I think that"],
-                                     "this module is not loaded",
+                else:
+                    msg.answer("%:", ["Something wrong happened while",
+                                      "Something bad happened while",
+                                      "There was a problem"],
+                                     "loading the module",
+                                     ["!", "."])
+            elif not isloaded:
+                msg.answer("%:", ["Sorry, but", "Oops, I think that"],
+                                 "this module is not loaded",
+                                 [".", "!"])
+            elif command == "reload":
+                if modls.reload(module):
+                    msg.answer("%:", ["Reloaded", "Done", "Ready"],
                                      [".", "!"])
-                elif command == "reload":
-                    if modls.reload(module):
-                        msg.answer("%:", ["Reloaded", "Done", "Ready"],
-                                         [".", "!"])
-                    else:
-                        if not modls.isloaded(module):
-                            self.del_module(module)
-                        msg.answer("%:", ["Something wrong happened while",
-                                          "Something bad happened while",
-                                          "There was a problem"],
-                                         "reloading the module", ["!", "."])
                 else:
-                    if module in modules:
+                    if not modls.isloaded(module):
                         self.del_module(module)
-                        if modls.unload(module):
-                            msg.answer("%:", ["Unloaded", "Done", "Ready"],
-                                             ["!", "."])
-                        else:
-                            msg.answer("%:",
-                                       ["Something wrong happened while",
-                                        "Something bad happened while",
-                                        "There was a problem"],
-                                       "unloading the module", ["!", "."])
-                    else:
-                        msg.answer("%:", ["Sorry, but",
-                                          "Oops, I think that"],
-                                         "this module can't be unloaded.")
+                    msg.answer("%:", ["Something wrong happened while",
+                                      "Something bad happened while",
+                                      "There was a problem"],
+                                     "reloading the module", ["!", "."])
             else:
-                msg.answer("%:", ["You're not that good",
-                                  "You are not able to work with modules",
-                                  "No, you can't do this"],
-                                 [".", "!",". I'm sorry!"])
-            return 0
-
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                modules = modls.getlist()
-                if not modules:
-                    msg.answer("%:", ["There are no", "No"],
-                                     "loaded modules", [".", "!"])
+                if module in modules:
+                    self.del_module(module)
+                    if modls.unload(module):
+                        msg.answer("%:", ["Unloaded", "Done", "Ready"],
+                                         ["!", "."])
+                    else:
+                        msg.answer("%:",
+                                   ["Something wrong happened while",
+                                    "Something bad happened while",
+                                    "There was a problem"],
+                                   "unloading the module", ["!", "."])
                 else:
-                    modules.sort()
-                    msg.answer("%:", ["These are the loaded modules:",
-                                      "The following modules are loaded:"],
-                                     ", ".join(modules))
+                    msg.answer("%:", ["Sorry, but",
+                                      "Oops, I think that"],
+                                     "this module can't be unloaded.")
+        else:
+            msg.answer("%:", ["You're not that good",
+                              "You are not able to work with modules",
+                              "No, you can't do this"],
+                             [".", "!",". I'm sorry!"])
+        return 0
+
+    def show_modules(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            modules = modls.getlist()
+            if not modules:
+                msg.answer("%:", ["There are no", "No"],
+                                 "loaded modules", [".", "!"])
             else:
-                msg.answer("%:", ["You're not that good",
-                                  "You are not able to work with modules",
-                                  "No, you can't do this"],
-                                  [".", "!",". I'm sorry!"])
-            return 0
+                modules.sort()
+                msg.answer("%:", ["These are the loaded modules:",
+                                  "The following modules are loaded:"],
+                                 ", ".join(modules))
+        else:
+            msg.answer("%:", ["You're not that good",
+                              "You are not able to work with modules",
+                              "No, you can't do this"],
+                              [".", "!",". I'm sorry!"])
+        return 0
 
 def __loadmodule__():
     global mod
@@ -40,7 +40,6 @@ SPLITNUMS = re.compile("\s*,\s*|\s+")
 class Notes:
     def __init__(self):
         db.table("note", "topic text, note text, timestamp integer")
-        hooks.register("Message", self.message)
         mm.register("getnotes", self.mm_getnotes)
         mm.register("addnote", self.mm_addnote)
         mm.register("delnotes", self.mm_delnotes)
@@ -56,13 +55,19 @@ class Notes:
         # [show] note[s] [[about] <topic> [?]]
         self.re3 = regexp(r"(?:show )?notes?(?:(?: about)? (?P<topic>[^?]+))?")
 
+        router.register(self.re1, self.add_note, forme=1)
+        router.register(self.re2, self.del_notes, forme=1)
+        router.register(self.re3, self.show_notes, forme=1)
+
         # note[s]
         mm.register_help(r"notes?", HELP, "notes")
 
         mm.register_perm("notes", PERM_NOTES)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.add_note)
+        router.unregister(self.re2, self.del_notes)
+        router.unregister(self.re3, self.show_notes)
         mm.unregister("getnotes")
         mm.unregister("addnote")
         mm.unregister("delnotes")
@@ -72,79 +77,72 @@ class Notes:
         mm.unregister_help(HELP)
         mm.unregister_perm("notes")
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "notes"):
-                topic = m.group("topic").strip()
-                note = m.group("note").strip()
-                self.mm_addnote(topic, note)
-                msg.answer("%:", "Note", ["created", "included", "added"], ["!", "."])
+    def add_note(self, msg, m):
+        if mm.hasperm(msg, "notes"):
+            topic = m.group("topic").strip()
+            note = m.group("note").strip()
+            self.mm_addnote(topic, note)
+            msg.answer("%:", "Note", ["created", "included", "added"], ["!", "."])
+        else:
+            msg.answer("%:", ["You don't have permission for that",
+                              "You can't create notes",
+                              "You're note allowed to add notes"],
+                             [".", "!"])
+        return 0
+
+    def del_notes(self, msg, m):
+        if mm.hasperm(msg, "notes"):
+            topic = m.group("topic").strip()
+            nums = m.group("nums")
+            if nums:
+                try:
+                    notenums = [int(x) for x in SPLITNUMS.split(nums) if x]
+                except ValueError:
+                    msg.answer("%:", "Invalid numbers", [".", "!"])
+                    return 0
             else:
-                msg.answer("%:", ["You don't have permission for that",
-                                  "You can't create notes",
-                                  "You're note allowed to add notes"],
-                                 [".", "!"])
-            return 0
-        
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "notes"):
-                topic = m.group("topic").strip()
-                nums = m.group("nums")
-                if nums:
-                    try:
-                        notenums = [int(x) for x in SPLITNUMS.split(nums) if x]
-                    except ValueError:
-                        msg.answer("%:", "Invalid numbers", [".", "!"])
-                        return 0
-                else:
-                    notenums = []
-                if self.mm_delnotes(topic, notenums):
-                    msg.answer("%:", ["Done", "Removed", "Deleted"], [".", "!"])
+                notenums = []
+            if self.mm_delnotes(topic, notenums):
+                msg.answer("%:", ["Done", "Removed", "Deleted"], [".", "!"])
+            else:
+                msg.answer("%:", ["Sorry!", None],
+                                 ["There are no", "No",
+                                  "I haven't found"],
+                                 "notes about this", [".", "!"])
+        else:
+            msg.answer("%:", ["You don't have permission for that",
+                              "You can't remove notes",
+                              "You're note allowed to add notes"],
+                             [".", "!"])
+        return 0
+
+    def show_notes(self, msg, m):
+        if mm.hasperm(msg, "notes"):
+            topic = m.group("topic")
+            if topic:
+                if msg.direct:
+                    target = msg.user.nick
                 else:
+                    target = msg.target
+                if not self.mm_shownotes(msg.server, target,
+                                         msg.user.nick, topic):
                     msg.answer("%:", ["Sorry!", None],
                                      ["There are no", "No",
                                       "I haven't found"],
                                      "notes about this", [".", "!"])
             else:
-                msg.answer("%:", ["You don't have permission for that",
-                                  "You can't remove notes",
-                                  "You're note allowed to add notes"],
-                                 [".", "!"])
-            return 0
-
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "notes"):
-                topic = m.group("topic")
-                if topic:
-                    if msg.direct:
-                        target = msg.user.nick
-                    else:
-                        target = msg.target
-                    if not self.mm_shownotes(msg.server, target,
-                                             msg.user.nick, topic):
-                        msg.answer("%:", ["Sorry!", None],
-                                         ["There are no", "No",
-                                          "I haven't found"],
-                                         "notes about this", [".", "!"])
-                else:
-                    topics = self.mm_getnotetopics()
-                    for i in range(len(topics)):
-                        if "," in topics[i]:
-                            topics[i] = "'%s'" % topics[i]
-                    msg.answer("%:", "The following note topics are "
-                                     "available:", ", ".join(topics))
-            else:
-                msg.answer("%:", ["You don't have permission for that",
-                                  "You can't show notes",
-                                  "You're note allowed to add notes"],
-                                 [".", "!"])
-            return 0
+                topics = self.mm_getnotetopics()
+                for i in range(len(topics)):
+                    if "," in topics[i]:
+                        topics[i] = "'%s'" % topics[i]
+                msg.answer("%:", "The following note topics are "
+                                 "available:", ", ".join(topics))
+        else:
+            msg.answer("%:", ["You don't have permission for that",
+                              "You can't show notes",
+                              "You're note allowed to add notes"],
+                             [".", "!"])
+        return 0
  
     def mm_getnotes(self, topic):
         return [row[0] for row in
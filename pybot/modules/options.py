@@ -32,7 +32,6 @@ be an administrator.
 
 class Options:
     def __init__(self):
-        hooks.register("Message", self.message)
         hooks.register("Reboot", self.write, 1000)
         hooks.register("Quit", self.write, 1000)
         self.path = config.get("options", "path")
@@ -51,12 +50,20 @@ class Options:
         # show options
         self.re4 = regexp(r"show options")
 
+        router.register(self.re1, self.read_write, forme=1)
+        router.register(self.re2, self.set_option, forme=1)
+        router.register(self.re3, self.show_option, forme=1)
+        router.register(self.re4, self.show_options, forme=1)
+
         # option[s]
         mm.register_help(r"options?", HELP, "options")
     
     def unload(self):
         self.write()
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.read_write)
+        router.unregister(self.re2, self.set_option)
+        router.unregister(self.re3, self.show_option)
+        router.unregister(self.re4, self.show_options)
         hooks.unregister("Reboot", self.write, 1000)
         hooks.unregister("Quit", self.write, 1000)
 
@@ -97,93 +104,84 @@ class Options:
                         newdict[key][0] = oldvalue
             options.setdict(newdict)
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                if m.group("cmd") == "write":
-                    self.write()
-                    msg.answer("%:", ["Done", "Written", "Ok", "Right now"],
-                                     [".", "!"])
-                else:
-                    self.read()
-                    msg.answer("%:", ["Done", "Read", "Ok", "Right now"],
-                                     [".", "!"])
-            else:
-                msg.answer("%:", [("You're not",
-                                   ["that good",
-                                    "allowed to do this"]),
-                                  "No", "Nope"])
-            return 0
-
-        
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                value = eval(m.group("value"), self.safe_env)
-                options[m.group("name")] = value
-                msg.answer("%:", ["Done", "No problems", "Ok", "Right now"],
+    def read_write(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            if m.group("cmd") == "write":
+                self.write()
+                msg.answer("%:", ["Done", "Written", "Ok", "Right now"],
                                  [".", "!"])
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to set options",
-                                    "that good",
-                                    "allowed to do this"]), "No", "Nope"],
+                self.read()
+                msg.answer("%:", ["Done", "Read", "Ok", "Right now"],
                                  [".", "!"])
-            return 0
+        else:
+            msg.answer("%:", [("You're not",
+                               ["that good",
+                                "allowed to do this"]),
+                              "No", "Nope"])
+        return 0
+
+    def set_option(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            value = eval(m.group("value"), self.safe_env)
+            options[m.group("name")] = value
+            msg.answer("%:", ["Done", "No problems", "Ok", "Right now"],
+                             [".", "!"])
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to set options",
+                                "that good",
+                                "allowed to do this"]), "No", "Nope"],
+                             [".", "!"])
+        return 0
 
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                cmd = m.group("cmd")
-                name = m.group("name")
-                if m.group("cmd") == "show":
-                    if name in options:
-                        opt = options[name]
-                        msg.answer("%:", ["This option is", "It is"],
-                                          "set to", `opt`)
-                    else:
-                        msg.answer("%:", ["It seems that", "Sorry, but"],
-                                          "there's not such option",
-                                         [".", "!"])
+    def show_option(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            cmd = m.group("cmd")
+            name = m.group("name")
+            if m.group("cmd") == "show":
+                if name in options:
+                    opt = options[name]
+                    msg.answer("%:", ["This option is", "It is"],
+                                      "set to", `opt`)
                 else:
-                    if name in options:
-                        del options[name]
-                        msg.answer("%:", ["Done", "Removed",
-                                          "No problems", "Ok", "Right now"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["It seems that", "Sorry, but"],
-                                          "there's not such option",
-                                         [".", "!"])
+                    msg.answer("%:", ["It seems that", "Sorry, but"],
+                                      "there's not such option",
+                                     [".", "!"])
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to work with options",
-                                    "that good",
-                                    "allowed to do this"]), "No", "Nope"],
-                                 [".", "!"])
-            return 0
-
-        m = self.re4.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                names = options.keys()
-                if names:
-                    msg.answer("%:", "The following options are available:",
-                                     ", ".join(names))
+                if name in options:
+                    del options[name]
+                    msg.answer("%:", ["Done", "Removed",
+                                      "No problems", "Ok", "Right now"],
+                                     [".", "!"])
                 else:
-                    msg.answer("%:", "No available options",
+                    msg.answer("%:", ["It seems that", "Sorry, but"],
+                                      "there's not such option",
                                      [".", "!"])
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to work with options",
+                                "that good",
+                                "allowed to do this"]), "No", "Nope"],
+                             [".", "!"])
+        return 0
+
+    def show_options(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            names = options.keys()
+            if names:
+                msg.answer("%:", "The following options are available:",
+                                 ", ".join(names))
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to work with options",
-                                    "that good",
-                                    "allowed to do this"]), "No", "Nope"],
+                msg.answer("%:", "No available options",
                                  [".", "!"])
-            return 0
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to work with options",
+                                "that good",
+                                "allowed to do this"]), "No", "Nope"],
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
@@ -17,7 +17,7 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pybot.locals import *
-from pybot.user import User
+from pybot.user import User, UserMask
 from types import StringType
 import re
 
@@ -46,6 +46,9 @@ VALIDUSER = re.compile(r".+!.+@.+")
 
 PARAM = re.compile(r"(?P<perm>\S+)\((?P<param>.*)\)$")
 
+# Maximum number of (server, target, user) entries in the lookup cache.
+MAXCACHE = 1000
+
 class Permission:
     def __init__(self):
         db.table("permission", "permission text, param text default '', "
@@ -58,7 +61,13 @@ class Permission:
         mm.register("unsetperm", self.mm_unsetperm)
         mm.register("permparams", self.mm_permparams)
         mm.register("permparams_raw", self.mm_permparams_raw)
-        hooks.register("Message", self.message)
+        hooks.register("LoggedIn", self.logged)
+        hooks.register("LoggedOut", self.logged)
+
+        # Permission entries indexed by (permission, param), and
+        # results of previous lookups for (server, target, userstr).
+        self.cache = {}
+        self.load_index()
 
         self.staticadmins = []
         if config.has_option("permission", "admins"):
@@ -74,6 +83,9 @@ class Permission:
         # (show|list) perm[ission][s] [<perm>]
         self.re2 = regexp("(?:show|list) perm(?:ission)?s?(?: (?P<perm>\w+))?")
 
+        router.register(self.re1, self.give_perm, forme=1)
+        router.register(self.re2, self.show_perms, forme=1)
+
         # perm[ission][s] [system]
         mm.register_help("perm(?:ission)?s?(?: system)?", HELP,
                          "permissions")
@@ -85,176 +97,216 @@ class Permission:
         mm.unregister("hasperm_raw")
         mm.unregister("setperm")
         mm.unregister("unsetperm")
-        hooks.unregister("Message", self.message)
+        hooks.unregister("LoggedIn", self.logged)
+        hooks.unregister("LoggedOut", self.logged)
+        router.unregister(self.re1, self.give_perm)
+        router.unregister(self.re2, self.show_perms)
         mm.unregister_help(HELP)
         mm.unregister_perm("admin")
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                if not filter(bool, m.group("thischannel", "channel",
-                                            "thisserver", "server",
-                                            "user", "nick", "everyone")):
-                    if m.group("cmd") == "give":
-                        verb = "receive"
-                    else:
-                        verb = "lose"
-                    msg.answer("%:", "Who should %s this permission?" % verb)
-                    return 0
-                if m.group("thischannel"):
-                    found = 1
-                    target = msg.target
-                    servername = msg.server.servername
+    def give_perm(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            if not filter(bool, m.group("thischannel", "channel",
+                                        "thisserver", "server",
+                                        "user", "nick", "everyone")):
+                if m.group("cmd") == "give":
+                    verb = "receive"
                 else:
-                    if m.group("channel"):
-                        found = 1
-                        target = m.group("channel")
-                    else:
-                        target = None
-                    if m.group("thisserver"):
-                        found = 1
-                        servername = msg.server.servername
-                    elif m.group("server"):
-                        servername = m.group("server")
-                    else:
-                        servername = None
-                userstr = m.group("user")
-                if userstr and not VALIDUSER.match(userstr):
-                        msg.answer("%:", "Please, provide a user in the "
-                                   "format \"<nick>!<username>@<servername>\".")
-                        return 0
-                nick = m.group("nick")
-                perm = m.group("perm1") or m.group("perm2")
-                _m = PARAM.match(perm)
-                if _m:
-                    perm, param = _m.group("perm", "param")
+                    verb = "lose"
+                msg.answer("%:", "Who should %s this permission?" % verb)
+                return 0
+            if m.group("thischannel"):
+                found = 1
+                target = msg.target
+                servername = msg.server.servername
+            else:
+                if m.group("channel"):
+                    found = 1
+                    target = m.group("channel")
                 else:
-                    param = ""
-                # Everyone is handled transparently, since all
-                # items will be None
-                if m.group("cmd").lower() == "give":
-                    if not mm.setperm(servername, target,
-                                      userstr, nick, perm, param):
-                        msg.answer("%:", ["I already have this permission",
-                                          "This permission was given before",
-                                          "Not necessary"],
-                                         [".", "!"])
-                        return 0
+                    target = None
+                if m.group("thisserver"):
+                    found = 1
+                    servername = msg.server.servername
+                elif m.group("server"):
+                    servername = m.group("server")
                 else:
-                    if not mm.unsetperm(servername, target,
-                                        userstr, nick, perm, param):
-                        msg.answer("%:", "No entries like this were found",
-                                         [".", "!"])
-                        return 0
-                msg.answer("%:", ["Done", "No problems", "Ok"], [".", "!"])
+                    servername = None
+            userstr = m.group("user")
+            if userstr and not VALIDUSER.match(userstr):
+                    msg.answer("%:", "Please, provide a user in the "
+                               "format \"<nick>!<username>@<servername>\".")
+                    return 0
+            nick = m.group("nick")
+            perm = m.group("perm1") or m.group("perm2")
+            _m = PARAM.match(perm)
+            if _m:
+                perm, param = _m.group("perm", "param")
             else:
-                msg.answer("%:", ["Sorry, you", "Oops! You", "You"],
-                                 ["can't work with permissions",
-                                  "don't have this power"], [".", "!"])
-            return 0
+                param = ""
+            # Everyone is handled transparently, since all
+            # items will be None
+            if m.group("cmd").lower() == "give":
+                if not mm.setperm(servername, target,
+                                  userstr, nick, perm, param):
+                    msg.answer("%:", ["I already have this permission",
+                                      "This permission was given before",
+                                      "Not necessary"],
+                                     [".", "!"])
+                    return 0
+            else:
+                if not mm.unsetperm(servername, target,
+                                    userstr, nick, perm, param):
+                    msg.answer("%:", "No entries like this were found",
+                                     [".", "!"])
+                    return 0
+            msg.answer("%:", ["Done", "No problems", "Ok"], [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "Oops! You", "You"],
+                             ["can't work with permissions",
+                              "don't have this power"], [".", "!"])
+        return 0
 
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                perm = m.group("perm")
-                if perm:
-                    help = self.help.get(perm)
-                    if help:
-                        help = help.replace("\n", " ").strip()
-                        msg.answer("%:", help)
-                    db.execute("select * from permission where permission=?",
-                               perm)
-                    if not db.results:
-                        msg.answer("%:", "Nobody has this permission",
-                                         [".", "!"])
-                    else:
-                        rows = db.fetchall()
-                        numrows = len(rows)
-                        s = ""
-                        for i in range(numrows):
-                            row = rows[i]
-                            first = 1
-                            if row.userstr is not None:
-                                s += "user "
-                                s += row.userstr
-                                first = 0
-                            if row.nick is not None:
-                                join = ""
-                                if not first:
-                                    s += " with "
-                                s += "%s%snick %s" % (s, join, row.nick)
-                                first = 0
-                            if row.target is not None:
-                                join = ""
-                                if not first:
-                                    join = " at "
-                                s = "%s%schannel %s" % (s, join, row.target)
-                                first = 0
-                            if row.servername is not None:
-                                join = ""
-                                if not first:
-                                    join = " on "
-                                s = "%s%sserver %s" % (s, join, row.servername)
-                                first = 0
-                            if first:
-                                s += "everyone"
-                            if row.param:
-                                s += " (%s)" % row.param
-                            if i == numrows-1:
-                                s += "."
-                            elif i == numrows-2:
-                                s += ", and "
-                            else:
-                                s += ", "
-                        msg.answer("%:", "This permission is available "
-                                         "for the following people:", s)
+    def show_perms(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            perm = m.group("perm")
+            if perm:
+                help = self.help.get(perm)
+                if help:
+                    help = help.replace("\n", " ").strip()
+                    msg.answer("%:", help)
+                db.execute("select * from permission where permission=?",
+                           perm)
+                if not db.results:
+                    msg.answer("%:", "Nobody has this permission",
+                                     [".", "!"])
                 else:
-                    allperms = self.help.keys()
-                    if not allperms:
-                        msg.answer("%:", "No available permissions",
-                                         [".", "!"])
-                    else:
-                        allperms.sort()
-                        s = ", ".join(allperms)
-                        msg.answer("%:", "With the currently loaded modules, "
-                                         "I understand the following "
-                                         "permissions: "+s)
-                    db.execute("select distinct permission from permission "
-                               "order by permission")
-                    if not db.results:
-                        msg.answer("%:", "There are no users with allowed "
-                                         "permissions", [".", "!"])
-                    else:
-                        givenperms = [row[0] for row in db]
-                        msg.answer("%:", "The following permissions are "
-                                         "available for some people:",
-                                         ", ".join(givenperms))
+                    rows = db.fetchall()
+                    numrows = len(rows)
+                    s = ""
+                    for i in range(numrows):
+                        row = rows[i]
+                        first = 1
+                        if row.userstr is not None:
+                            s += "user "
+                            s += row.userstr
+                            first = 0
+                        if row.nick is not None:
+                            join = ""
+                            if not first:
+                                s += " with "
+                            s += "%s%snick %s" % (s, join, row.nick)
+                            first = 0
+                        if row.target is not None:
+                            join = ""
+                            if not first:
+                                join = " at "
+                            s = "%s%schannel %s" % (s, join, row.target)
+                            first = 0
+                        if row.servername is not None:
+                            join = ""
+                            if not first:
+                                join = " on "
+                            s = "%s%sserver %s" % (s, join, row.servername)
+                            first = 0
+                        if first:
+                            s += "everyone"
+                        if row.param:
+                            s += " (%s)" % row.param
+                        if i == numrows-1:
+                            s += "."
+                        elif i == numrows-2:
+                            s += ", and "
+                        else:
+                            s += ", "
+                    msg.answer("%:", "This permission is available "
+                                     "for the following people:", s)
             else:
-                msg.answer("%:", ["Sorry, you", "Oops, you", "You"],
-                                 ["can't work with permissions",
-                                  "don't have this power"], [".", "!"])
-            return 0
+                allperms = self.help.keys()
+                if not allperms:
+                    msg.answer("%:", "No available permissions",
+                                     [".", "!"])
+                else:
+                    allperms.sort()
+                    s = ", ".join(allperms)
+                    msg.answer("%:", "With the currently loaded modules, "
+                                     "I understand the following "
+                                     "permissions: "+s)
+                db.execute("select distinct permission from permission "
+                           "order by permission")
+                if not db.results:
+                    msg.answer("%:", "There are no users with allowed "
+                                     "permissions", [".", "!"])
+                else:
+                    givenperms = [row[0] for row in db]
+                    msg.answer("%:", "The following permissions are "
+                                     "available for some people:",
+                                     ", ".join(givenperms))
+        else:
+            msg.answer("%:", ["Sorry, you", "Oops, you", "You"],
+                             ["can't work with permissions",
+                              "don't have this power"], [".", "!"])
+        return 0
+
+    def load_index(self):
+        index = {}
+        admins = []
+        for row in db.execute("select * from permission"):
+            if row.userstr:
+                mask = UserMask(row.userstr)
+            else:
+                mask = None
+            entry = (row.servername, row.target, mask, row.nick)
+            index.setdefault((row.permission, row.param), []).append(entry)
+            if row.permission == "admin":
+                admins.append(entry)
+        self.index = index
+        self.admins = admins
+        self.cache.clear()
+
+    def logged(self, servername, userstr, nick=None):
+        # A userstr of None means that anyone on servername may be
+        # affected.
+        for key in self.cache.keys():
+            if key[0] == servername and userstr in (None, key[2]):
+                del self.cache[key]
+
+    def usercache(self, servername, target, user):
+        key = (servername, target, user.string)
+        cache = self.cache.get(key)
+        if cache is None:
+            if len(self.cache) >= MAXCACHE:
+                self.cache.clear()
+            cache = self.cache[key] = {}
+        return cache
+
+    def matchentries(self, entries, servername, target, user, loggednick):
+        for entry_servername, entry_target, mask, nick in entries:
+            if (not entry_servername or entry_servername == servername) and \
+               (not entry_target or entry_target == target) and \
+               (not mask or mask.match(user)) and \
+               (not nick or nick == loggednick):
+                return 1
+        return 0
 
     def mm_hasperm_raw(self, servername, target, user, perm, param=""):
         if servername == "console":
             return 1
-        loggednick = mm.loggednick(servername, user)
-        if (servername, loggednick) in self.staticadmins:
-            return 1
-        db.execute("select * from permission where "
-                   "permission='admin' or (permission=? and param=?)",
-                   perm, param)
-        for row in db:
-            if (not row.servername or row.servername == servername) and \
-               (not row.target or row.target == target) and \
-               (not row.userstr or user.matchstr(row.userstr)) and \
-               (not row.nick or row.nick == loggednick):
-                    return 1
-        return 0
+        cache = self.usercache(servername, target, user)
+        ret = cache.get((perm, param))
+        if ret is None:
+            loggednick = mm.loggednick(servername, user)
+            if (servername, loggednick) in self.staticadmins:
+                ret = 1
+            else:
+                ret = self.matchentries(self.admins, servername, target,
+                                        user, loggednick) or \
+                      self.matchentries(self.index.get((perm, param), ()),
+                                        servername, target, user,
+                                        loggednick)
+            # The lookup may have logged the user in, dropping its cache.
+            self.usercache(servername, target, user)[(perm, param)] = ret
+        return ret
 
     def mm_hasperm(self, msg, perm, param=""):
         return self.mm_hasperm_raw(msg.server.servername,
@@ -266,7 +318,9 @@ class Permission:
             return 0
         db.execute("insert into permission values (?,?,?,?,?,?)",
                    perm, param, servername, target, userstr, nick)
-        return db.changed
+        changed = db.changed
+        self.load_index()
+        return changed
 
     def mm_unsetperm(self, servername, target, userstr, nick,
                      perm, param="", check=0):
@@ -295,21 +349,25 @@ class Permission:
         wstr = " and ".join(where)
         if not check:
             db.execute("delete from permission where "+wstr, *wargs)
-        else:
-            db.execute("select null from permission where "+wstr, *wargs)
-        return db.changed or db.results
+            changed = db.changed
+            self.load_index()
+            return changed
+        db.execute("select null from permission where "+wstr, *wargs)
+        return db.results
 
     def mm_permparams_raw(self, servername, target, user, perm):
-        loggednick = mm.loggednick(servername, user)
-        db.execute("select * from permission where permission=?", perm)
-        params = {}
-        for row in db:
-            if (not row.servername or row.servername == servername) and \
-               (not row.target or row.target == target) and \
-               (not row.userstr or user.matchstr(row.userstr)) and \
-               (not row.nick or row.nick == loggednick):
-                    params[row.param] = 1
-        return params.keys()
+        cache = self.usercache(servername, target, user)
+        params = cache.get(perm)
+        if params is None:
+            loggednick = mm.loggednick(servername, user)
+            params = []
+            for (entry_perm, param), entries in self.index.items():
+                if entry_perm == perm and \
+                   self.matchentries(entries, servername, target,
+                                     user, loggednick):
+                    params.append(param)
+            self.usercache(servername, target, user)[perm] = params
+        return params[:]
 
     def mm_permparams(self, msg, perm):
         return self.mm_permparams_raw(msg.server.servername,
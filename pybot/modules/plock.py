@@ -67,7 +67,6 @@ class PLockFile:
 class PLock:
     def __init__(self):
         self.pdir = config.get("plock", "dirpath")
-        hooks.register("Message", self.message)
         
         # [force] plock <package> [,<package>]
         self.re1 = regexp(r"(?P<force>force )?plock (?P<package>[\w_\.-]+(?:(?: *,? *and |[, ]+)[\w_\.-]+)*)")
@@ -84,6 +83,12 @@ class PLock:
         # plock <package> [,<package>] ?
         self.re5 = regexp(r"plock (?P<package>[\w_\.-]+(?:(?: *,? *and |[, ]+)[\w_\.-]+)*)", question=1, needpunct=1)
 
+        router.register(self.re1, self.plock, forme=1)
+        router.register(self.re2, self.unplock, forme=1)
+        router.register(self.re3, self.show_plocks)
+        router.register(self.re4, self.show_plocker)
+        router.register(self.re5, self.show_plocker)
+
         # [un]plock[ing] | <package|pkg> lock[ing]
         mm.register_help("(?:un)?plock(?:ing)?|(?:package|pkg) lock(?:ing)?",
                          HELP, "plock")
@@ -91,7 +96,11 @@ class PLock:
         mm.register_perm("plock", PERM_PLOCK)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.plock)
+        router.unregister(self.re2, self.unplock)
+        router.unregister(self.re3, self.show_plocks)
+        router.unregister(self.re4, self.show_plocker)
+        router.unregister(self.re5, self.show_plocker)
         mm.unregister_help(HELP)
         mm.unregister_perm("plock")
     
@@ -102,151 +111,145 @@ class PLock:
         row = db.fetchone()
         return row and row[0] or None
 
-    def message(self, msg):
-        if msg.forme:
-            m = self.re1.match(msg.line)
-            if m:
-                if mm.hasperm(msg, "plock"):
-                    email = mm.getuserdata(msg.server.servername,
-                                           msg.user.nick, "email",
-                                           single=1)
-                    if not email:
-                        msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email (with 'register email <email>')", ["!", "."])
-                    else:
-                        ok = 1
-                        force = m.group("force")
-                        split_re = re.compile("(?:\s*,?\s*and\s+|[, ]+)")
-                        packages = split_re.split(m.group("package"))
-                        for package in packages:
-                            file = PLockFile(self.pdir, package)
-                            if not force and file.exists():
-                                ok = 0
-                                msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is already plocked"%package, ["!", "."])
-                            else:
-                                if msg.direct:
-                                    target = msg.user.nick
-                                else:
-                                    target = msg.target
-                                mm.shownotes(msg.server, target, msg.user.nick, package)
-                                try:
-                                    file.set(email)
-                                except:
-                                    ok = 0
-                                    msg.answer("%:", ["Argh!", "Oops!", "Damd!"], "Something wrong happened while trying to plock "+package, ["!", "."])
-                        if ok:
-                            msg.answer("%:", ["Done", "Ready", "Plocked"], ["!", "."])
-                else:
-                    msg.answer("%:", ["Sorry, you", "You"], ["can't plock.", "don't have this power."])
-                return 0
-            
-            m = self.re2.match(msg.line)
-            if m:
-                if mm.hasperm(msg, "plock"):
-                    email = mm.getuserdata(msg.server.servername,
-                                           msg.user.nick, "email",
-                                           single=1)
-                    if not email:
-                        msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email", ["!", "."])
-                    else:
-                        ok = 1
-                        force = m.group("force")
-                        split_re = re.compile("(?:\s*,?\s*and\s+|[, ]+)")
-                        packages = split_re.split(m.group("package"))
-                        for package in packages:
-                            file = PLockFile(self.pdir, package)
-                            if not file.exists():
-                                ok = 0
-                                msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is not plocked"%package, ["!", "."])
-                            elif not force and file.get() != email:
-                                ok = 0
-                                msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is not plocked by you"%package, ["!", "."])
-                            else:
-                                if msg.direct:
-                                    target = msg.user.nick
-                                else:
-                                    target = msg.target
-                                mm.shownotes(msg.server, target, msg.user.nick, package)
-                                try:
-                                    file.remove()
-                                except:
-                                    ok = 0
-                                    msg.answer("%:", ["Argh!", "Oops!", "Damd!"], "Something wrong happened while trying to unplock "+package, ["!", "."])
-                        if ok:
-                            msg.answer("%:", ["Done", "Ready", "Unplocked"], ["!", "."])
-                else:
-                    msg.answer("%:", ["Sorry, you", "You"], ["can't unplock.", "don't have this power."])
-                return 0
-
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "plock"):
-                my = m.group("my") != None
-                user = m.group("user")
-                if my:
-                    email = mm.getuserdata(msg.server.servername,
-                                           msg.user.nick, "email",
-                                           single=1)
-                    if not email:
-                        msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email", ["!", "."])
-                elif "@" not in user:
-                    email = mm.getuserdata(msg.server.servername,
-                                           user, "email", single=1)
-                    if not email:
-                        msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "No email registered for this nick", ["!", "."])
-                else:
-                    email = user 
-                if email:
-                    plocks = None
-                    for name in os.listdir(self.pdir):
-                        file = PLockFile(self.pdir, name)
-                        if email == file.get():
-                            if plocks:
-                                plocks = plocks + ", " + name
-                            else:
-                                plocks = name
-                    if my:
-                        if plocks:
-                            msg.answer("%:", ["Here are your plocks:", "Your plocks:"], plocks)
-                        else:
-                            msg.answer("%:", ["You're not plocking any package", "No plocks for you"], ["!", "."])
+    def plock(self, msg, m):
+        if mm.hasperm(msg, "plock"):
+            email = mm.getuserdata(msg.server.servername,
+                                   msg.user.nick, "email",
+                                   single=1)
+            if not email:
+                msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email (with 'register email <email>')", ["!", "."])
+            else:
+                ok = 1
+                force = m.group("force")
+                split_re = re.compile("(?:\s*,?\s*and\s+|[, ]+)")
+                packages = split_re.split(m.group("package"))
+                for package in packages:
+                    file = PLockFile(self.pdir, package)
+                    if not force and file.exists():
+                        ok = 0
+                        msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is already plocked"%package, ["!", "."])
                     else:
-                        if plocks:
-                            msg.answer("%:", user+" is plocking the following packages:", plocks)
+                        if msg.direct:
+                            target = msg.user.nick
                         else:
-                            msg.answer("%:", [user+" is not plocking any package", "No plocks for "+user], ["!", "."])
-            else:
-                msg.answer("%:", ["Sorry, but you", "You"], ["can't check plocks.", "are not that good."])
-            return 0
+                            target = msg.target
+                        mm.shownotes(msg.server, target, msg.user.nick, package)
+                        try:
+                            file.set(email)
+                        except:
+                            ok = 0
+                            msg.answer("%:", ["Argh!", "Oops!", "Damd!"], "Something wrong happened while trying to plock "+package, ["!", "."])
+                if ok:
+                    msg.answer("%:", ["Done", "Ready", "Plocked"], ["!", "."])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"], ["can't plock.", "don't have this power."])
+        return 0
 
-        m = self.re4.match(msg.line) or self.re5.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "plock"):
+    def unplock(self, msg, m):
+        if mm.hasperm(msg, "plock"):
+            email = mm.getuserdata(msg.server.servername,
+                                   msg.user.nick, "email",
+                                   single=1)
+            if not email:
+                msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email", ["!", "."])
+            else:
+                ok = 1
+                force = m.group("force")
                 split_re = re.compile("(?:\s*,?\s*and\s+|[, ]+)")
                 packages = split_re.split(m.group("package"))
                 for package in packages:
                     file = PLockFile(self.pdir, package)
-                    if file.exists():
-                        locker = file.get()
-                        ptime = file.gettime()
-                        if self.istoday(ptime):
-                            fstr = " today at %H:%M."
+                    if not file.exists():
+                        ok = 0
+                        msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is not plocked"%package, ["!", "."])
+                    elif not force and file.get() != email:
+                        ok = 0
+                        msg.answer("%:", ["Oops!", "Sorry!"], "Package %s is not plocked by you"%package, ["!", "."])
+                    else:
+                        if msg.direct:
+                            target = msg.user.nick
                         else:
-                            fstr = " on %Y/%m/%d at %H:%M."
-                        when = time.strftime(fstr, ptime)
-                        email = mm.getuserdata(msg.server.servername,
-                                               msg.user.nick, "email",
-                                               single=1)
-                        if locker == email:
-                            msg.answer("%:", "You have plocked "+package+when)
+                            target = msg.target
+                        mm.shownotes(msg.server, target, msg.user.nick, package)
+                        try:
+                            file.remove()
+                        except:
+                            ok = 0
+                            msg.answer("%:", ["Argh!", "Oops!", "Damd!"], "Something wrong happened while trying to unplock "+package, ["!", "."])
+                if ok:
+                    msg.answer("%:", ["Done", "Ready", "Unplocked"], ["!", "."])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"], ["can't unplock.", "don't have this power."])
+        return 0
+
+    def show_plocks(self, msg, m):
+        if mm.hasperm(msg, "plock"):
+            my = m.group("my") != None
+            user = m.group("user")
+            if my:
+                email = mm.getuserdata(msg.server.servername,
+                                       msg.user.nick, "email",
+                                       single=1)
+                if not email:
+                    msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "You must register an email", ["!", "."])
+            elif "@" not in user:
+                email = mm.getuserdata(msg.server.servername,
+                                       user, "email", single=1)
+                if not email:
+                    msg.answer("%:", ["Hummm...", "Nope!", "Sorry!"], "No email registered for this nick", ["!", "."])
+            else:
+                email = user 
+            if email:
+                plocks = None
+                for name in os.listdir(self.pdir):
+                    file = PLockFile(self.pdir, name)
+                    if email == file.get():
+                        if plocks:
+                            plocks = plocks + ", " + name
                         else:
-                            nick = self.getnick(msg.server.servername, locker)
-                            if nick: locker = nick
-                            msg.answer("%:", locker+" has plocked "+package+when)
+                            plocks = name
+                if my:
+                    if plocks:
+                        msg.answer("%:", ["Here are your plocks:", "Your plocks:"], plocks)
                     else:
-                        msg.answer("%:", "Package %s is not plocked"%package, ["!", "."])
-            else:
-                msg.answer("%:", ["Sorry, but you", "You"], ["can't check plocks.", " are not that good."])
-            return 0
+                        msg.answer("%:", ["You're not plocking any package", "No plocks for you"], ["!", "."])
+                else:
+                    if plocks:
+                        msg.answer("%:", user+" is plocking the following packages:", plocks)
+                    else:
+                        msg.answer("%:", [user+" is not plocking any package", "No plocks for "+user], ["!", "."])
+        else:
+            msg.answer("%:", ["Sorry, but you", "You"], ["can't check plocks.", "are not that good."])
+        return 0
+
+    def show_plocker(self, msg, m):
+        if mm.hasperm(msg, "plock"):
+            split_re = re.compile("(?:\s*,?\s*and\s+|[, ]+)")
+            packages = split_re.split(m.group("package"))
+            for package in packages:
+                file = PLockFile(self.pdir, package)
+                if file.exists():
+                    locker = file.get()
+                    ptime = file.gettime()
+                    if self.istoday(ptime):
+                        fstr = " today at %H:%M."
+                    else:
+                        fstr = " on %Y/%m/%d at %H:%M."
+                    when = time.strftime(fstr, ptime)
+                    email = mm.getuserdata(msg.server.servername,
+                                           msg.user.nick, "email",
+                                           single=1)
+                    if locker == email:
+                        msg.answer("%:", "You have plocked "+package+when)
+                    else:
+                        nick = self.getnick(msg.server.servername, locker)
+                        if nick: locker = nick
+                        msg.answer("%:", locker+" has plocked "+package+when)
+                else:
+                    msg.answer("%:", "Package %s is not plocked"%package, ["!", "."])
+        else:
+            msg.answer("%:", ["Sorry, but you", "You"], ["can't check plocks.", " are not that good."])
+        return 0
 
     def istoday(self, ptimetuple):
         timetuple = time.localtime(time.time())
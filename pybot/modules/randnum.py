@@ -32,79 +32,75 @@ The "randnum" permission allows users to ask for random numbers. Check
 
 class RandNum:
     def __init__(self):
-        hooks.register("Message", self.message)
         
         # [give|tell|show] [me] [a|one|<n>] [random] number[s] between <num1> and <num2>
         self.re1 = regexp(r"(?:give|tell|show) (?:me )?(?P<n>a|one|\d+) (?:random )?numbers? between (?P<num1>\d+) and (?P<num2>\d+)")
 
+        router.register(self.re1, self.random_number, forme=1)
+
         # randnum[s]|random number[s]
         mm.register_help("randnums?|random numbers?", HELP, "randnum")
 
         mm.register_perm("randnum", PERM_RANDNUM)
     
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.random_number)
         mm.unregister_help(HELP)
         mm.unregister_perm("randnum")
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "randnum"):
-                try:
-                    n = m.group("n")
-                    if n in ["a", "one"]:
-                        n = 1
-                    else:
-                        n = int(var[0])
-                    s = int(m.group("num1"))
-                    e = int(m.group("num2"))
-                    randint(s,e)
-                except:
-                    msg.answer("%:", ["Your numbers are not valid",
-                                      "I need valid numbers",
-                                      "You must give me valid numbers",
-                                      "There's a problem with your numbers",
-                                      "You gave me invalid numbers"],
-                                      [".", "!"])
-                    return
-                if n > 0:
-                    if n < 11:
-                        nums = str(randint(s,e))
-                        i = 1
-                        while i < n:
-                            num = randint(s,e)
-                            if i == n-1:
-                                if n > 2:
-                                    nums = nums+", and "+str(num)
-                                else:
-                                    nums = nums+" and "+str(num)
+    def random_number(self, msg, m):
+        if mm.hasperm(msg, "randnum"):
+            try:
+                n = m.group("n")
+                if n in ["a", "one"]:
+                    n = 1
+                else:
+                    n = int(var[0])
+                s = int(m.group("num1"))
+                e = int(m.group("num2"))
+                randint(s,e)
+            except:
+                msg.answer("%:", ["Your numbers are not valid",
+                                  "I need valid numbers",
+                                  "You must give me valid numbers",
+                                  "There's a problem with your numbers",
+                                  "You gave me invalid numbers"],
+                                  [".", "!"])
+                return
+            if n > 0:
+                if n < 11:
+                    nums = str(randint(s,e))
+                    i = 1
+                    while i < n:
+                        num = randint(s,e)
+                        if i == n-1:
+                            if n > 2:
+                                nums = nums+", and "+str(num)
                             else:
-                                nums = nums+", "+str(num)
-                            i = i + 1
-                        if n == 1:
-                            isare = "number is"
+                                nums = nums+" and "+str(num)
                         else:
-                            isare = "numbers are"
-                        msg.answer("%:", ["Your", "The", "The chosen"],
-                                         isare, nums, [".", "!"])
+                            nums = nums+", "+str(num)
+                        i = i + 1
+                    if n == 1:
+                        isare = "number is"
                     else:
-                        msg.answer("%:", "You",
-                                         ["have to", "must", "should"],
-                                         "ask for 10 numbers, at most",
-                                         [".", "!"])
+                        isare = "numbers are"
+                    msg.answer("%:", ["Your", "The", "The chosen"],
+                                     isare, nums, [".", "!"])
                 else:
-                    msg.answer("%:", "You", ["have to", "must", "should"],
-                                     "ask for 1 number, at least",
+                    msg.answer("%:", "You",
+                                     ["have to", "must", "should"],
+                                     "ask for 10 numbers, at most",
                                      [".", "!"])
             else:
-                msg.answer("%:", ["You're not allowed to ask for random "
-                                  "number", "You can't do that", "No, "
-                                  "you're not allowed"], [".", "!"])
-            return 0
+                msg.answer("%:", "You", ["have to", "must", "should"],
+                                 "ask for 1 number, at least",
+                                 [".", "!"])
+        else:
+            msg.answer("%:", ["You're not allowed to ask for random "
+                              "number", "You can't do that", "No, "
+                              "you're not allowed"], [".", "!"])
+        return 0
 
 
 def __loadmodule__():
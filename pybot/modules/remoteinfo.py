@@ -17,8 +17,11 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pybot.locals import *
+from pybot.misc import PatternSet, work
 import thread, time
-import urllib
+import traceback
+import hashlib
+import urllib2
 import re
 import os
 
@@ -74,21 +77,75 @@ information from remote URLs, and to show which URLs are being loaded.
 DEFAULTREGEX = "\s*(?:<(?P<flags>[^>]*)>\s*)?(?P<trigger>.*?)\s*=>\s*(?P<msg>.*)"
 DEFAULTINTERVAL = "10m"
 
+# Maximum number of URLs being fetched at once, unless set in the
+# [workers] section of the configuration.
+MAXFETCHES = 4
+
+# Seconds to wait for a remote server before giving up.
+FETCHTIMEOUT = 60
+
 class Info:
     def __init__(self):
         self.lasttime = 0
         self.patterns = {}
+        self.etag = None
+        self.modified = None
+        self.digest = None
+        self.compile()
+
+    def compile(self):
+        """Join the patterns once they're all loaded.
+
+        Items with the 'g' flag are also joined on their own, since
+        they're the only ones checked on messages not targeted to me.
+        """
+        self.items = self.patterns.items()
+        self.globalitems = [item for item in self.items if 'g' in item[1][0]]
+        self.matcher = PatternSet([item[0] for item in self.items])
+        self.globalmatcher = PatternSet([item[0]
+                                         for item in self.globalitems])
 
     def __repr__(self):
         return "<Info: %s>" % `self.patterns`
 
+def fetch(url, etag=None, modified=None):
+    """Fetch url, unless it's unchanged since it was last fetched.
+
+    The ETag and Last-Modified headers returned when the url was last
+    fetched are sent back, so servers may tell it's unchanged. Returns
+    the data, or None if unchanged, and the new headers.
+    """
+    request = urllib2.Request(url)
+    if etag:
+        request.add_header("If-None-Match", etag)
+    if modified:
+        request.add_header("If-Modified-Since", modified)
+    try:
+        infourl = urllib2.urlopen(request, timeout=FETCHTIMEOUT)
+    except urllib2.HTTPError, e:
+        if e.code == 304:
+            return None, etag, modified
+        raise
+    try:
+        headers = infourl.info()
+        return (infourl.read(), headers.getheader("ETag"),
+                headers.getheader("Last-Modified"))
+    finally:
+        infourl.close()
+
 class RemoteInfo:
     def __init__(self):
         db.table("remoteinfo", "url text unique, regex text, interval text")
         self.info = options.get("RemoteInfo.info", {})
         self.info_lock = options.get("RemoteInfo.info_lock", {})
         self.lock = thread.allocate_lock()
-        hooks.register("Message", self.message)
+        self.nextcheck = 0
+        for url, info in self.info.items():
+            if not isinstance(info, Info):
+                # Loaded by a previous version of this module.
+                self.info[url] = newinfo = Info()
+                newinfo.__dict__.update(info.__dict__)
+                newinfo.compile()
         hooks.register("Message", self.message_remoteinfo, priority=1000)
         hooks.register("CTCP", self.message_remoteinfo, priority=1000)
 
@@ -101,6 +158,10 @@ class RemoteInfo:
         # show remote[ ]info[s]
         self.re3 = regexp(r"show remote *infos?")
 
+        router.register(self.re1, self.load_remoteinfo, forme=1)
+        router.register(self.re2, self.reload_remoteinfo, forme=1)
+        router.register(self.re3, self.show_remoteinfos, forme=1)
+
         # remote[ ]info
         mm.register_help("remote *info?", HELP, "remoteinfo")
         mm.register_help("remote *infos? *syntax", HELP_SYNTAX,
@@ -109,6 +170,7 @@ class RemoteInfo:
         mm.register_perm("remoteinfo", PERM_REMOTEINFO)
         mm.register_perm("remoteinfoadmin", PERM_REMOTEINFOADMIN)
 
+        mm.workqueue("remoteinfo", MAXFETCHES)
         mm.hooktimer(30, self.reload_all, ())
 
         if not self.info:
@@ -116,7 +178,9 @@ class RemoteInfo:
 
     def unload(self):
         mm.unhooktimer(30, self.reload_all, ())
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.load_remoteinfo)
+        router.unregister(self.re2, self.reload_remoteinfo)
+        router.unregister(self.re3, self.show_remoteinfos)
         hooks.unregister("Message", self.message_remoteinfo, priority=1000)
         hooks.unregister("CTCP", self.message_remoteinfo, priority=1000)
         mm.unregister_help(HELP)
@@ -142,10 +206,18 @@ class RemoteInfo:
 
     def reload_all(self):
         now = time.time()
+        if now < self.nextcheck:
+            return
+        nextcheck = None
         for row in db.execute("select * from remoteinfo"):
             info = self.info.get(row.url)
             if not info or now-info.lasttime > int(row.interval):
                 self.reload(row.url, row.regex)
+                nextcheck = 0
+            elif nextcheck is None or \
+                 info.lasttime+int(row.interval) < nextcheck:
+                nextcheck = info.lasttime+int(row.interval)
+        self.nextcheck = nextcheck or 0
 
     def reload(self, url, regex=None):
         if not regex:
@@ -154,19 +226,33 @@ class RemoteInfo:
             if not row: return
             regex = row.regex
         if self.lock_url(url):
-            thread.start_new_thread(self._reload, (url, regex))
+            if not work("remoteinfo", self._reload, (url, regex)):
+                self.unlock_url(url)
 
     def _reload(self, url, regex):
         try:
+            oldinfo = self.info.get(url)
             try:
-                infourl = urllib.urlopen(url)
+                if oldinfo:
+                    data, etag, modified = fetch(url, oldinfo.etag,
+                                                 oldinfo.modified)
+                else:
+                    data, etag, modified = fetch(url)
             except:
-                import traceback
                 traceback.print_exc()
+                return
+            if data is not None:
+                digest = hashlib.sha1(regex+"\0"+data).hexdigest()
+            if data is None or (oldinfo and digest == oldinfo.digest):
+                # Unchanged, so there's nothing to parse.
+                if oldinfo:
+                    oldinfo.etag = etag
+                    oldinfo.modified = modified
+                    oldinfo.lasttime = time.time()
             else:
                 info = Info()
                 p = re.compile(regex)
-                for line in infourl.read().splitlines():
+                for line in data.splitlines():
                     m = p.match(line)
                     if m:
                         try:
@@ -190,7 +276,10 @@ class RemoteInfo:
                         except re.error:
                             continue
                         info.patterns[trigger_re] = (flags, msg)
-                infourl.close()
+                info.compile()
+                info.etag = etag
+                info.modified = modified
+                info.digest = digest
                 info.lasttime = time.time()
                 self.info[url] = info
         finally:
@@ -202,8 +291,15 @@ class RemoteInfo:
         for url, info in self.info.items():
             if url not in allowed:
                 continue
-            for p in info.patterns:
-                flags, infomsg = info.patterns[p]
+            if msg.forme:
+                items = info.items
+                first = info.matcher.first(msg.line)
+            else:
+                items = info.globalitems
+                first = info.globalmatcher.first(msg.line)
+            if first is None:
+                continue
+            for p, (flags, infomsg) in items[first:]:
                 if not ('g' in flags or msg.forme):
                     continue
                 if msg.ctcp and (msg.ctcp != "ACTION" or 'c' not in flags):
@@ -232,144 +328,138 @@ class RemoteInfo:
                     ret = 0
         return ret
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                url = m.group("url")
-                regex = (m.group("regex") or DEFAULTREGEX).strip()
-                interval = m.group("interval")
-                if not interval:
-                    interval = DEFAULTINTERVAL[:-1]
-                    unit = DEFAULTINTERVAL[-1]
-                else:
-                    unit = m.group("intervalunit")[0]
-                unitindex = ["s", "m", "h"].index(unit)
-                unitfactor = [1, 60, 3600][unitindex]
-                try:
-                    interval = int(interval)*unitfactor
-                    if interval == 0:
-                        raise ValueError
-                except ValueError:
-                    msg.answer("%:", ["Hummm...", "Oops!", "Heh..."],
-                                     ["This interval is not valid",
-                                      "There's something wrong with the "
-                                      "interval you provided"],
-                                     ["!", "."])
-                    return 0
-                try:
-                    m = re.compile(regex)
-                except re.error:
-                    msg.answer("%:", ["Hummm...", "Oops!", "Heh..."],
-                                     ["This regex is not valid",
-                                      "There's something wrong with the "
-                                      "regex you provided"],
-                                     ["!", "."])
-                    return 0
-
-                try:
-                    db.execute("insert into remoteinfo values "
-                               "(null,?,?,?)", url, regex, interval)
-                except db.error:
-                    msg.answer("%:", ["I can't do that.", "Nope.", None],
-                                     ["I'm already loading that url",
-                                      "Can't insert repeated urls",
-                                      "This url is already in my database"],
-                                     [".", "!"])
-                else:
-                    msg.answer("%:", ["Loading",
-                                      "No problems",
-                                      "Starting right now",
-                                      "Sure"],
-                                     [".", "!"])
-                    self.reload(url, regex)
+    def load_remoteinfo(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            url = m.group("url")
+            regex = (m.group("regex") or DEFAULTREGEX).strip()
+            interval = m.group("interval")
+            if not interval:
+                interval = DEFAULTINTERVAL[:-1]
+                unit = DEFAULTINTERVAL[-1]
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to change remote info options",
-                                    "that good",
-                                    "allowed to do this"]),
-                                  "Nope"], [".", "!"])
-            return 0
-        
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "remoteinfoadmin"):
-                cmd = m.group("cmd")
-                url = m.group("url")
-                db.execute("select null from remoteinfo where url=?", url)
-                if not db.results:
-                    msg.answer("%:", ["I can't do that.", "Nope.", None],
-                                     ["I'm not loading that url",
-                                      "This url is not in my database"],
-                                     [".", "!"])
-                elif cmd == "un":
-                        if not self.lock_url(url):
-                            msg.answer("%:", "Can't do that now. URL is "
-                                             "being loaded in this exact "
-                                             "moment. Try again in a few "
-                                             "seconds.")
-                        else:
-                            if url in self.info:
-                                del self.info[url]
-                            if url in self.info_lock:
-                                del self.info_lock[url]
-                            # Unlocking is not really necessary, but
-                            # politically right. ;-)
-                            self.unlock_url(url)
-                            db.execute("delete from remoteinfo where url=?",
-                                       url)
-                            msg.answer("%:", ["Done", "Of course", "Ready"],
-                                             [".", "!"])
-                else:
-                    msg.answer("%:", ["Will do that",
-                                      "In a moment",
-                                      "Will be ready in a moment",
-                                      "Starting right now"], [".", "!"])
-                    self.reload(url)
+                unit = m.group("intervalunit")[0]
+            unitindex = ["s", "m", "h"].index(unit)
+            unitfactor = [1, 60, 3600][unitindex]
+            try:
+                interval = int(interval)*unitfactor
+                if interval == 0:
+                    raise ValueError
+            except ValueError:
+                msg.answer("%:", ["Hummm...", "Oops!", "Heh..."],
+                                 ["This interval is not valid",
+                                  "There's something wrong with the "
+                                  "interval you provided"],
+                                 ["!", "."])
+                return 0
+            try:
+                m = re.compile(regex)
+            except re.error:
+                msg.answer("%:", ["Hummm...", "Oops!", "Heh..."],
+                                 ["This regex is not valid",
+                                  "There's something wrong with the "
+                                  "regex you provided"],
+                                 ["!", "."])
+                return 0
+
+            try:
+                db.execute("insert into remoteinfo values "
+                           "(null,?,?,?)", url, regex, interval)
+            except db.error:
+                msg.answer("%:", ["I can't do that.", "Nope.", None],
+                                 ["I'm already loading that url",
+                                  "Can't insert repeated urls",
+                                  "This url is already in my database"],
+                                 [".", "!"])
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to touch remote infos",
-                                    "that good",
-                                    "allowed to do this"]),
-                                  "Nope"], [".", "!"])
-            return 0
-
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "remoteinfoadmin"):
-                db.execute("select * from remoteinfo")
-                if db.results:
-                    msg.answer("%:", "The following remote info urls are "
-                                     "being loaded:")
-                    for row in db:
-                        interval = int(row.interval)
-                        if interval % 3600 == 0:
-                            interval /= 3600
-                            unit = "hour"
-                        elif interval % 60 == 0:
-                            interval /= 60
-                            unit = "minute"
-                        else:
-                            unit = "second"
-                        if interval > 1:
-                            unit += "s"
-                        regex = row.regex
-                        if regex and regex[0] == "\\":
-                            regex = "\\"+regex
-                        msg.answer("-", row.url, "each", str(interval), unit,
-                                   "with regex", regex)
-                else:
-                    msg.answer("%:", "No remote info urls are currently "
-                                     "being loaded", [".", "!"])
+                msg.answer("%:", ["Loading",
+                                  "No problems",
+                                  "Starting right now",
+                                  "Sure"],
+                                 [".", "!"])
+                self.nextcheck = 0
+                self.reload(url, regex)
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to change remote info options",
+                                "that good",
+                                "allowed to do this"]),
+                              "Nope"], [".", "!"])
+        return 0
+
+    def reload_remoteinfo(self, msg, m):
+        if mm.hasperm(msg, "remoteinfoadmin"):
+            cmd = m.group("cmd")
+            url = m.group("url")
+            db.execute("select null from remoteinfo where url=?", url)
+            if not db.results:
+                msg.answer("%:", ["I can't do that.", "Nope.", None],
+                                 ["I'm not loading that url",
+                                  "This url is not in my database"],
+                                 [".", "!"])
+            elif cmd == "un":
+                    if not self.lock_url(url):
+                        msg.answer("%:", "Can't do that now. URL is "
+                                         "being loaded in this exact "
+                                         "moment. Try again in a few "
+                                         "seconds.")
+                    else:
+                        if url in self.info:
+                            del self.info[url]
+                        if url in self.info_lock:
+                            del self.info_lock[url]
+                        # Unlocking is not really necessary, but
+                        # politically right. ;-)
+                        self.unlock_url(url)
+                        db.execute("delete from remoteinfo where url=?",
+                                   url)
+                        msg.answer("%:", ["Done", "Of course", "Ready"],
+                                         [".", "!"])
+            else:
+                msg.answer("%:", ["Will do that",
+                                  "In a moment",
+                                  "Will be ready in a moment",
+                                  "Starting right now"], [".", "!"])
+                self.reload(url)
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to touch remote infos",
+                                "that good",
+                                "allowed to do this"]),
+                              "Nope"], [".", "!"])
+        return 0
+
+    def show_remoteinfos(self, msg, m):
+        if mm.hasperm(msg, "remoteinfoadmin"):
+            db.execute("select * from remoteinfo")
+            if db.results:
+                msg.answer("%:", "The following remote info urls are "
+                                 "being loaded:")
+                for row in db:
+                    interval = int(row.interval)
+                    if interval % 3600 == 0:
+                        interval /= 3600
+                        unit = "hour"
+                    elif interval % 60 == 0:
+                        interval /= 60
+                        unit = "minute"
+                    else:
+                        unit = "second"
+                    if interval > 1:
+                        unit += "s"
+                    regex = row.regex
+                    if regex and regex[0] == "\\":
+                        regex = "\\"+regex
+                    msg.answer("-", row.url, "each", str(interval), unit,
+                               "with regex", regex)
             else:
-                msg.answer("%:", "You're not",
-                                 ["allowed to show remote infos",
-                                  "that good",
-                                  "allowed to do this"], [".", "!"])
-            return 0
+                msg.answer("%:", "No remote info urls are currently "
+                                 "being loaded", [".", "!"])
+        else:
+            msg.answer("%:", "You're not",
+                             ["allowed to show remote infos",
+                              "that good",
+                              "allowed to do this"], [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
@@ -50,18 +50,19 @@ class RepeatDef:
 
 class Repeat:
     def __init__(self):
-        hooks.register("Message", self.message)
 
         # [don[']t|do not] repeat [each <n>[ ](s[econds]|m[inutes]|h[ours])] (to|at|on) [channel|user] <target> [[on|at] server <server>]: [/me|/notice] ...
         self.re1 = regexp(r"(?:(?P<dont>don'?t|do not) )?repeat(?: each (?P<interval>[0-9]+) *(?P<intervalunit>se?c?o?n?d?s?|mi?n?u?t?e?s?|ho?u?r?s?))?(?: (?:to|at|on)(?: (?:channel|user))? (?P<target>\S+))?(?: (?:on|at)? server (?P<server>\S+))? *: (?P<action>/me\s)?(?P<notice>/notice\s)?(?P<phrase>.*)")
 
+        router.register(self.re1, self.repeat, forme=1)
+
         # repeat
         mm.register_help(r"repeat", HELP, "repeat")
 
         mm.register_perm("repeat", PERM_REPEAT)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.repeat)
         mm.unhooktimer(None, self.do_repeat, None)
 
         mm.unregister_help(HELP)
@@ -73,45 +74,42 @@ class Repeat:
             action = repdef.action and "ACTION"
             server.sendmsg(repdef.target, None, repdef.phrase, notice=repdef.notice, ctcp=action)
     
-    def message(self, msg):
-        if msg.forme:
-            m = self.re1.match(msg.line)
-            if m:
-                if mm.hasperm(msg, "repeat"):
-                    repdef = RepeatDef()
-                    repdef.notice = m.group("notice") != None
-                    repdef.action = m.group("action") != None
-                    repdef.server = m.group("server") or msg.server.servername
-                    repdef.target = m.group("target") or msg.answertarget
-                    repdef.phrase = m.group("phrase")
-                    dont = m.group("dont") != None
-                    interval = m.group("interval")
-                    if interval != None:
-                        unit = m.group("intervalunit")[0]
-                        unitindex = ["s", "m", "h"].index(unit)
-                        unitfactor = [1, 60, 3600][unitindex]
-                        try:
-                            interval = int(interval)*unitfactor
-                            if interval == 0:
-                                raise ValueError
-                        except ValueError:
-                            msg.answer("%:", ["Hummm...", "Oops!", "Heh..."], ["This interval is not valid", "There's something wrong with the interval you provided"], ["!", "."])
-                            return 0
-                        if dont:
-                            mm.unhooktimer(interval, self.do_repeat, (repdef,))
-                        else:
-                            mm.hooktimer(interval, self.do_repeat, (repdef,))
-                    else:    
-                        self.do_repeat(repdef)
-                    if m.group("server") or m.group("target") or m.group("interval"):
-                        msg.answer("%:", ["Done", "No problems", "At your order"], ["!", "."])
+    def repeat(self, msg, m):
+        if mm.hasperm(msg, "repeat"):
+            repdef = RepeatDef()
+            repdef.notice = m.group("notice") != None
+            repdef.action = m.group("action") != None
+            repdef.server = m.group("server") or msg.server.servername
+            repdef.target = m.group("target") or msg.answertarget
+            repdef.phrase = m.group("phrase")
+            dont = m.group("dont") != None
+            interval = m.group("interval")
+            if interval != None:
+                unit = m.group("intervalunit")[0]
+                unitindex = ["s", "m", "h"].index(unit)
+                unitfactor = [1, 60, 3600][unitindex]
+                try:
+                    interval = int(interval)*unitfactor
+                    if interval == 0:
+                        raise ValueError
+                except ValueError:
+                    msg.answer("%:", ["Hummm...", "Oops!", "Heh..."], ["This interval is not valid", "There's something wrong with the interval you provided"], ["!", "."])
+                    return 0
+                if dont:
+                    mm.unhooktimer(interval, self.do_repeat, (repdef,))
                 else:
-                    msg.answer("%", ["Sorry, but you", "You", "No! You"],
-                                    ["can't tell me what to repeat",
-                                     "are not able to make me repeat",
-                                     "will have to repeat by yourself"],
-                                    [".", "!"])
-                return 0
+                    mm.hooktimer(interval, self.do_repeat, (repdef,))
+            else:    
+                self.do_repeat(repdef)
+            if m.group("server") or m.group("target") or m.group("interval"):
+                msg.answer("%:", ["Done", "No problems", "At your order"], ["!", "."])
+        else:
+            msg.answer("%", ["Sorry, but you", "You", "No! You"],
+                            ["can't tell me what to repeat",
+                             "are not able to make me repeat",
+                             "will have to repeat by yourself"],
+                            [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
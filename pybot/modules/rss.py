@@ -18,7 +18,8 @@
 
 from pybot.locals import *
 from pybot.util import feedparser
-from pybot.misc import striphtml
+from pybot.misc import striphtml, work
+from itertools import groupby
 import thread
 import time
 
@@ -50,11 +51,18 @@ CACHELIMIT = 50
 # Maxium news to send from a single feed per minute
 ONETIMELIMIT = 5
 
+# Maximum number of feeds being fetched at once, unless set in the
+# [workers] section of the configuration.
+MAXFETCHES = 4
+
+# Seconds to wait for a feed server before giving up.
+FETCHTIMEOUT = 60
+
 class RSS:
     def __init__(self):
         db.table("rssfeed", "id integer primary key, "
                             "url text unique on conflict ignore, "
-                            "lastfetch integer",
+                            "lastfetch integer, etag text, modified text",
                  triggers=[
                    "create trigger rssfeed1 after delete on rssfeed"
                    " begin"
@@ -77,17 +85,25 @@ class RSS:
                  ])
         db.table("rssitem", "id integer primary key, feedid integer, "
                             "timestamp integer, title text, link text, "
-                            "description text",
+                            "description text, guid text",
                  constraints="unique (feedid, title, link, description)"
-                             " on conflict ignore")
+                             " on conflict ignore, "
+                             "unique (feedid, guid) on conflict ignore")
+        db.execute("create index if not exists rssitem_feedid on rssitem "
+                   "(feedid, id)")
 
-        hooks.register("Message", self.message)
+        # Feeds with news not shown yet. Anything fetched before a
+        # restart may not have been shown, so start with every feed.
+        self.lock = thread.allocate_lock()
+        self.pending = dict([(row[0], 1) for row in
+                             db.execute("select id from rssfeed")])
 
         # (rss|news|rss news)
         mm.register_help("news|rss|rss news", HELP, ["rss", "news"])
 
         mm.register_perm("rss", PERM_RSS)
 
+        mm.workqueue("rss", MAXFETCHES)
         mm.hooktimer(60, self.update, ())
 
         # [dont] show (rss|news|rss news) [from] <url> [[in] one line] [with link[s]] [with desc[ription][s]] [with prefix "<prefix>"] [each <n>(m|h)] [[on|at|in|for] (user|channel) <target>] [[on|at|in|for] server <server>]
@@ -103,208 +119,261 @@ class RSS:
         # show rss [settings]
         self.re2 = regexp(r"show rss")
 
+        router.register(self.re1, self.show_rss, forme=1)
+        router.register(self.re2, self.show_rss_settings, forme=1)
+
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.show_rss)
+        router.unregister(self.re2, self.show_rss_settings)
         mm.unhooktimer(60, self.update, ())
         mm.unregister_help(HELP)
         mm.unregister_perm("rss")
 
     def update(self):
-        # Check if we must fetch something
-        db.execute("select * from rssfeed")        
+        # Check if we must fetch something. Every feed which is due
+        # is queued, and at most MAXFETCHES of them are fetched at once.
         now = int(time.time())
+        db.execute("select rssfeed.*, min(rsstarget.interval) as interval "
+                   "from rssfeed, rsstarget where rssfeed.id=feedid and "
+                   "lastfetch <= ? group by rssfeed.id", now-MININTERVAL)
         for feed in db:
-            lastfetch = int(feed.lastfetch)
-            if now-lastfetch >= MININTERVAL:
+            if now-int(feed.lastfetch) >= int(feed.interval):
                 # Clear old news
                 db.execute("delete from rssitem where feedid=? and "
                            "id not in (select id from rssitem "
                                        "where feedid=? "
                                        "order by id desc limit ?)",
                            feed.id, feed.id, CACHELIMIT)
-                db.execute("select min(interval) from rsstarget where "
-                           "feedid=?", feed.id)
-                row = db.fetchone()
-                if row: # Should always be true
-                    interval = int(row[0])
-                    if now-lastfetch >= interval:
-                        db.execute("update rssfeed set lastfetch=? "
-                                   "where id=?", now, feed.id)
-                        thread.start_new_thread(self.fetch_news, (feed, now))
-                        # Try not to fetch more than one at the same time
-                        break
+                # Only count it as fetched if the fetch was queued.
+                if work("rss", self.fetch_news, (feed, now)):
+                    db.execute("update rssfeed set lastfetch=? "
+                               "where id=?", now, feed.id)
         
-        # Now check if we must show something
-        db.execute("select * from rsstarget")
-        for target in db:
-            db.execute("select * from rssitem where "
-                       "id > ? and feedid=? order by id limit ?",
-                       target.lastitemid, target.feedid, ONETIMELIMIT)
-            rows = db.fetchall()
-            if rows:
-                server = servers.get(target.servername)
-                lastid = None
-                if "1" in target.flags:
-                    oneline = 1
-                    fulltext = ""
-                else:
-                    oneline = 0
-                for item in rows:
-                    text = item.title
-                    if "l" in target.flags and item.link:
-                        text += " <%s>" % item.link
-                    if "d" in target.flags and item["description"]:
-                        # item.description() is a method
-                        text += " - "+item["description"]
-                    if oneline:
-                        if fulltext:
-                            fulltext = "%s; %s" % (fulltext, text)
-                        else:
-                            fulltext = text
-                    else:
-                        server.sendmsg(target.target, None,
-                                       target.prefix, "\\"+text, notice=1)
-                    lastid = item.id
+        self.deliver()
+
+    def deliver(self):
+        """Show news fetched since the last time to their targets.
+
+        Only feeds which got new items are looked at, and all their
+        targets are handled with a single query, so that nothing is
+        done while there's no news.
+        """
+        self.lock.acquire()
+        feeds = self.pending.keys()
+        self.pending.clear()
+        self.lock.release()
+        if not feeds:
+            return
+        db.execute("select rsstarget.id as targetid, rsstarget.feedid, "
+                   "servername, target, flags, prefix, rssitem.id, title, "
+                   "link, description from rsstarget, rssitem where "
+                   "rsstarget.feedid in (%s) and "
+                   "rssitem.feedid=rsstarget.feedid and "
+                   "rssitem.id > rsstarget.lastitemid "
+                   "order by rsstarget.id, rssitem.id" %
+                   ",".join([str(int(x)) for x in feeds]))
+        lastids = []
+        for targetid, rows in groupby(db, lambda row: row.targetid):
+            rows = list(rows)
+            target = rows[0]
+            server = servers.get(target.servername)
+            if len(rows) > ONETIMELIMIT or not server:
+                # Leave the rest for the next time.
+                del rows[ONETIMELIMIT:]
+                self.lock.acquire()
+                self.pending[target.feedid] = 1
+                self.lock.release()
+                if not server:
+                    continue
+            if "1" in target.flags:
+                oneline = 1
+                fulltext = ""
+            else:
+                oneline = 0
+            for item in rows:
+                text = item.title
+                if "l" in target.flags and item.link:
+                    text += " <%s>" % item.link
+                if "d" in target.flags and item["description"]:
+                    # item.description() is a method
+                    text += " - "+item["description"]
                 if oneline:
+                    if fulltext:
+                        fulltext = "%s; %s" % (fulltext, text)
+                    else:
+                        fulltext = text
+                else:
                     server.sendmsg(target.target, None,
-                                   target.prefix, "\\"+fulltext, notice=1)
-                if lastid: # Should always be true
+                                   target.prefix, "\\"+text, notice=1)
+            if oneline:
+                server.sendmsg(target.target, None,
+                               target.prefix, "\\"+fulltext, notice=1)
+            lastids.append((rows[-1].id, targetid))
+        if lastids:
+            db.begin()
+            try:
+                for lastid, targetid in lastids:
                     db.execute("update rsstarget set lastitemid=? "
-                               "where id=?", lastid, target.id)
+                               "where id=?", lastid, targetid)
+            finally:
+                db.commit()
 
     def fetch_news(self, feed, now):
-        news = feedparser.parse(feed.url)
+        # Send back the ETag and Last-Modified headers of the last
+        # fetch, so that the server may tell the feed is unchanged.
+        modified = feed.modified and \
+                   feedparser.parse_http_date(feed.modified)
+        # Only the newest items would be kept, so stop parsing the
+        # feed once they're found.
+        news = feedparser.parse(feed.url, etag=feed.etag, modified=modified,
+                                backend="expat", maxitems=CACHELIMIT,
+                                timeout=FETCHTIMEOUT)
+        if news.get("status") == 304:
+            return
+        modified = news.get("modified")
+        if modified:
+            modified = feedparser.format_http_date(modified)
         items = news["items"]
-        if items:
-            # Reverse, since top items are usually newer
-            items.reverse()
-            localdb = db.copy() # We're in a thread
+        # Reverse, since top items are usually newer
+        items.reverse()
+        localdb = db.copy() # We're in a thread
+        localdb.begin()
+        new = 0
+        try:
             for item in items:
                 if "title" in item:
                     title = striphtml(item["title"].strip())
                     link = striphtml(item.get("link", "").strip())
                     desc = striphtml(item.get("description", "").strip())
+                    # Items are known by their guid, so that they're
+                    # not shown again when edited.
+                    guid = item.get("guid", "").strip() or link or title
                     localdb.execute("insert into rssitem values "
-                                    "(null,?,?,?,?,?)",
-                                    feed.id, now, title, link, desc)
-
-    def message(self, msg):
-        if not msg.forme:
-            return None
+                                    "(null,?,?,?,?,?,?)",
+                                    feed.id, now, title, link, desc, guid)
+                    new = new or localdb.changed
+            localdb.execute("update rssfeed set etag=?, modified=? "
+                            "where id=?", news.get("etag"), modified,
+                            feed.id)
+        finally:
+            localdb.commit()
+        if new:
+            self.lock.acquire()
+            self.pending[feed.id] = 1
+            self.lock.release()
 
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "rss"):
-                dont = refrag.dont.get(msg, m)
-                target, servername = refrag.target.get(msg, m)
-                interval = refrag.interval.get(msg, m,
-                                               default="%ds" % DEFINTERVAL)
-                if interval < MININTERVAL:
-                    msg.answer("%:", "That's below the minimum interval",
+    def show_rss(self, msg, m):
+        if mm.hasperm(msg, "rss"):
+            dont = refrag.dont.get(msg, m)
+            target, servername = refrag.target.get(msg, m)
+            interval = refrag.interval.get(msg, m,
+                                           default="%ds" % DEFINTERVAL)
+            if interval < MININTERVAL:
+                msg.answer("%:", "That's below the minimum interval",
+                                 [".", "!"])
+                return 0
+            url = m.group("url")
+            prefix = m.group("prefix") or ""
+            flags = ""
+            if m.group("links"):
+                flags += "l"
+            if m.group("descs"):
+                flags += "d"
+            if m.group("oneline"):
+                flags += "1"
+            if dont:
+                db.execute("delete from rsstarget where "
+                           "feedid=(select id from rssfeed where url=?) "
+                           "and servername=? and target=?",
+                           url, servername, target)
+                if not db.changed:
+                    msg.answer("%:", ["Not needed",
+                                      "It's not needed",
+                                      "Oops"], [".", "!"],
+                                     ["I don't know anything about this"
+                                      " news feed",
+                                      "This feed is not being shown"
+                                      " anywhere",
+                                      "I'm not showing news from that"
+                                      " feed"],
                                      [".", "!"])
-                    return 0
-                url = m.group("url")
-                prefix = m.group("prefix") or ""
-                flags = ""
-                if m.group("links"):
-                    flags += "l"
-                if m.group("descs"):
-                    flags += "d"
-                if m.group("oneline"):
-                    flags += "1"
-                if dont:
-                    db.execute("delete from rsstarget where "
-                               "feedid=(select id from rssfeed where url=?) "
-                               "and servername=? and target=?",
-                               url, servername, target)
-                    if not db.changed:
-                        msg.answer("%:", ["Not needed",
-                                          "It's not needed",
-                                          "Oops"], [".", "!"],
-                                         ["I don't know anything about this"
-                                          " news feed",
-                                          "This feed is not being shown"
-                                          " anywhere",
-                                          "I'm not showing news from that"
-                                          " feed"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
                 else:
-                    db.execute("insert into rssfeed values (null,?,0)", url)
-                    db.execute("select id from rssfeed where url=?", url)
-                    feedid = db.fetchone()[0]
-                    try:
-                        db.execute("insert into rsstarget values "
-                                   "(null,?,?,?,?,?,?,"
-                                   " ifnull((select max(id) from rssitem where"
-                                   "         feedid=?), -1)"
-                                   ")",
-                                   feedid, servername, target, flags,
-                                   prefix, interval, feedid)
-                    except db.error:
-                        db.execute("update rsstarget set "
-                                   "flags=?, prefix=?, interval=? where "
-                                   "feedid=? and servername=? and target=?",
-                                   flags, prefix, interval, feedid,
-                                   servername, target)
-                        msg.answer("%:", ["Feed updated",
-                                          "Information updated",
-                                          "Feed information updated"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
+                    msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
             else:
-                msg.answer("%:", ["You can't", "You're not allowed to",
-                                  "You're not good enough to"],
-                                 ["do this",
-                                  "change rss settings"], [".", "!"])
-            return 0
+                db.execute("insert into rssfeed (url, lastfetch) "
+                           "values (?,0)", url)
+                db.execute("select id from rssfeed where url=?", url)
+                feedid = db.fetchone()[0]
+                try:
+                    db.execute("insert into rsstarget values "
+                               "(null,?,?,?,?,?,?,"
+                               " ifnull((select max(id) from rssitem where"
+                               "         feedid=?), -1)"
+                               ")",
+                               feedid, servername, target, flags,
+                               prefix, interval, feedid)
+                except db.error:
+                    db.execute("update rsstarget set "
+                               "flags=?, prefix=?, interval=? where "
+                               "feedid=? and servername=? and target=?",
+                               flags, prefix, interval, feedid,
+                               servername, target)
+                    msg.answer("%:", ["Feed updated",
+                                      "Information updated",
+                                      "Feed information updated"],
+                                     [".", "!"])
+                else:
+                    msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
+        else:
+            msg.answer("%:", ["You can't", "You're not allowed to",
+                              "You're not good enough to"],
+                             ["do this",
+                              "change rss settings"], [".", "!"])
+        return 0
 
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "rss"):
-                db.execute("select * from rssfeed")
-                if not db.results:
-                    msg.answer("%:", ["No rss feeds are being shown",
-                                      "There are no rss feeds being shown",
-                                      "No feeds registered"],
-                                      [".", "!"])
-                    return 0
-                msg.answer("%:", "The following feeds are being shown:")
-                for feed in db:
-                    msg.answer("-", feed.url)
-                    db.execute("select * from rsstarget where feedid=?",
-                               feed.id)
-                    for target in db:
-                        oneline, links, descs, prefix = ("",)*4
-                        if "1" in target.flags:
-                            oneline = "in one line"
-                        if "l" in target.flags:
-                            links = "with links"
-                        if "d" in target.flags:
-                            descs = "with descriptions"
-                        if target.prefix:
-                            prefix = "with prefix \"%s\"" % target.prefix
-                        target.interval = int(target.interval)
-                        if target.interval % (60*60) == 0:
-                            i = target.interval/(60*60)
-                            s = (i > 0) and "s" or ""
-                            interval = "%d hour%s" % (i, s)
-                        elif target.interval % 60 == 0:
-                            interval = "%d minutes" % (target.interval/60)
-                        else:
-                            interval = "%d seconds" % target.interval
-                        msg.answer("  for", target.target, "on",
-                                   target.servername,
-                                   oneline, links, descs, prefix,
-                                   "each", interval)
-            else:
-                msg.answer("%:", ["You can't", "You're not allowed to",
-                                  "You're not good enough to"],
-                                 ["do this",
-                                  "change rss settings"], ["!", "."])
-            return 0
+    def show_rss_settings(self, msg, m):
+        if mm.hasperm(msg, "rss"):
+            db.execute("select * from rssfeed")
+            if not db.results:
+                msg.answer("%:", ["No rss feeds are being shown",
+                                  "There are no rss feeds being shown",
+                                  "No feeds registered"],
+                                  [".", "!"])
+                return 0
+            msg.answer("%:", "The following feeds are being shown:")
+            for feed in db:
+                msg.answer("-", feed.url)
+                db.execute("select * from rsstarget where feedid=?",
+                           feed.id)
+                for target in db:
+                    oneline, links, descs, prefix = ("",)*4
+                    if "1" in target.flags:
+                        oneline = "in one line"
+                    if "l" in target.flags:
+                        links = "with links"
+                    if "d" in target.flags:
+                        descs = "with descriptions"
+                    if target.prefix:
+                        prefix = "with prefix \"%s\"" % target.prefix
+                    target.interval = int(target.interval)
+                    if target.interval % (60*60) == 0:
+                        i = target.interval/(60*60)
+                        s = (i > 0) and "s" or ""
+                        interval = "%d hour%s" % (i, s)
+                    elif target.interval % 60 == 0:
+                        interval = "%d minutes" % (target.interval/60)
+                    else:
+                        interval = "%d seconds" % target.interval
+                    msg.answer("  for", target.target, "on",
+                               target.servername,
+                               oneline, links, descs, prefix,
+                               "each", interval)
+        else:
+            msg.answer("%:", ["You can't", "You're not allowed to",
+                              "You're not good enough to"],
+                             ["do this",
+                              "change rss settings"], ["!", "."])
+        return 0
 
 def __loadmodule__():
     global mod
@@ -55,6 +55,10 @@ If you want to know in which servers I'm connected to, send me "show
 servers" (the "showservers" permission is needed), while if you want to
 know which channels I'm currently in, send me "show channels [[at|on]
 [server] <server>]" (the "showchannels" permission is necessary).
+""","""
+To check how many lines are waiting to be sent to each server, and
+for how long they usually wait, send me "show queues" (the
+"showservers" permission is needed).
 """
 
 PERM_SHOWSERVERS = """
@@ -80,7 +84,6 @@ class ServerControl:
         hooks.register("ConnectionError", self.connectionerror) 
         hooks.register("Registered", self.registered)
         hooks.register("Command", self.command)
-        hooks.register("Message", self.message)
         db.table("server", "servername text, nick text, username text, "
                            "mode text, realname text")
         db.table("host",  "servername text, host text")
@@ -119,6 +122,20 @@ class ServerControl:
         # show connection messages
         self.re9 = regexp(r"show connection messages?")
 
+        # show [send] queue[s]
+        self.re10 = regexp(r"show (?:send )?queues?")
+
+        router.register(self.re1, self.connect, forme=1)
+        router.register(self.re2, self.reconnect, forme=1)
+        router.register(self.re3, self.join, forme=1)
+        router.register(self.re4, self.leave, forme=1)
+        router.register(self.re5, self.show_servers, forme=1)
+        router.register(self.re6, self.show_channels, forme=1)
+        router.register(self.re7, self.quit, forme=1)
+        router.register(self.re8, self.connection_message, forme=1)
+        router.register(self.re9, self.show_connection_messages, forme=1)
+        router.register(self.re10, self.show_queues, forme=1)
+
         # [dis|re]connect
         mm.register_help(r"(?:dis|re)?connect", HELP_CONNECT,
                          ["connect", "disconnect", "reconnect"])
@@ -128,8 +145,8 @@ class ServerControl:
                          ["join", "leave"])
 
         # show[ ](channels|servers)
-        mm.register_help(r"show *(?:channels|servers)", HELP_SHOW,
-                         ["show channels", "show servers"])
+        mm.register_help(r"show *(?:channels|servers|queues)", HELP_SHOW,
+                         ["show channels", "show servers", "show queues"])
 
         # connection message[s]
         mm.register_help(r"connection messages?", HELP_CONNECTION_MESSAGES,
@@ -148,7 +165,16 @@ class ServerControl:
         hooks.unregister("ConnectionError", self.connectionerror) 
         hooks.unregister("Registered", self.registered)
         hooks.unregister("Command", self.command)
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.connect)
+        router.unregister(self.re2, self.reconnect)
+        router.unregister(self.re3, self.join)
+        router.unregister(self.re4, self.leave)
+        router.unregister(self.re5, self.show_servers)
+        router.unregister(self.re6, self.show_channels)
+        router.unregister(self.re7, self.quit)
+        router.unregister(self.re8, self.connection_message)
+        router.unregister(self.re9, self.show_connection_messages)
+        router.unregister(self.re10, self.show_queues)
 
         mm.unregister_help(HELP_CONNECT)
         mm.unregister_help(HELP_JOIN)
@@ -238,324 +264,338 @@ class ServerControl:
                 reason = None
             hooks.call("UserQuitted", cmd.server, user, reason)
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                host = m.group("server")
-                servername = m.group("servername") or host
-                nick = m.group("nick") or self.default_nick
-                db.execute("select null from server where servername=?",
-                           servername)
-                if db.results:
+    def connect(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            host = m.group("server")
+            servername = m.group("servername") or host
+            nick = m.group("nick") or self.default_nick
+            db.execute("select null from server where servername=?",
+                       servername)
+            if db.results:
+                msg.answer("%:", ["Sorry,", "Oops!", "But,", None],
+                           "I'm already connected to this server",
+                           [".", "!"])
+            else:
+                msg.answer("%:", ["Connecting", "I'm going there", "At your order", "No problems", "Right now", "Ok"], [".", "!"])
+                db.execute("insert into server values (?,?,?,?,?)",
+                           servername, nick, "pybot", "0", "PyBot")
+                db.execute("insert into host values (?,?)",
+                           servername, host)
+                servers.add(host, servername)
+        else:
+            msg.answer("%:", [("You're not", ["allowed to connect",
+                                              "that good",
+                                              "allowed to do this"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def reconnect(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            servername = m.group("server")
+            reason = m.group("reason")
+            if servername:
+                server = servers.get(servername)
+                if not server:
                     msg.answer("%:", ["Sorry,", "Oops!", "But,", None],
-                               "I'm already connected to this server",
-                               [".", "!"])
-                else:
-                    msg.answer("%:", ["Connecting", "I'm going there", "At your order", "No problems", "Right now", "Ok"], [".", "!"])
-                    db.execute("insert into server values (?,?,?,?,?)",
-                               servername, nick, "pybot", "0", "PyBot")
-                    db.execute("insert into host values (?,?)",
-                               servername, host)
-                    servers.add(host, servername)
+                                      "I'm not connected to this server",
+                                      [".", "!"])
+                    return 0
             else:
-                msg.answer("%:", [("You're not", ["allowed to connect",
-                                                  "that good",
-                                                  "allowed to do this"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                servername = m.group("server")
-                reason = m.group("reason")
-                if servername:
-                    server = servers.get(servername)
-                    if not server:
-                        msg.answer("%:", ["Sorry,", "Oops!", "But,", None],
-                                          "I'm not connected to this server",
-                                          [".", "!"])
-                        return 0
+                server = msg.server
+            if m.group("cmd") == "reconnect":
+                msg.answer("%:", ["Reconnecting", "At your order",
+                                  "No problems", "Right now", "Ok"],
+                                 [".", "!"])
+                if reason:
+                    server.sendcmd("", "QUIT", ":"+reason)
                 else:
-                    server = msg.server
-                if m.group("cmd") == "reconnect":
-                    msg.answer("%:", ["Reconnecting", "At your order",
-                                      "No problems", "Right now", "Ok"],
-                                     [".", "!"])
-                    if reason:
-                        server.sendcmd("", "QUIT", ":"+reason)
-                    else:
-                        server.sendcmd("", "QUIT")
-                    server.reconnect()
-                else:
-                    msg.answer("%:", ["Disconnecting", "At your order",
-                                      "No problems", "Right now", "Ok"],
-                                     [".", "!"])
-                    db.execute("delete from server where servername=?",
-                               server.servername, dontcommit=1)
-                    db.execute("delete from channel where servername=?",
-                               server.servername, dontcommit=1)
-                    db.execute("delete from host where servername=?",
-                               server.servername, dontcommit=1)
-                    db.execute("delete from connectmsg where servername=?",
-                               server.servername, dontcommit=1)
-                    db.commit()
                     server.sendcmd("", "QUIT")
-                    server.kill()
+                server.reconnect()
             else:
-                msg.answer("%:", [("You're not",
-                                   ["allowed to work with servers",
-                                    "that good",
-                                    "allowed to do this"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                channel = m.group("channel")
-                keyword = m.group("keyword")
-                servername = m.group("server")
-                if servername:
-                    server = servers.get(servername)
-                    if not server:
-                        msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
-                                         "I'm not in this server", [".", "!"])
-                        return 0
-                else:
-                    server = msg.server
-                db.execute("select null from channel where "
-                           "servername=? and channel=?",
-                           server.servername, channel)
-                if db.results:
-                    msg.answer("%:", ["Sorry,", "Oops!",
-                                      "It's not necessary.", None],
-                                     "I'm already there", [".", "!"])
-                else:
-                    msg.answer("%:", ["I'm going there", "At your order",
-                                      "No problems", "Right now", "Ok",
-                                      "Joining"], [".", "!"])
-                    if self.registered_server.get(server):
-                        self.send_join(server, channel, keyword)
-                    db.execute("insert into channel values (?,?,?)",
-                               server.servername, channel, keyword)
+                msg.answer("%:", ["Disconnecting", "At your order",
+                                  "No problems", "Right now", "Ok"],
+                                 [".", "!"])
+                db.begin()
+                db.execute("delete from server where servername=?",
+                           server.servername)
+                db.execute("delete from channel where servername=?",
+                           server.servername)
+                db.execute("delete from host where servername=?",
+                           server.servername)
+                db.execute("delete from connectmsg where servername=?",
+                           server.servername)
+                db.commit()
+                server.sendcmd("", "QUIT")
+                server.kill()
+        else:
+            msg.answer("%:", [("You're not",
+                               ["allowed to work with servers",
+                                "that good",
+                                "allowed to do this"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def join(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            channel = m.group("channel")
+            keyword = m.group("keyword")
+            servername = m.group("server")
+            if servername:
+                server = servers.get(servername)
+                if not server:
+                    msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
+                                     "I'm not in this server", [".", "!"])
+                    return 0
             else:
-                msg.answer("%:", [("You're not", ["allowed to join",
-                                                  "that good",
-                                                  "allowed to do this"]),
-                                                 "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re4.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                channel = m.group("channel")
-                reason = m.group("reason")
-                servername = m.group("server")
-                if not channel and msg.direct:
-                    msg.answer("%:", ["You can't part from here.",
-                                      "You can't leave from myself.",
-                                      "Leave what!?"])
+                server = msg.server
+            db.execute("select null from channel where "
+                       "servername=? and channel=?",
+                       server.servername, channel)
+            if db.results:
+                msg.answer("%:", ["Sorry,", "Oops!",
+                                  "It's not necessary.", None],
+                                 "I'm already there", [".", "!"])
+            else:
+                msg.answer("%:", ["I'm going there", "At your order",
+                                  "No problems", "Right now", "Ok",
+                                  "Joining"], [".", "!"])
+                if self.registered_server.get(server):
+                    self.send_join(server, channel, keyword)
+                db.execute("insert into channel values (?,?,?)",
+                           server.servername, channel, keyword)
+        else:
+            msg.answer("%:", [("You're not", ["allowed to join",
+                                              "that good",
+                                              "allowed to do this"]),
+                                             "No", "Nope"], [".", "!"])
+        return 0
+
+    def leave(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            channel = m.group("channel")
+            reason = m.group("reason")
+            servername = m.group("server")
+            if not channel and msg.direct:
+                msg.answer("%:", ["You can't part from here.",
+                                  "You can't leave from myself.",
+                                  "Leave what!?"])
+                return 0
+            if servername:
+                server = servers.get(servername)
+                if not server:
+                    msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
+                                     "I'm not in this server", [".", "!"])
                     return 0
-                if servername:
-                    server = servers.get(servername)
-                    if not server:
-                        msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
-                                         "I'm not in this server", [".", "!"])
-                        return 0
-                else:
-                    server = msg.server
-                db.execute("select null from channel where "
+            else:
+                server = msg.server
+            db.execute("select null from channel where "
+                       "servername=? and channel=?",
+                       server.servername, channel)
+            if not db.results:
+                msg.answer("%:", ["Sorry,", "Oops!",
+                                  "It's not necessary.", None],
+                                 "I'm not there", [".", "!"])
+            else:
+                msg.answer("%:", ["Ok,", "No problems.", None],
+                                 "I'm", ["leaving", "parting"],
+                                 [".", "!"])
+                if self.registered_server.get(server):
+                    if reason:
+                        server.sendcmd("", "PART", channel, ":"+reason,
+                                       priority=10)
+                    else:
+                        server.sendcmd("", "PART", channel, priority=10)
+                db.execute("delete from channel where "
                            "servername=? and channel=?",
                            server.servername, channel)
+        else:
+            msg.answer("%:", [("You're not", ["allowed to leave",
+                                              "that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def show_servers(self, msg, m):
+        if mm.hasperm(msg, "showservers"):
+            d = {}
+            for row in db.execute("select * from host"):
+                d.setdefault(row.servername, []).append(row.host)
+            l = []
+            if d:
+                for servername, hosts in d.items():
+                    if len(hosts) == 1 and servername == hosts[0]:
+                        l.append(servername)
+                    elif len(hosts) == 1:
+                        l.append("%s (host: %s)" % (servername, hosts[0]))
+                    else:
+                        l.append("%s (hosts: %s)" %
+                                 (servername, ", ".join(hosts)))
+                msg.answer("%:", "I'm connected to the following "
+                                 "servers:", ", ".join(l))
+            else:
+                msg.answer("%:", "I'm not connected to any servers",
+                                 [".", "!"])
+        else:
+            msg.answer("%:", [("You're not", ["allowed to show channels",
+                                              "that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0 
+
+    def show_channels(self, msg, m):
+        if mm.hasperm(msg, "showchannels"):
+            servername = m.group("server")
+            if servername:
+                db.execute("select null from server "
+                           "where servername=?", servername)
                 if not db.results:
-                    msg.answer("%:", ["Sorry,", "Oops!",
-                                      "It's not necessary.", None],
-                                     "I'm not there", [".", "!"])
-                else:
-                    msg.answer("%:", ["Ok,", "No problems.", None],
-                                     "I'm", ["leaving", "parting"],
+                    msg.answer("%:", ["You're not connected to that "
+                                      "server",
+                                      "You're not connected to "
+                                      "server %s" % servername],
                                      [".", "!"])
-                    if self.registered_server.get(server):
-                        if reason:
-                            server.sendcmd("", "PART", channel, ":"+reason,
-                                           priority=10)
-                        else:
-                            server.sendcmd("", "PART", channel, priority=10)
-                    db.execute("delete from channel where "
-                               "servername=? and channel=?",
-                               server.servername, channel)
+                    return 0
+                servernames = [servername]
             else:
-                msg.answer("%:", [("You're not", ["allowed to leave",
-                                                  "that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re5.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "showservers"):
-                d = {}
-                for row in db.execute("select * from host"):
-                    d.setdefault(row.servername, []).append(row.host)
-                l = []
-                if d:
-                    for servername, hosts in d.items():
-                        if len(hosts) == 1 and servername == hosts[0]:
-                            l.append(servername)
-                        elif len(hosts) == 1:
-                            l.append("%s (host: %s)" % (servername, hosts[0]))
-                        else:
-                            l.append("%s (hosts: %s)" %
-                                     (servername, ", ".join(hosts)))
-                    msg.answer("%:", "I'm connected to the following "
-                                     "servers:", ", ".join(l))
+                servernames = [row[0] for row in
+                               db.execute("select servername from server")]
+            for servername in servernames:
+                channels = [row[0] for row in
+                            db.execute("select channel from channel where "
+                                       "servername=?", servername)]
+                if channels:
+                    msg.answer("%:", "In server %s, I'm in the "
+                                     "following channels:" % servername,
+                                     ", ".join(channels))
                 else:
-                    msg.answer("%:", "I'm not connected to any servers",
-                                     [".", "!"])
+                    msg.answer("%:", "In server %s, I'm not "
+                                     "connected to any channel."
+                                     % servername)
+            if not servernames:
+                msg.answer("%:", "You're not connected to any servers",
+                                 [".", "!"])
+        else:
+            msg.answer("%:", [("You're not", ["allowed to show servers",
+                                              "that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def quit(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            cmd = m.group("cmd")
+            reason = m.group("reason")
+            if cmd == "quit":
+                msg.answer("%:", ["I'm leaving", "I'm going home",
+                                  "I'll do this", "Right now", "Ok",
+                                  "See you"], [".", "!"])
             else:
-                msg.answer("%:", [("You're not", ["allowed to show channels",
-                                                  "that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0 
-
-        m = self.re6.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "showchannels"):
-                servername = m.group("server")
-                if servername:
-                    db.execute("select null from server "
-                               "where servername=?", servername)
-                    if not db.results:
-                        msg.answer("%:", ["You're not connected to that "
-                                          "server",
-                                          "You're not connected to "
-                                          "server %s" % servername],
-                                         [".", "!"])
-                        return 0
-                    servernames = [servername]
+                msg.answer("%:", ["Rebooting", "No problems",
+                                  "I'll do this", "Right now", "Ok",
+                                  "I'll be back in a moment"],
+                                 [".", "!"])
+            for server in servers.getall():
+                if reason:
+                    server.sendcmd("", "QUIT", ":"+reason,
+                                   priority=10)
                 else:
-                    servernames = [row[0] for row in
-                                   db.execute("select servername from server")]
-                for servername in servernames:
-                    channels = [row[0] for row in
-                                db.execute("select channel from channel where "
-                                           "servername=?", servername)]
-                    if channels:
-                        msg.answer("%:", "In server %s, I'm in the "
-                                         "following channels:" % servername,
-                                         ", ".join(channels))
-                    else:
-                        msg.answer("%:", "In server %s, I'm not "
-                                         "connected to any channel."
-                                         % servername)
-                if not servernames:
-                    msg.answer("%:", "You're not connected to any servers",
-                                     [".", "!"])
+                    server.sendcmd("", "QUIT", priority=10)
+            if cmd == "quit":
+                main.quit = 1
             else:
-                msg.answer("%:", [("You're not", ["allowed to show servers",
-                                                  "that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re7.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                cmd = m.group("cmd")
-                reason = m.group("reason")
-                if cmd == "quit":
-                    msg.answer("%:", ["I'm leaving", "I'm going home",
-                                      "I'll do this", "Right now", "Ok",
-                                      "See you"], [".", "!"])
-                else:
-                    msg.answer("%:", ["Rebooting", "No problems",
-                                      "I'll do this", "Right now", "Ok",
-                                      "I'll be back in a moment"],
-                                     [".", "!"])
-                for server in servers.getall():
-                    if reason:
-                        server.sendcmd("", "QUIT", ":"+reason,
-                                       priority=10)
-                    else:
-                        server.sendcmd("", "QUIT", priority=10)
-                if cmd == "quit":
-                    main.quit = 1
-                else:
-                    main.reboot = 1
+                main.reboot = 1
+        else:
+            msg.answer("%:", [("You're not", ["that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def connection_message(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            target = m.group("target")
+            servername = m.group("server")
+            _msg = m.group("msg")
+            if servername:
+                server = servers.get(servername)
+                if not servers.get(servername):
+                    msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
+                                     "I'm not in this server", [".", "!"])
+                    return 0
             else:
-                msg.answer("%:", [("You're not", ["that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re8.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                target = m.group("target")
-                servername = m.group("server")
-                _msg = m.group("msg")
-                if servername:
-                    server = servers.get(servername)
-                    if not servers.get(servername):
-                        msg.answer("%:", ["Sorry,", "Oops!", "Hummm..."],
-                                         "I'm not in this server", [".", "!"])
-                        return 0
-                else:
-                    servername = msg.server.servername
-                if m.group("remove"):
-                    db.execute("delete from connectmsg where "
-                               "servername=%s and target=? and msg=?",
-                               servername, target, _msg)
-                    if db.changed:
-                        msg.answer("%:", ["Ok", "Done", "Sure", "No problems"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["Message not found",
-                                          "Couldn't find that message",
-                                          "I wasn't able to find that message"],
-                                         [".", "!"])
-                else:
-                    db.execute("insert into connectmsg values (?,?,?)",
-                               servername, target, _msg)
+                servername = msg.server.servername
+            if m.group("remove"):
+                db.execute("delete from connectmsg where "
+                           "servername=%s and target=? and msg=?",
+                           servername, target, _msg)
+                if db.changed:
                     msg.answer("%:", ["Ok", "Done", "Sure", "No problems"],
                                      [".", "!"])
-            else:
-                msg.answer("%:", [("You're not", ["that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
-
-        m = self.re9.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                db.execute("select * from connectmsg")
-                if db.results:
-                    msg.answer("%:",
-                               "The following messages are being sent after "
-                               "connection:")
-                    for row in db:
-                        msg.answer("- \"%s\" to %s on server %s" %
-                                   (row.msg, row.target, row.servername))
                 else:
-                    msg.answer("%:", "No messages are being sent after "
-                                     "connection.")
+                    msg.answer("%:", ["Message not found",
+                                      "Couldn't find that message",
+                                      "I wasn't able to find that message"],
+                                     [".", "!"])
+            else:
+                db.execute("insert into connectmsg values (?,?,?)",
+                           servername, target, _msg)
+                msg.answer("%:", ["Ok", "Done", "Sure", "No problems"],
+                                 [".", "!"])
+        else:
+            msg.answer("%:", [("You're not", ["that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def show_connection_messages(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            db.execute("select * from connectmsg")
+            if db.results:
+                msg.answer("%:",
+                           "The following messages are being sent after "
+                           "connection:")
+                for row in db:
+                    msg.answer("- \"%s\" to %s on server %s" %
+                               (row.msg, row.target, row.servername))
             else:
-                msg.answer("%:", [("You're not", ["that good",
-                                                  "allowed to do this",
-                                                  "my lord"]),
-                                  "No", "Nope"], [".", "!"])
-            return 0
+                msg.answer("%:", "No messages are being sent after "
+                                 "connection.")
+        else:
+            msg.answer("%:", [("You're not", ["that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
+
+    def show_queues(self, msg, m):
+        if mm.hasperm(msg, "showservers"):
+            l = []
+            for server in servers.getall():
+                stats = server.queuestats()
+                if stats:
+                    l.append("%s: %d lines queued (max %d), %d sent, "
+                             "%.1fs average wait (max %.1fs)" %
+                             (server.servername, stats["depth"],
+                              stats["maxdepth"], stats["sent"],
+                              stats["avgwait"], stats["maxwait"]))
+            if l:
+                msg.answer("%:", "These are my send queues:")
+                for line in l:
+                    msg.answer(line)
+            else:
+                msg.answer("%:", "I'm not connected to any servers",
+                                 [".", "!"])
+        else:
+            msg.answer("%:", [("You're not", ["allowed to show queues",
+                                              "that good",
+                                              "allowed to do this",
+                                              "my lord"]),
+                              "No", "Nope"], [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
@@ -40,11 +40,12 @@ class Testadora:
     def __init__(self):
         self.mondir = config.get("testadora", "mondir")
         
-        hooks.register("Message", self.message)
         
         # [show] (compiletime|compile time) [for] <package>
         self.re1 = regexp(r"(?:show )?compile *time (?:for )?(?P<package>\S+)")
 
+        router.register(self.re1, self.compiletime, forme=1)
+
         # testadora
         mm.register_help("testadora", HELP_TESTADORA, "testadora")
 
@@ -54,7 +55,7 @@ class Testadora:
         mm.register_perm("compiletime", PERM_COMPILETIME)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.compiletime)
         mm.unregister_help(HELP_TESTADORA)
         mm.unregister_help(HELP_COMPILETIME)
         mm.unregister_perm(PERM_COMPILETIME)
@@ -90,33 +91,28 @@ class Testadora:
                 str += "%d %s%s" % (value, field[n], s)
         return str
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "compiletime"):
-                try:
-                    seconds = self.get_compiletime(m.group("package"))
-                except IOError:
-                    msg.answer("%", "Couldn't open data file.")
-                if not seconds:
-                    msg.answer("%", "No time information for that package.")
-                else:
-                    str = self.delta_string(seconds)
-                    msg.answer("%", ["The %s package compiles in" %
-                                     m.group("package"),
-                                     "This package compiles in",
-                                     "The compile time for that package is"],
-                                    str, [".", "!"])
+    def compiletime(self, msg, m):
+        if mm.hasperm(msg, "compiletime"):
+            try:
+                seconds = self.get_compiletime(m.group("package"))
+            except IOError:
+                msg.answer("%", "Couldn't open data file.")
+            if not seconds:
+                msg.answer("%", "No time information for that package.")
             else:
-                msg.answer("%", ["Sorry, but you", "No! You"],
-                                ["can't verify compile times",
-                                 "are not able to check compile times",
-                                 "will have to check this by yourself"],
-                                 [".", "!"])
-            return 0
+                str = self.delta_string(seconds)
+                msg.answer("%", ["The %s package compiles in" %
+                                 m.group("package"),
+                                 "This package compiles in",
+                                 "The compile time for that package is"],
+                                str, [".", "!"])
+        else:
+            msg.answer("%", ["Sorry, but you", "No! You"],
+                            ["can't verify compile times",
+                             "are not able to check compile times",
+                             "will have to check this by yourself"],
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
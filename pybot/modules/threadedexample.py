@@ -33,7 +33,6 @@ module. For more information check "help threadedexample".
 class ThreadedExample:
     def __init__(self):
         hooks.register("Message", self.threadedmessage, threaded=1)
-        hooks.register("Message", self.message)
     
         # test threaded message
         self.re1 = regexp(r"test threaded message")
@@ -41,13 +40,15 @@ class ThreadedExample:
         # (start|stop) threaded timer
         self.re2 = regexp(r"(?P<cmd>start|stop) threaded timer")
 
+        router.register(self.re2, self.threaded_timer, forme=1)
+
         mm.register_help(r"threadedexample", HELP, "threadedexample")
 
         mm.register_perm("threadedexample", PERM_THREADEDEXAMPLE)
     
     def unload(self):
         hooks.unregister("Message", self.threadedmessage, threaded=1)
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re2, self.threaded_timer)
         mm.unhooktimer(None, self.threadedtimer, None);
 
         mm.unregister_help(HELP)
@@ -66,19 +67,14 @@ class ThreadedExample:
             # If the user has no permission don't even bother.
             # return 0
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "threadedexample"):
-                if m.group("cmd") == "start":
-                    mm.hooktimer(15, self.threadedtimer, (msg,), threaded=1)
-                else:
-                    mm.unhooktimer(15, self.threadedtimer, None, threaded=1)
-                msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
-                return 0
+    def threaded_timer(self, msg, m):
+        if mm.hasperm(msg, "threadedexample"):
+            if m.group("cmd") == "start":
+                mm.hooktimer(15, self.threadedtimer, (msg,), threaded=1)
+            else:
+                mm.unhooktimer(15, self.threadedtimer, None, threaded=1)
+            msg.answer("%:", ["Done", "Ok", "Sure"], [".", "!"])
+            return 0
 
     def threadedtimer(self, msg):
         msg.answer("%:", "Timer thread started!")
@@ -18,50 +18,116 @@
 
 from pybot.locals import *
 from time import time
-from thread import start_new_thread
+from pybot.misc import work
+import heapq
+
+# Positions in timer entries, which are also the handles returned by
+# hooktimer(). Entries sort by deadline, and then by creation order.
+DEADLINE, SEQ, INTERVAL, FUNC, PARAMS, THREADED, ALIVE = range(7)
 
 class Timer:
+    """Run functions at regular intervals.
+
+    Timers are kept in a heap ordered by their deadlines, so that
+    each loop only looks at the timers which expired, and nexttimer()
+    tells the main loop for how long it may sleep. Cancelled timers
+    are only marked as such, and dropped once they reach the top of
+    the heap, or when they're most of it.
+    """
     def __init__(self):
-        self.timer = options.get("Timer.data", [])
+        self.heap = options.get("Timer.heap", [])
+        self.seq = len(self.heap) and max([x[SEQ] for x in self.heap])+1
+        self.funcs = {}
+        self.cancelled = 0
+        for entry in self.heap:
+            if entry[ALIVE]:
+                self.funcs.setdefault(entry[FUNC], {})[entry[SEQ]] = entry
+            else:
+                self.cancelled += 1
         mm.register("hooktimer", self.mm_hooktimer)
         mm.register("unhooktimer", self.mm_unhooktimer)
+        mm.register("canceltimer", self.mm_canceltimer)
+        mm.register("nexttimer", self.mm_nexttimer)
         hooks.register("Loop", self.loop)
     
     def unload(self):
         mm.unregister("hooktimer")
         mm.unregister("unhooktimer")
+        mm.unregister("canceltimer")
+        mm.unregister("nexttimer")
         hooks.unregister("Loop", self.loop)
     
     def loop(self):
-        for list in self.timer:
-            curtime = int(time())
-            if list[0] <= curtime:
-                list[0] = curtime+list[1]
-                if list[4]:
-                    start_new_thread(list[2], list[3])
-                else:
-                    apply(list[2], list[3])
+        heap = self.heap
+        curtime = time()
+        expired = []
+        while heap and heap[0][DEADLINE] <= curtime:
+            entry = heapq.heappop(heap)
+            if entry[ALIVE]:
+                expired.append(entry)
+            else:
+                self.cancelled -= 1
+        # Reschedule before calling anything, so that the functions
+        # may cancel their own timers, or the ones after them.
+        for entry in expired:
+            entry[DEADLINE] = curtime+entry[INTERVAL]
+            heapq.heappush(heap, entry)
+        for entry in expired:
+            if not entry[ALIVE]:
+                pass
+            elif entry[THREADED]:
+                work("timer", entry[FUNC], entry[PARAMS])
+            else:
+                apply(entry[FUNC], entry[PARAMS])
 
     def mm_hooktimer(self, sec, func, params, threaded=0):
-        self.timer.append([int(time())+sec, sec, func, params, threaded])
+        """Call func(*params) every sec seconds, and return a handle
+        which may be given to canceltimer()."""
+        entry = [time()+sec, self.seq, sec, func, params, threaded, 1]
+        self.seq += 1
+        heapq.heappush(self.heap, entry)
+        self.funcs.setdefault(func, {})[entry[SEQ]] = entry
+        reactor.wakeup()
+        return entry
+
+    def mm_canceltimer(self, entry):
+        """Cancel the timer with the given handle."""
+        if not entry[ALIVE]:
+            return 0
+        entry[ALIVE] = 0
+        entries = self.funcs[entry[FUNC]]
+        del entries[entry[SEQ]]
+        if not entries:
+            del self.funcs[entry[FUNC]]
+        self.cancelled += 1
+        if self.cancelled > len(self.heap)//2:
+            self.heap[:] = [x for x in self.heap if x[ALIVE]]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+        return 1
 
     def mm_unhooktimer(self, sec, func, params, threaded=None):
-        ret = 0
-        i = 0
-        l = len(self.timer)
-        r = []
-        while i < l:
-            list = self.timer[i]
-            if (sec is None or list[1] == sec) and \
-               (func is None or list[2] == func) and \
-               (params is None or list[3] == params) and \
-               (threaded is None or list[4] == threaded):
-                r.append(i)
-                ret = 1
-            i = i + 1
-        for i in r:
-            del self.timer[i]
-        return ret
+        if func is None:
+            entries = [x for x in self.heap if x[ALIVE]]
+        else:
+            entries = self.funcs.get(func, {}).values()
+        found = [x for x in entries
+                 if (sec is None or x[INTERVAL] == sec) and
+                    (params is None or x[PARAMS] == params) and
+                    (threaded is None or x[THREADED] == threaded)]
+        for entry in found:
+            self.mm_canceltimer(entry)
+        return len(found) > 0
+
+    def mm_nexttimer(self):
+        """Return when the next timer expires, or None if there are none."""
+        heap = self.heap
+        while heap and not heap[0][ALIVE]:
+            heapq.heappop(heap)
+            self.cancelled -= 1
+        if heap:
+            return heap[0][DEADLINE]
+        return None
 
 # Load first to let hooktimer() available to other modules.
 __loadlevel__ = 90
@@ -29,7 +29,6 @@ for that.
 class Uptime:
     def __init__(self):
         self.uptime = options.get("Uptime.uptime", int(time.time()))
-        hooks.register("Message", self.message)
 
         # [show|display] uptime
         self.re1 = regexp(r"(?:(?:show|display) )?uptime")
@@ -37,11 +36,15 @@ class Uptime:
         # reset uptime
         self.re2 = regexp(r"reset uptime")
 
+        router.register(self.re1, self.show_uptime, forme=1)
+        router.register(self.re2, self.reset_uptime, forme=1)
+
         # uptime
         mm.register_help("uptime", HELP, "uptime")
     
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.show_uptime)
+        router.unregister(self.re2, self.reset_uptime)
         mm.unregister_help(HELP)
     
     def days_in_last_month(self, tuple):
@@ -87,23 +90,21 @@ class Uptime:
             n = n-1
         return str
         
-    def message(self, msg):
-        var = []
-        if msg.forme:
-            if self.re1.match(msg.line):
-                uptimestr = self.uptime_string()
-                msg.answer("%:", "I'm up for", uptimestr, ".")
-                return 0
-            elif self.re2.match(msg.line):
-                if mm.hasperm(msg, "admin"):
-                    self.uptime = int(time.time())
-                    options.set("Uptime.uptime", self.uptime)
-                    msg.answer("%:", ["No problems", "Sure", "Done", "Ok"],
-                                     [".", "!"])
-                else:
-                    msg.answer("%:", ["Heh!", "Sorry!"], "You can't do this",
-                                     [".", "!"])
-                return 0
+    def show_uptime(self, msg, m):
+        uptimestr = self.uptime_string()
+        msg.answer("%:", "I'm up for", uptimestr, ".")
+        return 0
+
+    def reset_uptime(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            self.uptime = int(time.time())
+            options.set("Uptime.uptime", self.uptime)
+            msg.answer("%:", ["No problems", "Sure", "Done", "Ok"],
+                             [".", "!"])
+        else:
+            msg.answer("%:", ["Heh!", "Sorry!"], "You can't do this",
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
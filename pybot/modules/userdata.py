@@ -61,6 +61,10 @@ The "userdata" permission allows users to register and set personal
 information. Check "help register" and "help set" for more information.
 """
 
+# Expired logins are removed at least this often (in seconds), so
+# that modules watching LoggedOut notice them soon.
+LOGIN_CLEANUP = 60
+
 class UserData:
     def __init__(self):
         # Use a lower priority, since we use some
@@ -128,23 +132,31 @@ class UserData:
                        servername, userstr)
             db.execute("insert into login values (?,?,?,?)",
                        servername, userstr, curtime, nick)
+            hooks.call("LoggedIn", servername, userstr, nick)
 
     def logout(self, servername, userstr):
         db.execute("delete from login where servername=? and userstr=?",
                    servername, userstr)
+        hooks.call("LoggedOut", servername, userstr)
 
     def login_update(self, msg):
         curtime = int(time.time())
         db.execute("update login set lasttime=? where "
                    "servername=? and userstr=?",
                    curtime, msg.server.servername, msg.user.string)
-        if self.last_cleanup < curtime-self.login_timeout:
+        if self.last_cleanup < curtime-min(self.login_timeout,
+                                           LOGIN_CLEANUP):
             self.last_cleanup = curtime
             self.login_cleanup()
 
     def login_cleanup(self):
-        db.execute("delete from login where lasttime < ?",
-                   int(time.time())-self.login_timeout)
+        lasttime = int(time.time())-self.login_timeout
+        expired = [(row.servername, row.userstr) for row in
+                   db.execute("select * from login where lasttime < ?",
+                              lasttime)]
+        db.execute("delete from login where lasttime < ?", lasttime)
+        for servername, userstr in expired:
+            hooks.call("LoggedOut", servername, userstr)
     
     def message(self, msg):
         self.login_update(msg)
@@ -305,6 +317,9 @@ class UserData:
                 self.mm_unsetuserdata(servername, nick, type)
             db.execute("insert into userdata values (?,?,?,?)",
                        servername, nick, type, value)
+            if type == "identity":
+                # Users matching the new identity may now be logged in.
+                hooks.call("LoggedIn", servername, None, nick)
 
     def mm_unsetuserdata(self, servername, nick,
                          type=None, value=None, append=0):
@@ -319,6 +334,7 @@ class UserData:
         else:
             db.execute("delete from login where servername=? and nick=?",
                        servername, nick)
+            hooks.call("LoggedOut", servername, None)
         wstr = " and ".join(where)
         db.execute("delete from userdata where "+wstr, *wargs)
 
@@ -34,55 +34,51 @@ on serveral stations. For more information, check "help weather".
 
 class Weather:
     def __init__(self):
-        hooks.register("Message", self.message)
     
         # [show] weather [for|from|on|at|in] <station>
         self.re1 = regexp(r"(?:show )?weather (?:for |from |on |at |in )?(?P<station>\S+?)")
 
+        router.register(self.re1, self.weather, forme=1)
+
         mm.register_help(r"weather", HELP, "weather")
 
         mm.register_perm("weather", PERM_WEATHER)
 
     def unload(self):
-        hooks.unregister("Message", self.message)
+        router.unregister(self.re1, self.weather)
         mm.unregister_help(HELP)
         mm.unregister_perm(PERM_WEATHER)
     
-    def message(self, msg):
-        if not msg.forme:
-            return None
-
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "weather"):
-                station = m.group("station")
-                try:
-                    r = pymetar.MetarReport(station)
-                except:
-                    msg.answer("%:", "There was an error fetching "
-                                     "weather information",
-                                     [".", "!"])
-                else:
-                    l = []
-                    l.append("Weather in %s, %s (%s), at %s:" %
-                             (r.getStationCity(),
-                              r.getStationCountry(), station.upper(),
-                              r.getISOTime()))
-                    if r.getSkyConditions():
-                        l.append("%s," % r.getSkyConditions().lower())
-                    l.append("temperature of %.2fC (%.2fF)," %
-                             (r.getTemperatureCelsius(),
-                              r.getTemperatureFahrenheit()))
-                    l.append("windspeed of %.2fkm/h (%s)," %
-                             (r.getWindSpeed(), r.getWindCompass()))
-                    l.append("visibility of %.2fkm." % (r.getWindSpeed()))
-                    msg.answer("%:", " ".join(l))
-            else:
-                msg.answer("%:", ["You have no permission for that",
-                                  "You are not allowed to do this",
-                                  "You can't show weather"],
+    def weather(self, msg, m):
+        if mm.hasperm(msg, "weather"):
+            station = m.group("station")
+            try:
+                r = pymetar.MetarReport(station)
+            except:
+                msg.answer("%:", "There was an error fetching "
+                                 "weather information",
                                  [".", "!"])
-            return 0
+            else:
+                l = []
+                l.append("Weather in %s, %s (%s), at %s:" %
+                         (r.getStationCity(),
+                          r.getStationCountry(), station.upper(),
+                          r.getISOTime()))
+                if r.getSkyConditions():
+                    l.append("%s," % r.getSkyConditions().lower())
+                l.append("temperature of %.2fC (%.2fF)," %
+                         (r.getTemperatureCelsius(),
+                          r.getTemperatureFahrenheit()))
+                l.append("windspeed of %.2fkm/h (%s)," %
+                         (r.getWindSpeed(), r.getWindCompass()))
+                l.append("visibility of %.2fkm." % (r.getWindSpeed()))
+                msg.answer("%:", " ".join(l))
+        else:
+            msg.answer("%:", ["You have no permission for that",
+                              "You are not allowed to do this",
+                              "You can't show weather"],
+                             [".", "!"])
+        return 0
 
 def __loadmodule__():
     global mod
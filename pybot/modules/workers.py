@@ -0,0 +1,239 @@
+# Copyright (c) 2000-2005 Gustavo Niemeyer <niemeyer@conectiva.com>
+#
+# This file is part of pybot.
+# 
+# pybot is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# pybot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with pybot; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from pybot.locals import *
+from collections import deque
+import threading
+import traceback
+import time
+
+HELP = """
+I can show how the queues of threaded work are doing with "show workers".
+Only admins are allowed to do that.
+"""
+
+# Default number of threads working on each queue, and how many jobs
+# may be waiting in a queue before new ones are dropped.
+WORKERS = 4
+MAXQUEUED = 1000
+
+class WorkQueue:
+    """Run jobs in a bounded set of threads.
+
+    Threads are started as jobs arrive, up to the given number of
+    workers, and then wait for more jobs. Besides the queue depth,
+    the time jobs wait in the queue and take to run is accounted, so
+    that "show workers" may tell which queues are falling behind.
+    """
+    def __init__(self, name, workers, maxqueued):
+        self.name = name
+        self.workers = workers
+        self.maxqueued = maxqueued
+        self.jobs = deque()
+        self.cond = threading.Condition()
+        self.threads = 0
+        self.waiting = 0
+        self.stopped = 0
+        self.done = 0
+        self.failed = 0
+        self.dropped = 0
+        self.maxdepth = 0
+        self.waittime = 0
+        self.maxwaittime = 0
+        self.runtime = 0
+
+    def put(self, func, args, kwargs):
+        self.cond.acquire()
+        try:
+            if len(self.jobs) >= self.maxqueued:
+                self.dropped += 1
+                return 0
+            self.jobs.append((time.time(), func, args, kwargs))
+            self.maxdepth = max(self.maxdepth, len(self.jobs))
+            if len(self.jobs) > self.waiting and self.threads < self.workers:
+                self.threads += 1
+                thread = threading.Thread(target=self.run)
+                thread.setDaemon(1)
+                thread.start()
+            else:
+                self.cond.notify()
+            return 1
+        finally:
+            self.cond.release()
+
+    def stop(self):
+        """Let the threads exit once they're done with queued jobs."""
+        self.cond.acquire()
+        self.stopped = 1
+        self.cond.notifyAll()
+        self.cond.release()
+
+    def run(self):
+        while 1:
+            self.cond.acquire()
+            try:
+                while not self.jobs and not self.stopped:
+                    self.waiting += 1
+                    self.cond.wait()
+                    self.waiting -= 1
+                if not self.jobs:
+                    self.threads -= 1
+                    return
+                queued, func, args, kwargs = self.jobs.popleft()
+            finally:
+                self.cond.release()
+            start = time.time()
+            try:
+                func(*args, **kwargs)
+                failed = 0
+            except:
+                traceback.print_exc()
+                failed = 1
+            end = time.time()
+            self.cond.acquire()
+            self.done += 1
+            self.failed += failed
+            self.waittime += start-queued
+            self.maxwaittime = max(self.maxwaittime, start-queued)
+            self.runtime += end-start
+            self.cond.release()
+
+    def stats(self):
+        """Return a dict with the current state and counters of the queue."""
+        self.cond.acquire()
+        try:
+            return {"workers": self.workers,
+                    "threads": self.threads,
+                    "busy": self.threads-self.waiting,
+                    "queued": len(self.jobs),
+                    "maxqueued": self.maxdepth,
+                    "done": self.done,
+                    "failed": self.failed,
+                    "dropped": self.dropped,
+                    "waittime": self.waittime,
+                    "maxwaittime": self.maxwaittime,
+                    "runtime": self.runtime}
+        finally:
+            self.cond.release()
+
+class Workers:
+    """Named queues of work to be done in threads.
+
+    Modules queue blocking work (fetching URLs, threaded hooks and
+    timers) with pybot.misc.work(queue, func, args), which calls
+    mm.work(), instead of starting a thread for each job. The number
+    of threads of each queue comes from the [workers] section of the
+    configuration, or from what the module asked with
+    mm.workqueue(queue, workers).
+    """
+    def __init__(self):
+        self.queues = {}
+        self.workers = WORKERS
+        if config.has_option("workers", "workers"):
+            self.workers = config.getint("workers", "workers")
+        self.maxqueued = MAXQUEUED
+        if config.has_option("workers", "max_queued"):
+            self.maxqueued = config.getint("workers", "max_queued")
+
+        # show workers
+        self.re1 = regexp(r"show workers")
+
+        router.register(self.re1, self.show_workers, forme=1)
+
+        mm.register("workqueue", self.mm_workqueue)
+        mm.register("work", self.mm_work)
+        mm.register("workstats", self.mm_workstats)
+
+        # workers
+        mm.register_help(r"workers", HELP, "workers")
+
+    def unload(self):
+        router.unregister(self.re1, self.show_workers)
+        mm.unregister("workqueue")
+        mm.unregister("work")
+        mm.unregister("workstats")
+        mm.unregister_help(HELP)
+        for queue in self.queues.values():
+            queue.stop()
+
+    def mm_workqueue(self, name, workers=None):
+        """Return the named queue, creating it with the given number
+        of workers if needed. The configuration has precedence."""
+        queue = self.queues.get(name)
+        if config.has_option("workers", name):
+            workers = config.getint("workers", name)
+        if not queue:
+            queue = WorkQueue(name, workers or self.workers, self.maxqueued)
+            self.queues[name] = queue
+        elif workers:
+            queue.workers = workers
+        return queue
+
+    def mm_work(self, name, func, args=(), kwargs={}):
+        """Run func(*args, **kwargs) in the named queue.
+
+        Returns false if the queue is full and the job was dropped.
+        """
+        queue = self.queues.get(name) or self.mm_workqueue(name)
+        return queue.put(func, args, kwargs)
+
+    def mm_workstats(self):
+        """Return a dict with the stats of each queue, by name."""
+        return dict([(name, queue.stats())
+                     for name, queue in self.queues.items()])
+
+    def show_workers(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            stats = self.mm_workstats().items()
+            if not stats:
+                msg.answer("%:", ["There are no", "No"],
+                                 "work queues yet", [".", "!"])
+            else:
+                stats.sort()
+                l = []
+                for name, st in stats:
+                    l.append("%s (%d/%d busy, %d queued, %d max, "
+                             "%d done, %d failed, %d dropped, "
+                             "%.0fms wait, %.0fms max wait, %.0fms run)" %
+                             (name, st["busy"], st["workers"], st["queued"],
+                              st["maxqueued"], st["done"], st["failed"],
+                              st["dropped"],
+                              st["waittime"]*1000/(st["done"] or 1),
+                              st["maxwaittime"]*1000,
+                              st["runtime"]*1000/(st["done"] or 1)))
+                msg.answer("%:", "These are the work queues:", ", ".join(l))
+        else:
+            msg.answer("%:", ["You're not that good",
+                              "You are not able to do that",
+                              "No, you can't do this"],
+                             [".", "!", ". I'm sorry!"])
+        return 0
+
+# Load first to let work() available to other modules.
+__loadlevel__ = 90
+
+def __loadmodule__():
+    global mod
+    mod = Workers()
+
+def __unloadmodule__():
+    global mod
+    mod.unload()
+    del mod
+
+# vim:ts=4:sw=4:et
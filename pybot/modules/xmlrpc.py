@@ -75,8 +75,7 @@ class XmlRpc:
         
         rm.register("sendmsg", self.rm_sendmsg)
 
-        hooks.register("Message", self.message)
-        hooks.register("Loop", self.loop)
+        reactor.register(self.server.socket, self.server.handle_request)
 
         # (add|create) xmlrpc user <user> with [pass|password] <passwd> [!.]
         self.re1 = regexp(r"(?:add|create) xmlrpc user (?P<user>\S+) with (?:password|pass) (?P<passwd>\S+)")
@@ -86,20 +85,23 @@ class XmlRpc:
 
         # [don[']t|do not] allow xmlrpc (func[tion]|method) <method> [(to|for) user <user>] [(to|for|on|at) [user|channel] <target>] [[and] [on|at] server <server>]
         self.re3 = regexp(r"(?P<dont>don'?t |do not )?allow xmlrpc (?:func(?:tion)?|method) (?P<method>\S+)(?: (?:to |for )user (?P<user>\S+))?(?: (?:to|for|on|at) (?:user |channel )?(?P<target>\S+))?(?: (?:and )?(?:on |at )?server (?P<server>\S+))?")
+
+        router.register(self.re1, self.create_user, forme=1)
+        router.register(self.re2, self.remove_user, forme=1)
+        router.register(self.re3, self.allow_method, forme=1)
     
         # xmlrpc
         mm.register_help("xmlrpc", HELP, "xmlrpc")
         
     def unload(self):
-        hooks.unregister("Message", self.message)
-        hooks.unregister("Loop", self.loop)
+        router.unregister(self.re1, self.create_user)
+        router.unregister(self.re2, self.remove_user)
+        router.unregister(self.re3, self.allow_method)
+        reactor.unregister(self.server.socket)
         self.server.server_close()
         rm.unregister("sendmsg")
         mm.unregister_help(HELP)
     
-    def loop(self):
-        self.server.handle_request()
-
     def user_add(self, username, password):
         db.execute("select null from xmlrpcuser where username=?",
                    username)
@@ -140,75 +142,68 @@ class XmlRpc:
             db.execute("select null from xmlrpcperm where "+wstr, *wargs)
         return db.changed or db.results
 
-    def message(self, msg):
-        if not msg.forme:
-            return None
+    def create_user(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            if self.user_add(m.group("user"), m.group("passwd")):
+                msg.answer("%:", ["User added", "Ok", "User created",
+                                  "Done"], [".", "!"])
+            else:
+                msg.answer("%:", ["I can't do this!", "Sorry!"],
+                                 ["This user already exists",
+                                  "This user is already registered"],
+                                 [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"],
+                             ["can't add xmlrpc users.",
+                              "don't have this power."])
+        return 0
 
-        m = self.re1.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                if self.user_add(m.group("user"), m.group("passwd")):
-                    msg.answer("%:", ["User added", "Ok", "User created",
-                                      "Done"], [".", "!"])
-                else:
-                    msg.answer("%:", ["I can't do this!", "Sorry!"],
-                                     ["This user already exists",
-                                      "This user is already registered"],
-                                     [".", "!"])
+    def remove_user(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            if self.del_user(m.group("user")):
+                msg.answer("%:", ["User removed", "No problems",
+                                  "User deleted", "Done"], [".", "!"])
             else:
-                msg.answer("%:", ["Sorry, you", "You"],
-                                 ["can't add xmlrpc users.",
-                                  "don't have this power."])
-            return 0
-        
-        m = self.re2.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                if self.del_user(m.group("user")):
-                    msg.answer("%:", ["User removed", "No problems",
-                                      "User deleted", "Done"], [".", "!"])
+                msg.answer("%:", ["Oops!", "Sorry!"],
+                                 ["There's no such user",
+                                  "I haven't found this user"],
+                                 [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"],
+                             ["can't add xmlrpc users.",
+                              "don't have this power."])
+        return 0
+
+    def allow_method(self, msg, m):
+        if mm.hasperm(msg, "admin"):
+            if m.group("dont"):
+                if self.perm_del(m.group("user"), m.group("method"),
+                                 m.group("server"), m.group("target")):
+                    msg.answer("%:", ["Ok", "No problems",
+                                      "Right now",
+                                      "Permission removed"],
+                                     [".", "!"])
                 else:
-                    msg.answer("%:", ["Oops!", "Sorry!"],
-                                     ["There's no such user",
-                                      "I haven't found this user"],
+                    msg.answer("%:", ["Sorry!", "Oops!",
+                                      "Can't do this!"],
+                                     ["Nobody has this permission",
+                                      "This permission doesn't exist"],
                                      [".", "!"])
             else:
-                msg.answer("%:", ["Sorry, you", "You"],
-                                 ["can't add xmlrpc users.",
-                                  "don't have this power."])
-            return 0
-
-        m = self.re3.match(msg.line)
-        if m:
-            if mm.hasperm(msg, "admin"):
-                if m.group("dont"):
-                    if self.perm_del(m.group("user"), m.group("method"),
-                                     m.group("server"), m.group("target")):
-                        msg.answer("%:", ["Ok", "No problems",
-                                          "Right now",
-                                          "Permission removed"],
-                                         [".", "!"])
-                    else:
-                        msg.answer("%:", ["Sorry!", "Oops!",
-                                          "Can't do this!"],
-                                         ["Nobody has this permission",
-                                          "This permission doesn't exist"],
-                                         [".", "!"])
+                if self.perm_add(m.group("user"), m.group("method"),
+                                 m.group("server"), m.group("target")):
+                    msg.answer("%:", ["Ok", "No problems",
+                                      "Right now"], [".", "!"])
                 else:
-                    if self.perm_add(m.group("user"), m.group("method"),
-                                     m.group("server"), m.group("target")):
-                        msg.answer("%:", ["Ok", "No problems",
-                                          "Right now"], [".", "!"])
-                    else:
-                        msg.answer("%:", ["Oops!", "It's not necessary!",
-                                          "I don't have to!"],
-                                         "This permission already exists",
-                                         [".", "!"])
-            else:
-                msg.answer("%:", ["Sorry, you", "You"],
-                                 ["can't work with xmlrpc permissions.",
-                                  "don't have this power."])
-            return 0
+                    msg.answer("%:", ["Oops!", "It's not necessary!",
+                                      "I don't have to!"],
+                                     "This permission already exists",
+                                     [".", "!"])
+        else:
+            msg.answer("%:", ["Sorry, you", "You"],
+                             ["can't work with xmlrpc permissions.",
+                              "don't have this power."])
+        return 0
  
     def hasperm(self, method, auth):
         username = auth.get("username")
@@ -0,0 +1,112 @@
+# Copyright (c) 2000-2003 Gustavo Niemeyer <niemeyer@conectiva.com>
+#
+# This file is part of pybot.
+# 
+# pybot is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# pybot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with pybot; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from errno import EINTR, EAGAIN
+import select
+import traceback
+import fcntl
+import os
+
+class Reactor:
+    """Wait for activity on every file descriptor pybot cares about.
+
+    File descriptors (sockets, pipes, etc) are registered together
+    with functions which are called by poll() when they become
+    readable or writable. Every registered descriptor is checked
+    with a single select() call. Other threads may interrupt a
+    pending poll() with wakeup(), so that lines they queue are
+    handled at once.
+    """
+    def __init__(self):
+        self._fds = {}
+        self._wakeup_r, self._wakeup_w = os.pipe()
+        for fd in (self._wakeup_r, self._wakeup_w):
+            flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+            fcntl.fcntl(fd, fcntl.F_SETFL, flags|os.O_NONBLOCK)
+        self.register(self._wakeup_r, self._drain)
+
+    def register(self, fd, readfunc=None, writefunc=None, writable=None):
+        """Watch fd, calling readfunc() when it's readable.
+
+        If readfunc is None, activity on fd will just interrupt poll().
+        If writefunc is given, it's called when fd is writable, and
+        writable() returns true (or always, if writable is None).
+        """
+        if hasattr(fd, "fileno"):
+            fd = fd.fileno()
+        self._fds[fd] = (readfunc, writefunc, writable)
+
+    def unregister(self, fd):
+        if hasattr(fd, "fileno"):
+            fd = fd.fileno()
+        try:
+            del self._fds[fd]
+        except KeyError:
+            pass
+
+    def wakeup(self):
+        """Interrupt a pending poll().
+
+        This method is thread safe.
+        """
+        try:
+            os.write(self._wakeup_w, "\0")
+        except OSError, why:
+            # The pipe is full, so poll() will wake up anyway.
+            if why[0] != EAGAIN:
+                raise
+
+    def _drain(self):
+        try:
+            while os.read(self._wakeup_r, 4096):
+                pass
+        except OSError, why:
+            if why[0] != EAGAIN:
+                raise
+
+    def poll(self, timeout=None):
+        """Wait until something happens, for at most timeout seconds."""
+        if timeout is not None and timeout < 0:
+            timeout = 0
+        readfds = []
+        writefds = []
+        for fd, (readfunc, writefunc, writable) in self._fds.items():
+            readfds.append(fd)
+            if writefunc and (writable is None or writable()):
+                writefds.append(fd)
+        try:
+            r, w, e = select.select(readfds, writefds, [], timeout)
+        except select.error, why:
+            if why[0] != EINTR:
+                raise
+            return
+        for fd in r:
+            self._call(fd, 0)
+        for fd in w:
+            self._call(fd, 1)
+
+    def _call(self, fd, index):
+        # A previous callback may have unregistered fd.
+        funcs = self._fds.get(fd)
+        if funcs and funcs[index]:
+            try:
+                funcs[index]()
+            except:
+                traceback.print_exc()
+
+# vim:ts=4:sw=4:et
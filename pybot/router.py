@@ -0,0 +1,169 @@
+# Copyright (c) 2000-2003 Gustavo Niemeyer <niemeyer@conectiva.com>
+#
+# This file is part of pybot.
+# 
+# pybot is free software; you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation; either version 2 of the License, or
+# (at your option) any later version.
+# 
+# pybot is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with pybot; if not, write to the Free Software
+# Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
+
+from sre_constants import LITERAL, IN, RANGE, BRANCH, SUBPATTERN, \
+                          MAX_REPEAT, MIN_REPEAT, AT
+import sre_parse
+import traceback
+
+from pybot.hook import matchfilters
+import pybot
+
+class Router:
+    """Dispatch messages to the command which matches them.
+
+    Modules register compiled patterns (usually built with regexp())
+    together with a function, which is called as func(msg, m) when
+    the pattern matches msg.line. Rather than having every module try
+    its own patterns on every message, routes are indexed by the
+    characters their patterns may start with, so only the few routes
+    which may match the first character of a line are tried.
+
+    Routes are tried in priority order, and then in registration
+    order. The first one which matches and whose function returns
+    something other than None ends the dispatching. Filters work as
+    in Hooks.register(), and forme=1 is the most common one.
+    """
+    def __init__(self):
+        self._routes = []
+        self._seq = 0
+        self._table = {}
+        self._default = ()
+        pybot.hooks.register("Message", self.message)
+
+    def register(self, pattern, func, priority=500, **filters):
+        self._seq += 1
+        chars = firstchars(pattern)
+        self._routes.append((priority, self._seq, pattern, func, chars,
+                             tuple(filters.items())))
+        self._routes.sort()
+        self._rebuild()
+
+    def unregister(self, pattern, func):
+        for i in range(len(self._routes)):
+            route = self._routes[i]
+            if route[2] is pattern and route[3] == func:
+                del self._routes[i]
+                break
+        else:
+            raise ValueError, "route not registered"
+        self._rebuild()
+
+    def _rebuild(self):
+        table = {}
+        default = []
+        for priority, seq, pattern, func, chars, filters in self._routes:
+            route = (pattern, func, filters)
+            if chars is None:
+                default.append(route)
+                for routes in table.values():
+                    routes.append(route)
+            else:
+                for char in chars:
+                    if char not in table:
+                        table[char] = default[:]
+                    table[char].append(route)
+        for char in table:
+            table[char] = tuple(table[char])
+        self._table = table
+        self._default = tuple(default)
+
+    def candidates(self, line):
+        """Return the routes which may match the given line."""
+        return self._table.get(line[:1].lower(), self._default)
+
+    def message(self, msg):
+        line = msg.line
+        for pattern, func, filters in self.candidates(line):
+            if filters and not matchfilters(filters, msg):
+                continue
+            m = pattern.match(line)
+            if m:
+                try:
+                    ret = func(msg, m)
+                except:
+                    traceback.print_exc()
+                    ret = 0
+                if ret is not None:
+                    return ret
+        return None
+
+def firstchars(pattern):
+    """Return the lowercase characters a match of pattern may start with.
+
+    None is returned if that can't be told, as when the pattern starts
+    with a character class like \\s or \\w, or may match an empty string.
+    """
+    chars, nullable = _firstchars(sre_parse.parse(pattern.pattern,
+                                                  pattern.flags))
+    if nullable:
+        return None
+    return chars
+
+def _char(code):
+    if code < 256:
+        return chr(code).lower()
+    return unichr(code).lower()
+
+def _firstchars(seq):
+    chars = {}
+    for op, av in seq:
+        if op == AT:
+            continue
+        elif op == LITERAL:
+            chars[_char(av)] = 1
+            return chars, 0
+        elif op == IN:
+            for inop, inav in av:
+                if inop == LITERAL:
+                    chars[_char(inav)] = 1
+                elif inop == RANGE and inav[1]-inav[0] < 64:
+                    for code in range(inav[0], inav[1]+1):
+                        chars[_char(code)] = 1
+                else:
+                    return None, 0
+            return chars, 0
+        elif op == BRANCH:
+            nullable = 0
+            for branch in av[1]:
+                branchchars, branchnullable = _firstchars(branch)
+                if branchchars is None:
+                    return None, 0
+                chars.update(branchchars)
+                nullable = nullable or branchnullable
+            if not nullable:
+                return chars, 0
+        elif op == SUBPATTERN:
+            subchars, nullable = _firstchars(av[1])
+            if subchars is None:
+                return None, 0
+            chars.update(subchars)
+            if not nullable:
+                return chars, 0
+        elif op in (MAX_REPEAT, MIN_REPEAT):
+            subchars, nullable = _firstchars(av[2])
+            if subchars is None:
+                return None, 0
+            chars.update(subchars)
+            if av[0] > 0 and not nullable:
+                return chars, 0
+        else:
+            return None, 0
+    return chars, 1
+
+# vim:ts=4:sw=4:et
@@ -91,6 +91,7 @@ def main():
                     "pong",
                     "servercontrol",
                     "userdata",
+                    "workers",
                   ]
     pybot.modls.loadlist(defaultlist)
     ret = pybot.main.loop()
@@ -17,8 +17,9 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from errno import EINPROGRESS, EALREADY, EWOULDBLOCK
+from collections import deque
+from heapq import heappush, heappop
 from thread import allocate_lock, start_new_thread
-from select import select
 from string import split
 from time import time, sleep
 import socket
@@ -30,6 +31,20 @@ import pybot
 
 CONNECTDELAY = 30
 
+# Lines with priority up to this value (PONG, NICK, JOIN, QUIT, ...)
+# are sent even if the flood control budget is exhausted.
+URGENTPRIORITY = 20
+
+# Flood control defaults, overridable in the [flood] section of the
+# configuration file, or per server in [flood <servername>] sections.
+# The line budget follows the "one message every two seconds, with up
+# to ten seconds of burst" rule from RFC 1459. A zero rate disables
+# the given budget.
+FLOODDEFAULTS = {"lines_per_second": 0.5,
+                 "line_burst": 5,
+                 "bytes_per_second": 0,
+                 "byte_burst": 0}
+
 class Servers:
     def __init__(self):
         self.servers = []
@@ -53,6 +68,187 @@ class Servers:
     def getall(self):
         return self.servers
 
+class LineBuffer:
+    """Split received data into lines.
+
+    Data is accumulated in a bytearray, and only the newly received
+    part is scanned for line terminators, so the cost of framing is
+    linear in the amount of data received, even when a burst brings
+    thousands of lines at once. Complete lines are appended to the
+    given deque.
+    """
+    def __init__(self, lines):
+        self.lines = lines
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        buffer = self._buffer
+        scanned = len(buffer)
+        buffer.extend(data)
+        # What was in the buffer has no terminator, but its last
+        # byte may be the "\r" of one.
+        pos = buffer.find("\r\n", max(scanned-1, 0))
+        if pos == -1:
+            return
+        append = self.lines.append
+        start = 0
+        while pos != -1:
+            append(str(buffer[start:pos]))
+            start = pos+2
+            pos = buffer.find("\r\n", start)
+        # What is left is a partial line, so this is cheap.
+        del buffer[:start]
+
+    def clear(self):
+        del self._buffer[:]
+
+class SendQueue:
+    """Priority queue of outgoing lines.
+
+    Lines with lower priority values are sent first. Lines with the
+    same priority are taken in turns from each target, so that a
+    flood to one channel won't starve the others. Both put() and
+    get() are O(log n). This class isn't thread safe.
+    """
+    def __init__(self):
+        self._priorities = []
+        self._buckets = {}
+        self._len = 0
+        self.maxdepth = 0
+        self.sent = 0
+        self.totalwait = 0.0
+        self.maxwait = 0.0
+
+    def __len__(self):
+        return self._len
+
+    def put(self, line, priority=50, target=""):
+        bucket = self._buckets.get(priority)
+        if bucket is None:
+            # Targets in round-robin order, and their lines.
+            bucket = self._buckets[priority] = (deque(), {})
+            heappush(self._priorities, priority)
+        targets, queues = bucket
+        queue = queues.get(target)
+        if queue is None:
+            queue = queues[target] = deque()
+            targets.append(target)
+        queue.append((line, time()))
+        self._len += 1
+        if self._len > self.maxdepth:
+            self.maxdepth = self._len
+
+    def peek(self):
+        """Return the next line without removing it."""
+        targets, queues = self._buckets[self._priorities[0]]
+        return queues[targets[0]][0][0]
+
+    def peekpriority(self):
+        """Return the priority of the next line, or None if empty."""
+        if self._priorities:
+            return self._priorities[0]
+        return None
+
+    def get(self):
+        priority = self._priorities[0]
+        targets, queues = self._buckets[priority]
+        target = targets.popleft()
+        queue = queues[target]
+        line, queued = queue.popleft()
+        if queue:
+            targets.append(target)
+        else:
+            del queues[target]
+            if not targets:
+                heappop(self._priorities)
+                del self._buckets[priority]
+        self._len -= 1
+        wait = time()-queued
+        self.sent += 1
+        self.totalwait += wait
+        if wait > self.maxwait:
+            self.maxwait = wait
+        return line
+
+    def clear(self):
+        self._priorities = []
+        self._buckets = {}
+        self._len = 0
+
+    def stats(self):
+        """Return a dictionary with queue depth and wait statistics."""
+        if self.sent:
+            avgwait = self.totalwait/self.sent
+        else:
+            avgwait = 0.0
+        return {"depth": self._len, "maxdepth": self.maxdepth,
+                "sent": self.sent, "avgwait": avgwait,
+                "maxwait": self.maxwait}
+
+class TokenBucket:
+    """Allow up to burst units at once, refilled at rate units per second.
+
+    The bucket may go into debt when forced to, so that urgent lines
+    are still accounted for.
+    """
+    def __init__(self, rate, burst):
+        self.rate = rate
+        self.burst = max(burst, 1)
+        self.reset()
+
+    def reset(self):
+        self._tokens = self.burst
+        self._last = time()
+
+    def _refill(self, now):
+        if now > self._last:
+            self._tokens = min(self.burst,
+                               self._tokens+(now-self._last)*self.rate)
+        self._last = now
+
+    def when(self, n, now):
+        """Return when n units will be available."""
+        if not self.rate:
+            return now
+        self._refill(now)
+        # Something bigger than the burst must be allowed at some point.
+        n = min(n, self.burst)
+        if self._tokens >= n:
+            return now
+        return now+(n-self._tokens)/self.rate
+
+    def consume(self, n, now):
+        if self.rate:
+            self._refill(now)
+            self._tokens -= n
+
+class FloodControl:
+    """Line and byte budgets for the traffic sent to a server."""
+    def __init__(self, servername):
+        config = pybot.config
+        values = FLOODDEFAULTS.copy()
+        for section in ("flood", "flood "+servername):
+            if config.has_section(section):
+                for name in values:
+                    if config.has_option(section, name):
+                        values[name] = config.getfloat(section, name)
+        self._lines = TokenBucket(values["lines_per_second"],
+                                  values["line_burst"])
+        self._bytes = TokenBucket(values["bytes_per_second"],
+                                  values["byte_burst"])
+
+    def reset(self):
+        self._lines.reset()
+        self._bytes.reset()
+
+    def when(self, size, now):
+        """Return when a line with size bytes may be sent."""
+        return max(self._lines.when(1, now), self._bytes.when(size, now))
+
+    def consume(self, size, now):
+        self._lines.consume(1, now)
+        self._bytes.consume(size, now)
+
 class BaseServer:
     def __init__(self, host, servername=None):
         if not servername:
@@ -61,12 +257,28 @@ class BaseServer:
             self.servername = servername
         self.host = host
         self.killed = 0
-        self._inlines = []
+        self._inlines = deque()
         self.user = User()
 
     def interaction(self):
         pass
 
+    def deadline(self):
+        """Return when interaction() must be called again.
+
+        None means it only has to be called when there's activity
+        on the server connection.
+        """
+        if self._inlines:
+            return 0
+        return None
+
+    def wantwrite(self):
+        return 0
+
+    def fileno(self):
+        return None
+
     def changeserver(self, host, servername):
         pass
 
@@ -76,6 +288,9 @@ class BaseServer:
     def reconnect(self):
         pass
 
+    def queuestats(self):
+        return None
+
     def sendcmd(self, prefix, cmd, *params, **kw):
         pass
 
@@ -88,106 +303,143 @@ class BaseServer:
         This method is not thread safe, since it must be called only
         by the main loop.
         """
-        line = None
-        if len(self._inlines) > 0:
-            line = self._inlines[0]
-            del self._inlines[0]
-        return line
+        if self._inlines:
+            return self._inlines.popleft()
+        return None
 
 class Server(BaseServer):
     def __init__(self, host, servername=None):
         BaseServer.__init__(self, host, servername)
 
         self.changeserver(host, servername)
-        self._inbuffer = ""
-        self._outlines = []
+        self._inbuffer = LineBuffer(self._inlines)
+        self._outbuffer = ""
+        self._outlines = SendQueue()
         self._outlines_lock = allocate_lock()
-        self._last_sent = 0
-        self._last_sent_timeout = 0;
+        self._flood = FloodControl(self.servername)
         self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-        self._socket.setblocking(0)
         self._timeout = 0
         self._connect = 1
         self._reconnect = 0
         self._connected = 0
     
     def interaction(self):
+        """Take care of the connection state.
+
+        Reading and writing is done by handle_read() and handle_write(),
+        which are called by pybot.reactor when the socket is ready.
+        """
         if not self._connected:
-            if self._timeout:
-                self._timeout = self._timeout-1
-            elif self._connect:
+            if self._connect and self._timeout <= time():
                 try:
                     self._socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                    self._socket.setblocking(0)
                     self._socket.connect((self._host, self._port))
                 except socket.error, why:
                     if not why[0] in (EINPROGRESS, EALREADY, EWOULDBLOCK):
-                        self._timeout = CONNECTDELAY
+                        self._timeout = time()+CONNECTDELAY
                         pybot.hooks.call("ConnectingError", self)
                         self._disconnect()
                         return
                 self._connected = 1
+                self._inbuffer.clear()
+                pybot.reactor.register(self._socket, self.handle_read,
+                                       self.handle_write, self.wantwrite)
                 pybot.hooks.call("Connected", self)
+        elif self.killed:
+            # Give pending lines (usually QUIT) a last chance.
+            self.handle_write()
+            self._disconnect()
+            pybot.hooks.call("Disconnected", (self))
+        elif self._reconnect:
+            self.handle_write()
+            self._reconnect = 0
+            self._disconnect()
+
+    def handle_read(self):
+        try:
+            recv = self._socket.recv(4096)
+        except socket.error, why:
+            if why[0] != EWOULDBLOCK:
+                self._connectionerror()
+            return
+        if recv:
+            self._inbuffer.feed(recv)
         else:
+            self._connectionerror()
+
+    def handle_write(self):
+        if not self._connected:
+            return
+        if not self._outbuffer:
+            now = time()
+            self._outlines_lock.acquire()
+            try:
+                while self._outlines:
+                    line = self._outlines.peek()
+                    if (self._outlines.peekpriority() > URGENTPRIORITY and
+                        self._flood.when(len(line), now) > now):
+                        break
+                    self._outlines.get()
+                    self._flood.consume(len(line), now)
+                    self._outbuffer = self._outbuffer + line
+            finally:
+                self._outlines_lock.release()
+        if self._outbuffer:
+            # The socket is non-blocking, so we may not be able
+            # to send everything at once.
             try:
-                selret = select([self._socket],[self._socket],[],10)
-            except:
-                self._disconnect()
-                self._timeout = CONNECTDELAY
-                pybot.hooks.call("ConnectionError", self)
+                sent = self._socket.send(self._outbuffer)
+            except socket.error, why:
+                if why[0] != EWOULDBLOCK:
+                    self._connectionerror()
                 return
-            if len(selret[0]) != 0:
-                try:
-                    recv = self._socket.recv(4096)
-                except socket.error, why:
-                    self._disconnect()
-                    self._timeout = CONNECTDELAY
-                    pybot.hooks.call("ConnectionError", self)
-                    return
-                if recv:
-                    self._inbuffer = self._inbuffer + recv
-                    lines = split(self._inbuffer, "\r\n")
-                    if len(lines) > 0:
-                            self._inbuffer = lines[-1]
-                            self._inlines = self._inlines + lines[:-1]
-                else:
-                    self._disconnect()
-                    self._timeout = CONNECTDELAY
-                    pybot.hooks.call("ConnectionError", self)
-                    return
-            if len(selret[1]) != 0:
-                try:
-                    self._outlines_lock.acquire()
-                    try:
-                        lines_sent = 0
-                        while lines_sent < 3 and self._outlines and (self._outlines[0][1] <= 20 or self._last_sent < time()):
-                            # Disabled for now.
-                            #if self._last_sent+1 < time():
-                            #    self._last_sent_timeout = 1
-                            #elif self._last_sent_timeout < 2 and self._outlines[0][1] > 20:
-                            #        self._last_sent_timeout = self._last_sent_timeout+1
-                            self._last_sent = time()+self._last_sent_timeout;
-                            line = self._outlines[0][0]+"\r\n"
-                            del self._outlines[0]
-                            if isinstance(line, unicode):
-                                try:
-                                    line = line.encode('iso-8859-1')
-                                except UnicodeError:
-                                    line = line.encode('utf8')
-                            self._socket.send(line)
-                            lines_sent = lines_sent + 1
-                    finally:
-                        self._outlines_lock.release()
-                except socket.error, why:
-                    if why[0] != EWOULDBLOCK:
-                        self._disconnect()
-                        self._timeout = CONNECTDELAY
-                        pybot.hooks.call("ConnectionError", self)
-            if self.killed:
-                self._disconnect()
-                pybot.hooks.call("Disconnected", (self))
-            elif self._reconnect:
-                self._reconnect = 0
-                self._disconnect()
+            self._outbuffer = self._outbuffer[sent:]
+
+    def _connectionerror(self):
+        self._disconnect()
+        self._timeout = time()+CONNECTDELAY
+        pybot.hooks.call("ConnectionError", self)
+
+    def _nextsend(self):
+        """Return when the next queued line may be sent, or None."""
+        self._outlines_lock.acquire()
+        try:
+            if not self._outlines:
+                return None
+            now = time()
+            if self._outlines.peekpriority() <= URGENTPRIORITY:
+                return now
+            return self._flood.when(len(self._outlines.peek()), now)
+        finally:
+            self._outlines_lock.release()
+
+    def deadline(self):
+        if not self._connected:
+            if self._connect:
+                return self._timeout
+            return None
+        if self.killed or self._reconnect:
+            return 0
+        deadline = BaseServer.deadline(self)
+        if not self._outbuffer:
+            # Wake up as soon as flood control allows the next line.
+            nextsend = self._nextsend()
+            if (nextsend is not None and nextsend > time() and
+                (deadline is None or nextsend < deadline)):
+                deadline = nextsend
+        return deadline
+
+    def wantwrite(self):
+        if not self._connected:
+            return 0
+        if self._outbuffer:
+            return 1
+        nextsend = self._nextsend()
+        return nextsend is not None and nextsend <= time()
+
+    def fileno(self):
+        return self._socket.fileno()
 
     def changeserver(self, host, servername=None):
         if not servername:
@@ -201,13 +453,16 @@ class Server(BaseServer):
             self._port = 6667
 
     def _disconnect(self):
+        if self._connected:
+            pybot.reactor.unregister(self._socket)
         try:
-            self._socket.shutdown()
             self._socket.close()
-        except:
+        except socket.error:
             pass
         self._connected = 0
-        self._outlines = []
+        self._outbuffer = ""
+        self._outlines.clear()
+        self._flood.reset()
 
     def kill(self):
         self._connect = 0
@@ -216,24 +471,29 @@ class Server(BaseServer):
     def reconnect(self):
         if self._connected:
             self._reconnect = 1
-            self._timeout = CONNECTDELAY
+            self._timeout = time()+CONNECTDELAY
 
     def sendline(self, line, priority=50, outhooks=1):
         """Send one line for the server.
 
         This method is thread safe.
         """
+        tokens = line.split(" ", 2)
+        if len(tokens) == 3 and tokens[0] in ("PRIVMSG", "NOTICE"):
+            target = tokens[1].lower()
+        else:
+            target = ""
+        # Encode now, so that flood control knows the real size.
+        data = line+"\r\n"
+        if isinstance(data, unicode):
+            try:
+                data = data.encode('iso-8859-1')
+            except UnicodeError:
+                data = data.encode('utf8')
         self._outlines_lock.acquire()
-        l = len(self._outlines)
-        i = 0
-        while i < l:
-            if self._outlines[i][1] > priority:
-                self._outlines.insert(i,(line,priority))
-                self._outlines_lock.release()
-                return
-            i = i + 1
-        self._outlines.append((line,priority))
+        self._outlines.put(data, priority, target)
         self._outlines_lock.release()
+        pybot.reactor.wakeup()
 
         if outhooks:
             msg = Command()
@@ -243,6 +503,14 @@ class Server(BaseServer):
                         "OutCTCPReply"][msg._index]
             pybot.hooks.call(hookname, msg)
 
+    def queuestats(self):
+        """Return statistics about the queue of lines to be sent."""
+        self._outlines_lock.acquire()
+        try:
+            return self._outlines.stats()
+        finally:
+            self._outlines_lock.release()
+
     def sendcmd(self, prefix, cmd, *params, **kw):
         priority = kw.get("priority", 50)
         outhooks = kw.get("outhooks", 1)
@@ -315,6 +583,7 @@ class ConsoleServer(BaseServer, Cmd):
             return 1
         inline = ":master!master@console PRIVMSG pybot :%s" % line
         self._inlines.append(inline)
+        pybot.reactor.wakeup()
         sleep(0.5)
         self.show_lines()
 
@@ -17,81 +17,283 @@
 # Foundation, Inc., 59 Temple Place, Suite 330, Boston, MA  02111-1307  USA
 
 from pysqlite2 import dbapi2 as sqlite
-import fcntl
+import threading
+import traceback
 import time
 import re
 
+# Pending writes are committed together once the oldest of them is
+# this old (in seconds), or once there are this many of them.
+COMMITDELAY = 0.25
+COMMITROWS = 100
+
+# Number of prepared statements kept by each connection.
+STATEMENTCACHE = 200
+
+# Number of rows fetched at once while iterating over results.
+FETCHSIZE = 64
+
+WRITE = re.compile(r"\s*(?:insert|update|delete|replace)\b", re.I)
+
+class Connection(object):
+    """SQLite connection shared by every SQLiteDB handle of a database.
+
+    Writes are grouped in a single transaction, which is committed
+    once it's COMMITDELAY seconds old or has COMMITROWS writes, so
+    that bursts of writes (like logging a busy channel) don't wait
+    for the disk once per row. The database is journaled in WAL mode,
+    so readers and the writer don't block each other.
+    """
+
+    def __init__(self, path, commitdelay=COMMITDELAY, commitrows=COMMITROWS,
+                 wakeup=None):
+        self.conn = sqlite.connect(path, isolation_level=None,
+                                   check_same_thread=False,
+                                   cached_statements=STATEMENTCACHE)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.lock = threading.RLock()
+        self.commitdelay = commitdelay
+        self.commitrows = commitrows
+        self.wakeup = wakeup
+        self.pending = 0
+        self.pendingsince = None
+        self.intransaction = False
+        self.depth = 0
+
+    def write(self, dontcommit=False):
+        """Take note of a write done inside the current transaction."""
+        self.pending += 1
+        if self.pendingsince is None:
+            self.pendingsince = time.time()
+            # Whoever is waiting must learn about the new deadline.
+            if self.wakeup:
+                self.wakeup()
+        if self.pending >= self.commitrows and not dontcommit:
+            self.flush()
+
+    def transaction(self):
+        """Make sure a transaction is open."""
+        if not self.intransaction:
+            self.conn.execute("begin")
+            self.intransaction = True
+
+    def deadline(self):
+        if self.pendingsince is None or self.depth:
+            return None
+        return self.pendingsince+self.commitdelay
+
+    def flush(self, force=False):
+        self.lock.acquire()
+        try:
+            if self.depth:
+                return
+            if not force and (self.pendingsince is None or
+                              self.pending < self.commitrows and
+                              time.time() < self.pendingsince+
+                                            self.commitdelay):
+                return
+            if self.intransaction:
+                try:
+                    self.conn.execute("commit")
+                except sqlite.DatabaseError:
+                    # Keep the transaction, and try again later.
+                    traceback.print_exc()
+                    self.pendingsince = time.time()
+                    return
+                self.intransaction = False
+            self.pending = 0
+            self.pendingsince = None
+        finally:
+            self.lock.release()
+
+    def rollback(self):
+        if self.intransaction:
+            self.conn.execute("rollback")
+            self.intransaction = False
+        self.pending = 0
+        self.pendingsince = None
+
 class SQLiteDB(object):
+    """Access to pybot's SQLite database.
+
+    After execute(), results may be retrieved with fetchone(),
+    fetchall(), or by iterating over the object. Rows are only
+    fetched from the database as they're needed, and each row may
+    be indexed by position, name, or accessed as an attribute.
+
+    Writes are committed in groups (see Connection). Use begin() and
+    commit() around writes which must be committed atomically, and
+    commit() alone to make sure earlier writes are on disk.
+    """
 
-    def __init__(self, path, _copy=False):
+    def __init__(self, path, commitdelay=COMMITDELAY, commitrows=COMMITROWS,
+                 wakeup=None, _connection=None):
         self._path = path
-        self._conn = sqlite.connect(self._path)
-        self._lockfile = open(path, "r+")
-        self.results = []
+        if _connection is None:
+            self._connection = Connection(path, commitdelay, commitrows,
+                                          wakeup)
+        else:
+            self._connection = _connection
+        self._conn = self._connection.conn
+        self._lock = self._connection.lock
+        self._cursor = None
+        self._names = None
+        self._next = None
         self.changed = False
         self.error = sqlite.DatabaseError
-        if not _copy:
+        if _connection is None:
             self.table("dict", "name text, value")
 
     def lock(self):
-        fcntl.lockf(self._lockfile.fileno(), fcntl.LOCK_EX)
+        self._lock.acquire()
 
     def unlock(self):
-        fcntl.lockf(self._lockfile.fileno(), fcntl.LOCK_UN)
+        self._lock.release()
 
     def copy(self):
-        return SQLiteDB(self._path, _copy=True)
+        """Return a handle with its own results, for use in threads.
+
+        The connection, and pending writes, are shared with self.
+        """
+        return SQLiteDB(self._path, _connection=self._connection)
 
     def close(self):
+        self.commit()
         self._conn.close()
 
+    def begin(self):
+        """Start a transaction scope, to be ended by commit() or rollback().
+
+        Pending writes from elsewhere are committed first, and other
+        threads are kept away from the database until the scope ends.
+        Scopes may be nested, and only the outermost one commits.
+        """
+        self.lock()
+        connection = self._connection
+        if not connection.depth:
+            connection.flush(force=True)
+        connection.depth += 1
+
     def commit(self):
-        self._conn.commit()
-        self.unlock()
+        """End a transaction scope, or commit pending writes at once."""
+        connection = self._connection
+        self.lock()
+        try:
+            if connection.depth:
+                connection.depth -= 1
+                self.unlock()
+            connection.flush(force=True)
+        finally:
+            self.unlock()
 
     def rollback(self):
-        self._conn.rollback()
-        self.unlock()
+        """End a transaction scope, dropping the writes done inside it."""
+        connection = self._connection
+        self.lock()
+        try:
+            if connection.depth:
+                connection.depth -= 1
+                self.unlock()
+                if not connection.depth:
+                    connection.rollback()
+        finally:
+            self.unlock()
+
+    def deadline(self):
+        """Return when pending writes should be committed, or None."""
+        return self._connection.deadline()
+
+    def flush(self):
+        """Commit pending writes, if they've waited long enough."""
+        self._connection.flush()
 
     def execute(self, *args, **kwargs):
-        cursor = self._conn.cursor()
         self.lock()
         try:
-            cursor.execute(args[0], args[1:])
-            names = {}
-            if cursor.description:
-                for i, item in enumerate(cursor.description):
-                    names[item[0]] = i
-            unlock = False
-            if cursor.rowcount > 0 and not kwargs.get("dontcommit"):
-                self._conn.commit()
-                unlock = True
-            if cursor.rowcount == -1:
-                self.results = [Row(row, names) for row in cursor.fetchall()]
+            self._close()
+            cursor = self._conn.cursor()
+            try:
+                write = WRITE.match(args[0])
+                if write:
+                    self._connection.transaction()
+                cursor.execute(args[0], args[1:])
+                if cursor.description:
+                    self._names = dict([(item[0], i) for i, item in
+                                        enumerate(cursor.description)])
+                    self._cursor = cursor
+                    self.changed = False
+                else:
+                    self.changed = cursor.rowcount > 0
+                    cursor.close()
+                    if write:
+                        self._connection.write(kwargs.get("dontcommit"))
+            except self.error:
+                cursor.close()
                 self.changed = False
-                unlock = True
-            else:
-                self.results = []
-                self.changed = bool(cursor.rowcount)
-            cursor.close()
-            if unlock:
-                self.unlock()
-        except self.error:
-            cursor.close()
-            self._conn.rollback()
+        finally:
             self.unlock()
         return self
 
+    def _close(self):
+        if self._cursor is not None:
+            self._cursor.close()
+        self._cursor = None
+        self._next = None
+
+    def _fetch(self, cursor, size=1):
+        self.lock()
+        try:
+            try:
+                return cursor.fetchmany(size)
+            except self.error:
+                return []
+        finally:
+            self.unlock()
+
+    def _peek(self):
+        if self._next is None and self._cursor is not None:
+            rows = self._fetch(self._cursor)
+            if rows:
+                self._next = rows[0]
+            else:
+                self._close()
+        return self._next
+
+    def results(self):
+        return self._peek() is not None
+    results = property(results, doc="Whether there are rows to be fetched.")
+
     def fetchone(self):
-        return self.results and self.results.pop(0) or None
+        row = self._peek()
+        if row is None:
+            return None
+        self._next = None
+        return Row(row, self._names)
 
     def fetchall(self):
-        rows, self.results = self.results, []
-        return rows
+        return list(self)
 
     def __iter__(self):
-        rows, self.results = self.results, []
-        return iter(rows)
+        # Detach the cursor, so that statements executed while
+        # iterating don't disturb the iteration.
+        first = self._peek()
+        cursor, names = self._cursor, self._names
+        self._cursor = None
+        self._next = None
+        return self._iterate(cursor, names, first)
+
+    def _iterate(self, cursor, names, first):
+        if first is None:
+            return
+        yield Row(first, names)
+        while 1:
+            rows = self._fetch(cursor, FETCHSIZE)
+            if not rows:
+                break
+            for row in rows:
+                yield Row(row, names)
+        cursor.close()
 
     def __getitem__(self, name):
         self.execute("select value from dict where name=?", name)
@@ -113,7 +315,8 @@ class SQLiteDB(object):
         will ensure that the given table has the given fields in the
         given order, and change the table if not.
         """
-        self.lock()
+        self.begin()
+        self._connection.transaction()
         cursor = self._conn.cursor()
         try:
             # First, drop old triggers, if existent
@@ -154,13 +357,15 @@ class SQLiteDB(object):
                                % (name, ",".join(newfieldnames)))
                 cursor.execute("drop table temp_table")
                 for sql in aftercreate: cursor.execute(sql)
-                self.commit()
             # Rebuild the triggers
             for sql in triggers:
                 cursor.execute(sql)
-        finally:
+        except:
             cursor.close()
-            self.unlock()
+            self.rollback()
+            raise
+        cursor.close()
+        self.commit()
 
 class Row(tuple):
     
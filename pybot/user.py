@@ -66,4 +66,51 @@ class User:
     def matchuser(self, user):
         return self.match(user.nick, user.username, user.host)
 
+class UserMask:
+    """A nick!username@host mask, prepared for matching users quickly.
+
+    UserMask(str).match(user) is equivalent to user.matchstr(str).
+    """
+    def __init__(self, str):
+        self.valid = 0
+        tokens = split(str, "!")
+        if len(tokens) == 2:
+            nick = tokens[0]
+            tokens = split(tokens[1], "@")
+            if len(tokens) == 2:
+                username, host = tokens
+                self.valid = 1
+                self.nick = self._prepare(nick)
+                self.username = self._prepare(username)
+                if host == "*":
+                    self.host = None
+                    self.hostsuffix = None
+                elif host[:1] == "*":
+                    self.host = None
+                    self.hostsuffix = host[1:].lower()
+                else:
+                    self.host = host.lower()
+                    self.hostsuffix = None
+
+    def _prepare(self, value):
+        if value == "*":
+            return None
+        return value.lower()
+
+    def match(self, user):
+        if not self.valid:
+            return None
+        if self.nick is not None and self.nick != user.nick.lower():
+            return None
+        if self.username is not None and \
+           self.username != user.username.lower():
+            return None
+        if self.host is not None:
+            if self.host != user.host.lower():
+                return None
+        elif self.hostsuffix is not None:
+            if not user.host.lower().endswith(self.hostsuffix):
+                return None
+        return 1
+
 # vim:ts=4:sw=4:et
@@ -123,9 +123,8 @@ class HTTPTransport:
         else:
             return original_namespace
     
-    # Need a Timeout someday?
     def call(self, addr, data, namespace, soapaction = '', encoding = None,
-        http_proxy = None, config = Config):
+        http_proxy = None, config = Config, timeout = None):
 
         import httplib
 
@@ -145,6 +144,10 @@ class HTTPTransport:
         else:
             r = httplib.HTTP(real_addr)
 
+        if timeout is not None:
+            # Applies to connecting and to every read afterwards.
+            r._conn.timeout = timeout
+
         r.putrequest("POST", real_path)
 
         r.putheader("Host", addr.host)
@@ -235,7 +238,7 @@ class SOAPProxy:
     def __init__(self, proxy, namespace = None, soapaction = '',
                  header = None, methodattrs = None, transport = HTTPTransport,
                  encoding = 'UTF-8', throw_faults = 1, unwrap_results = 1,
-                 http_proxy=None, config = Config,noroot = 0):
+                 http_proxy=None, config = Config,noroot = 0, timeout = None):
 
         # Test the encoding, raising an exception if it's not known
         if encoding != None:
@@ -253,6 +256,7 @@ class SOAPProxy:
         self.http_proxy     = http_proxy
         self.config         = config
         self.noroot         = noroot
+        self.timeout        = timeout
         
 
     def invoke(self, method, args):
@@ -287,10 +291,14 @@ class SOAPProxy:
             header = hd, methodattrs = ma, encoding = self.encoding,
             config = self.config,noroot = self.noroot)
 
+        tkw = {}
+        if self.timeout is not None:
+            # Only passed when set, as other transports may not know it.
+            tkw["timeout"] = self.timeout
         r, self.namespace = self.transport.call(self.proxy, m, ns, sa,
                                                 encoding = self.encoding,
                                                 http_proxy = self.http_proxy,
-                                                config = self.config)
+                                                config = self.config, **tkw)
 
         p, attrs = parseSOAPRPC(r, attrs = 1)
 
@@ -85,11 +85,15 @@ try:
     timeoutsocket.setDefaultSocketTimeout(10)
 except ImportError:
     pass
-import cgi, re, sgmllib, string, StringIO, gzip, urllib2
+import cgi, re, sgmllib, string, StringIO, gzip, urllib2, zlib
+import xml.parsers.expat
 sgmllib.tagfind = re.compile('[a-zA-Z][-_.:a-zA-Z0-9]*')
 
 USER_AGENT = "UltraLiberalFeedParser/%s +http://diveintomark.org/projects/feed_parser/" % __version__
 
+# bytes read from the resource at once by the expat backend
+BLOCKSIZE = 16384
+
 def decodeEntities(data):
     data = data or ''
     data = data.replace('&lt;', '<')
@@ -482,6 +486,107 @@ class FeedParser(sgmllib.SGMLParser):
             return k+3
         return sgmllib.SGMLParser.parse_declaration(self, i)
 
+class StopParsing(Exception):
+    pass
+
+class ExpatFeedParser(FeedParser):
+    """
+    FeedParser driven by expat events instead of sgmllib.
+
+    The document is parsed as it's read, and parsing stops once maxitems
+    items were found, so the rest of the document isn't even read. Tags
+    are dispatched to the same start_/end_ methods, and text is escaped
+    before being handed to them, so the results are the ones FeedParser
+    gives, except that values are unicode and character references are
+    decoded. Entities unknown to XML, like &nbsp;, are kept as they are.
+
+    Since expat only accepts well-formed XML, parse() falls back to
+    FeedParser when it fails.
+    """
+
+    def __init__(self, maxitems=None):
+        FeedParser.__init__(self)
+        self.maxitems = maxitems
+        self.parser = xml.parsers.expat.ParserCreate()
+        self.parser.buffer_text = 1
+        self.parser.ordered_attributes = 1
+        # Undefined entities aren't errors if there may be a DTD.
+        self.parser.UseForeignDTD(1)
+        self.parser.StartElementHandler = self.expat_start
+        self.parser.EndElementHandler = self.expat_end
+        self.parser.CharacterDataHandler = self.expat_data
+        self.parser.SkippedEntityHandler = self.expat_entity
+
+    def parse(self, data, final=0):
+        self.parser.Parse(data, final)
+
+    def expat_start(self, tag, attrs):
+        tag = tag.lower()
+        attrs = [(attrs[i].lower(), attrs[i+1]) for i in range(0, len(attrs), 2)]
+        method = getattr(self, 'start_' + tag, None)
+        if method:
+            method(attrs)
+        else:
+            self.unknown_starttag(tag, attrs)
+
+    def expat_end(self, tag):
+        tag = tag.lower()
+        method = getattr(self, 'end_' + tag, None)
+        if method:
+            method()
+        else:
+            self.unknown_endtag(tag)
+        if tag in ('item', 'entry') and self.maxitems and \
+           len(self.items) >= self.maxitems:
+            raise StopParsing
+
+    def expat_data(self, text):
+        self.handle_data(cgi.escape(text))
+
+    def expat_entity(self, name, is_parameter_entity):
+        if not is_parameter_entity:
+            self.handle_data(cgi.escape("&%s;" % name))
+
+def parse_expat(f, maxitems=None):
+    """
+    Parse the feed in the open resource f with ExpatFeedParser, and
+    return the parser and the start of the document.
+    """
+    decompress = None
+    if hasattr(f, "headers") and \
+       f.headers.get('content-encoding', '') == 'gzip':
+        decompress = zlib.decompressobj(16+zlib.MAX_WBITS).decompress
+    r = ExpatFeedParser(maxitems)
+    chunks = []
+    try:
+        while 1:
+            chunk = f.read(BLOCKSIZE)
+            if decompress and chunk:
+                chunk = decompress(chunk)
+            chunks.append(chunk)
+            r.parse(chunk, not chunk)
+            if not chunk:
+                break
+    except StopParsing:
+        pass
+    except zlib.error:
+        # some feeds claim to be gzipped but they're not, so we get garbage
+        r = FeedParser()
+        r.feed('')
+        chunks = ['']
+    except xml.parsers.expat.ExpatError:
+        # not well-formed, so read the rest and let sgmllib deal with it
+        data = f.read()
+        if decompress:
+            try:
+                data = decompress(data)
+            except zlib.error:
+                data = ''
+        chunks.append(data)
+        r = FeedParser()
+        r.feed("".join(chunks))
+    return r, chunks[0]
+
 class FeedURLHandler(urllib2.HTTPRedirectHandler, urllib2.HTTPDefaultErrorHandler):
     def http_error_default(self, req, fp, code, msg, headers):
         if ((code / 100) == 3) and (code != 304):
@@ -505,7 +610,8 @@ class FeedURLHandler(urllib2.HTTPRedirectHandler, urllib2.HTTPDefaultErrorHandle
     http_error_300 = http_error_302
     http_error_307 = http_error_302
         
-def open_resource(source, etag=None, modified=None, agent=None, referrer=None):
+def open_resource(source, etag=None, modified=None, agent=None, referrer=None,
+                  timeout=None):
     """
     URI, filename, or string --> stream
 
@@ -528,6 +634,9 @@ def open_resource(source, etag=None, modified=None, agent=None, referrer=None):
 
     If the referrer argument is supplied, it will be used as the value of a
     Referer[sic] request header.
+
+    If the timeout argument is supplied, a URL whose server doesn't answer
+    for that many seconds is given up on.
     """
 
     if hasattr(source, "read"):
@@ -552,6 +661,8 @@ def open_resource(source, etag=None, modified=None, agent=None, referrer=None):
     opener = urllib2.build_opener(FeedURLHandler())
     opener.addheaders = [] # RMK - must clear so we only send our custom User-Agent
     try:
+        if timeout is not None:
+            return opener.open(request, timeout=timeout)
         return opener.open(request)
     except:
         # source is not a valid URL, but it might be a valid filename
@@ -653,19 +764,33 @@ def parse_http_date(date):
         # the month or weekday lookup probably failed indicating an invalid timestamp
         return None
 
-def parse(uri, etag=None, modified=None, agent=None, referrer=None):
-    r = FeedParser()
-    f = open_resource(uri, etag=etag, modified=modified, agent=agent, referrer=referrer)
-    data = f.read()
-    if hasattr(f, "headers"):
-        if f.headers.get('content-encoding', '') == 'gzip':
-            try:
-                data = gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
-            except:
-                # some feeds claim to be gzipped but they're not, so we get garbage
-                data = ''
-    r.feed(data)
-    result = {"channel": r.channel, "items": r.items}
+def parse(uri, etag=None, modified=None, agent=None, referrer=None,
+          backend="sgml", maxitems=None, timeout=None):
+    """
+    Parse the feed at uri (see open_resource()).
+
+    The backend may be "sgml", which reads the whole document and parses
+    it with FeedParser, or "expat", which parses the document while it's
+    read with ExpatFeedParser. If maxitems is given, only the first
+    maxitems items are returned, and the expat backend stops reading
+    once it has found them.
+    """
+    f = open_resource(uri, etag=etag, modified=modified, agent=agent, referrer=referrer,
+                      timeout=timeout)
+    if backend == "expat":
+        r, data = parse_expat(f, maxitems)
+    else:
+        r = FeedParser()
+        data = f.read()
+        if hasattr(f, "headers"):
+            if f.headers.get('content-encoding', '') == 'gzip':
+                try:
+                    data = gzip.GzipFile(fileobj=StringIO.StringIO(data)).read()
+                except:
+                    # some feeds claim to be gzipped but they're not, so we get garbage
+                    data = ''
+        r.feed(data)
+    result = {"channel": r.channel, "items": r.items[:maxitems]}
     newEtag = get_etag(f)
     if newEtag: result["etag"] = newEtag
     elif etag: result["etag"] = etag